@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+數據庫遷移腳本 - 為attendance_records建立每日打卡唯一鍵與複合索引
+需先執行 add_attendance_work_date.py
+若已有重複打卡，預設列出後中止；加上 --dedupe 參數則保留每組最早寫入的一筆
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__))))
+
+from sqlalchemy import text
+
+from app.db.base import engine
+
+DUPLICATES_SQL = """
+    SELECT user_id, record_type, work_date, COUNT(*) AS punch_count, MIN(id) AS keep_id
+    FROM attendance_records
+    GROUP BY user_id, record_type, work_date
+    HAVING COUNT(*) > 1
+"""
+
+
+def resolve_duplicates(conn, dedupe: bool) -> bool:
+    """檢查並處理既有的重複打卡"""
+    duplicates = conn.execute(text(DUPLICATES_SQL)).fetchall()
+    if not duplicates:
+        print("  [OK] 沒有重複打卡記錄")
+        return True
+
+    for row in duplicates:
+        print(f"  [DUP] user_id={row.user_id} type={row.record_type} date={row.work_date} 共 {row.punch_count} 筆")
+
+    if not dedupe:
+        print("  [ERROR] 存在重複打卡，請先處理或使用 --dedupe 參數")
+        return False
+
+    result = conn.execute(text(f"""
+        DELETE FROM attendance_records
+        WHERE id NOT IN (
+            SELECT keep_id FROM ({DUPLICATES_SQL}) AS duplicates
+        )
+        AND (user_id, record_type, work_date) IN (
+            SELECT user_id, record_type, work_date FROM ({DUPLICATES_SQL}) AS duplicates
+        )
+    """))
+    print(f"  [OK] 刪除 {result.rowcount} 筆重複打卡")
+    return True
+
+
+def create_constraints(conn):
+    """建立唯一鍵與索引"""
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_attendance_records_user_type_work_date "
+        "ON attendance_records (user_id, record_type, work_date)"
+    ))
+    print("  [OK] 建立 uq_attendance_records_user_type_work_date 唯一索引")
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_attendance_records_user_record_time "
+        "ON attendance_records (user_id, record_time)"
+    ))
+    print("  [OK] 建立 ix_attendance_records_user_record_time 索引")
+
+
+def migrate_database(dedupe: bool = False):
+    """執行數據庫遷移"""
+    print("開始數據庫遷移...")
+    try:
+        with engine.begin() as conn:
+            print("1. 檢查重複打卡...")
+            if not resolve_duplicates(conn, dedupe):
+                return False
+            print("2. 建立唯一鍵與索引...")
+            create_constraints(conn)
+        print("數據庫遷移完成！")
+        return True
+    except Exception as e:
+        print(f"遷移過程中發生錯誤: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    success = migrate_database(dedupe="--dedupe" in sys.argv)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+數據庫遷移腳本 - 為attendance_records添加work_date欄位並回填現有資料
+支援 SQLite 與 PostgreSQL
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__))))
+
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from app.db.base import engine
+from app.utils.local_time import DEFAULT_TIMEZONE, local_work_date
+
+BATCH_SIZE = 5000
+
+
+def add_columns(conn):
+    """添加companies.timezone與attendance_records.work_date欄位"""
+    inspector = inspect(conn)
+
+    company_columns = [column['name'] for column in inspector.get_columns('companies')]
+    if 'timezone' not in company_columns:
+        conn.execute(text(f"ALTER TABLE companies ADD COLUMN timezone VARCHAR NOT NULL DEFAULT '{DEFAULT_TIMEZONE}'"))
+        print("  [OK] 添加 companies.timezone 字段")
+    else:
+        print("  [SKIP] companies.timezone 字段已存在，跳過")
+
+    attendance_columns = [column['name'] for column in inspector.get_columns('attendance_records')]
+    if 'work_date' not in attendance_columns:
+        conn.execute(text("ALTER TABLE attendance_records ADD COLUMN work_date DATE"))
+        print("  [OK] 添加 attendance_records.work_date 字段")
+    else:
+        print("  [SKIP] attendance_records.work_date 字段已存在，跳過")
+
+
+def backfill_work_date(conn):
+    """依公司時區回填work_date"""
+    if conn.dialect.name == 'postgresql':
+        result = conn.execute(text("""
+            UPDATE attendance_records AS ar
+            SET work_date = (ar.record_time AT TIME ZONE c.timezone)::date
+            FROM companies AS c
+            WHERE c.id = ar.company_id AND ar.work_date IS NULL
+        """))
+        print(f"  [OK] 回填 {result.rowcount} 筆出勤記錄")
+        conn.execute(text("ALTER TABLE attendance_records ALTER COLUMN work_date SET NOT NULL"))
+        return
+
+    # SQLite 沒有時區函數，於 Python 端分批計算
+    total = 0
+    while True:
+        rows = conn.execute(text("""
+            SELECT ar.id, ar.record_time, c.timezone
+            FROM attendance_records AS ar
+            JOIN companies AS c ON c.id = ar.company_id
+            WHERE ar.work_date IS NULL
+            LIMIT :limit
+        """), {"limit": BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+        conn.execute(
+            text("UPDATE attendance_records SET work_date = :work_date WHERE id = :id"),
+            [
+                {"id": row.id, "work_date": local_work_date(_parse_datetime(row.record_time), row.timezone)}
+                for row in rows
+            ]
+        )
+        total += len(rows)
+    print(f"  [OK] 回填 {total} 筆出勤記錄")
+
+
+def _parse_datetime(value):
+    """SQLite以字串儲存時間，需轉回datetime"""
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+def create_indexes(conn):
+    """建立工作日期索引"""
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_attendance_records_company_work_date "
+        "ON attendance_records (company_id, work_date)"
+    ))
+    print("  [OK] 建立 ix_attendance_records_company_work_date 索引")
+
+
+def migrate_database():
+    """執行數據庫遷移"""
+    print("開始數據庫遷移...")
+    try:
+        with engine.begin() as conn:
+            print("1. 添加欄位...")
+            add_columns(conn)
+            print("2. 回填work_date...")
+            backfill_work_date(conn)
+            print("3. 建立索引...")
+            create_indexes(conn)
+        print("數據庫遷移完成！")
+        return True
+    except Exception as e:
+        print(f"遷移過程中發生錯誤: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    success = migrate_database()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+數據庫遷移腳本 - 建立請假額度帳 leave_ledger_entries 與額度表 leave_balances
+建立後以 POST /api/v1/leaves/balances/accrual 給予年度額度
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__))))
+
+from app.db.base import engine
+from app.db.models import LeaveBalance, LeaveLedgerEntry
+
+
+def migrate_database():
+    """執行數據庫遷移"""
+    print("開始數據庫遷移...")
+    try:
+        for table in (LeaveLedgerEntry.__table__, LeaveBalance.__table__):
+            table.create(bind=engine, checkfirst=True)
+            print(f"  [OK] 建立 {table.name} 資料表")
+        print("數據庫遷移完成！")
+        return True
+    except Exception as e:
+        print(f"遷移過程中發生錯誤: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    success = migrate_database()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+數據庫遷移腳本 - 以資料庫約束禁止同一員工的待審/已核准請假時段重疊
+PostgreSQL 建立 tstzrange 的 GiST 排除約束（需 btree_gist 擴充），SQLite 建立觸發器
+若已有重疊的請假，列出後中止，需先人工處理
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__))))
+
+from sqlalchemy import text
+
+from app.db.base import engine
+from app.db.models import LEAVE_OVERLAP_CONSTRAINT, LEAVE_OVERLAP_DDL
+
+OVERLAPS_SQL = """
+    SELECT a.user_id, a.id AS leave_id, b.id AS other_id
+    FROM leave_applications a
+    JOIN leave_applications b
+      ON b.user_id = a.user_id
+     AND b.id > a.id
+     AND b.start_date <= a.end_date
+     AND b.end_date >= a.start_date
+    WHERE a.status IN ('pending', 'approved')
+      AND b.status IN ('pending', 'approved')
+"""
+
+
+def check_overlaps(conn) -> bool:
+    """檢查既有的重疊請假"""
+    overlaps = conn.execute(text(OVERLAPS_SQL)).fetchall()
+    if not overlaps:
+        print("  [OK] 沒有重疊的請假")
+        return True
+
+    for row in overlaps:
+        print(f"  [DUP] user_id={row.user_id} 請假 {row.leave_id} 與 {row.other_id} 重疊")
+    print("  [ERROR] 存在重疊的請假，請先取消或修改後再執行")
+    return False
+
+
+def constraint_exists(conn) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(
+        text("SELECT 1 FROM pg_constraint WHERE conname = :name"),
+        {"name": LEAVE_OVERLAP_CONSTRAINT}
+    ).first() is not None
+
+
+def create_constraints(conn):
+    """建立索引與重疊約束"""
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_leave_applications_user_start_date "
+        "ON leave_applications (user_id, start_date)"
+    ))
+    print("  [OK] 建立 ix_leave_applications_user_start_date 索引")
+
+    statements = LEAVE_OVERLAP_DDL.get(conn.dialect.name)
+    if statements is None:
+        print(f"  [SKIP] 不支援的資料庫 {conn.dialect.name}")
+        return
+    if constraint_exists(conn):
+        print(f"  [SKIP] {LEAVE_OVERLAP_CONSTRAINT} 已存在")
+        return
+    for statement in statements:
+        conn.execute(text(statement))
+    print(f"  [OK] 建立 {LEAVE_OVERLAP_CONSTRAINT} 重疊約束")
+
+
+def migrate_database():
+    """執行數據庫遷移"""
+    print("開始數據庫遷移...")
+    try:
+        with engine.begin() as conn:
+            print("1. 檢查重疊請假...")
+            if not check_overlaps(conn):
+                return False
+            print("2. 建立索引與重疊約束...")
+            create_constraints(conn)
+        print("數據庫遷移完成！")
+        return True
+    except Exception as e:
+        print(f"遷移過程中發生錯誤: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    success = migrate_database()
+    sys.exit(0 if success else 1)
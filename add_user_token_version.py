@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+數據庫遷移腳本 - 為users添加token_version欄位
+支援 SQLite 與 PostgreSQL
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__))))
+
+from sqlalchemy import inspect, text
+
+from app.db.base import engine
+
+
+def migrate_database():
+    """執行數據庫遷移"""
+    print("開始數據庫遷移...")
+    try:
+        with engine.begin() as conn:
+            columns = [column['name'] for column in inspect(conn).get_columns('users')]
+            if 'token_version' not in columns:
+                conn.execute(text("ALTER TABLE users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0"))
+                print("  [OK] 添加 users.token_version 字段")
+            else:
+                print("  [SKIP] users.token_version 字段已存在，跳過")
+        print("數據庫遷移完成！舊的 access token 不含身分 claims，使用者需重新登入")
+        return True
+    except Exception as e:
+        print(f"遷移過程中發生錯誤: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    success = migrate_database()
+    sys.exit(0 if success else 1)
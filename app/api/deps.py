@@ -7,6 +7,7 @@ from sqlalchemy.orm import Session
 from app.db import models
 from app.core import security
 from app.core.config import settings
+from app.core.principals import AuthenticatedPrincipal, principal_cache
 from app.db.base import SessionLocal
 
 reusable_oauth2 = OAuth2PasswordBearer(
@@ -20,39 +21,58 @@ def get_db():
     finally:
         db.close()
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(reusable_oauth2)) -> models.User:
-    print(f"\n=== GET_CURRENT_USER ===")
-    print(f"Token received: {token[:20]}...")
+def get_current_principal(db: Session = Depends(get_db), token: str = Depends(reusable_oauth2)) -> AuthenticatedPrincipal:
+    """
+    由 JWT claims 建立目前使用者身分
+    快取命中時不查詢資料庫；未命中時只比對一次 token_version 以確認 token 未被撤銷
+    """
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
 
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
         )
-        token_data = payload["sub"]
-        print(f"Token decoded successfully, user_id: {token_data}")
-    except JWTError as e:
-        print(f"[ERROR] JWT decode error: {e}")
+        principal = AuthenticatedPrincipal.from_claims(payload)
+    except (JWTError, ValidationError, KeyError, ValueError, TypeError):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    except ValidationError as e:
-        print(f"[ERROR] Validation error: {e}")
+
+    if principal_cache.is_revoked(principal):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
 
-    user = db.query(models.User).filter(models.User.id == token_data).first()
-    if not user:
-        print(f"[ERROR] User with ID {token_data} not found in database")
+    current_version = db.query(models.User.token_version).filter(models.User.id == principal.id).scalar()
+    if current_version is None:
         raise HTTPException(status_code=404, detail="User not found")
+    if principal.token_version != current_version:
+        principal_cache.revoke(principal.id, current_version)
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Could not validate credentials",
+        )
+
+    principal_cache.put(token, principal)
+    return principal
 
-    print(f"[SUCCESS] User found: ID={user.id}, Email={user.email}")
-    print("=== END GET_CURRENT_USER ===\n")
+def get_current_user(
+    db: Session = Depends(get_db),
+    principal: AuthenticatedPrincipal = Depends(get_current_principal)
+) -> models.User:
+    """需要完整使用者資料（個人檔案等）時才載入 users 資料列"""
+    user = db.query(models.User).filter(models.User.id == principal.id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
     return user
 
-def get_current_active_admin(current_user: models.User = Depends(get_current_user)) -> models.User:
+def get_current_active_admin(
+    current_user: AuthenticatedPrincipal = Depends(get_current_principal)
+) -> AuthenticatedPrincipal:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     if current_user.role not in [models.UserRole.company_admin, models.UserRole.super_admin]:
@@ -60,4 +80,4 @@ def get_current_active_admin(current_user: models.User = Depends(get_current_use
             status_code=403,
             detail="The user doesn't have enough privileges"
         )
-    return current_user
\ No newline at end of file
+    return current_user
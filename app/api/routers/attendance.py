@@ -1,33 +1,48 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session, joinedload # Import joinedload
-from typing import Any, List
-from datetime import datetime, date, time
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Query as OrmQuery, Session, joinedload # Import joinedload
+from typing import Any, Dict, List, Optional, Union
+from datetime import datetime, date
 
 from app.api import deps
-from app.db.models import AttendanceRecord, AttendanceType, AttendanceStatus, User, Company
-from app.schemas.attendance import AttendanceRecord as AttendanceRecordSchema, AttendanceRequest
+from app.core.principals import AuthenticatedPrincipal
+from app.core.company_policy import CompanyPolicy, get_company_policy
+from app.core.report_cache import mark_report_month_stale
+from app.db.models import AttendanceRecord, AttendanceType, AttendanceStatus
+from app.schemas.attendance import AttendanceRecord as AttendanceRecordSchema, AttendanceRecordCompact, AttendanceRequest
+from app.schemas.pagination import CursorPage
 from app.db import models # Import models
+from app.utils.attendance_daily import refresh_attendance_daily
+from app.utils.export import (
+    ATTENDANCE_EXPORT_COLUMNS, EXPORT_YIELD_PER, attendance_export_query, stream_csv, stream_ndjson
+)
 from app.utils.geolocation import is_within_range
+from app.utils.local_time import local_now
+from app.utils.pagination import keyset_page
+from app.utils.sideload import build_compact_response, parse_fields
+from app.utils.work_sessions import open_session_work_date, record_punch_session
 
 router = APIRouter()
 
 def determine_attendance_status(
-    company: Company,
+    policy: CompanyPolicy,
     attendance_type: AttendanceType,
     current_time: datetime
 ) -> AttendanceStatus:
     """
     根據公司工作時間設定判斷考勤狀態
     """
-    if not company.work_start_time or not company.work_end_time:
+    if not policy.work_start_time or not policy.work_end_time:
         return AttendanceStatus.normal
 
     current_time_only = current_time.time()
 
     if attendance_type == AttendanceType.check_in:
         # 計算允許的最晚上班時間
-        work_start = company.work_start_time
-        late_tolerance = company.late_tolerance_minutes or 0
+        work_start = policy.work_start_time
+        late_tolerance = policy.late_tolerance_minutes or 0
 
         # 將時間轉換為分鐘進行計算
         work_start_minutes = work_start.hour * 60 + work_start.minute
@@ -41,8 +56,8 @@ def determine_attendance_status(
 
     elif attendance_type == AttendanceType.check_out:
         # 計算允許的最早下班時間
-        work_end = company.work_end_time
-        early_tolerance = company.early_leave_tolerance_minutes or 0
+        work_end = policy.work_end_time
+        early_tolerance = policy.early_leave_tolerance_minutes or 0
 
         # 將時間轉換為分鐘進行計算
         work_end_minutes = work_end.hour * 60 + work_end.minute
@@ -56,12 +71,38 @@ def determine_attendance_status(
 
     return AttendanceStatus.normal
 
+PUNCH_UNIQUE_COLUMNS = ["user_id", "record_type", "work_date"]
+
+
+def insert_punch(db: Session, values: Dict[str, Any]) -> Optional[int]:
+    """
+    以單一 INSERT 寫入打卡記錄，同一天同類型的重複打卡由唯一鍵原子性地拒絕
+    寫入成功時一併更新 work_sessions、attendance_daily 並使該月報表快取失效；回傳新記錄ID，未寫入時回傳 None
+    """
+    table = AttendanceRecord.__table__
+    dialect_insert = postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+
+    stmt = dialect_insert(table).values(**values).on_conflict_do_nothing(
+        index_elements=PUNCH_UNIQUE_COLUMNS
+    ).returning(table.c.id)
+    record_id = db.execute(stmt).scalar_one_or_none()
+    if record_id is not None:
+        # 同一交易內配對時段並更新每日彙總，報表不需再掃描打卡記錄
+        session_date = record_punch_session(db, record_id, values)
+        refresh_attendance_daily(db, values["user_id"], values["company_id"], values["work_date"])
+        mark_report_month_stale(db, values["company_id"], values["work_date"])
+        if session_date is not None and session_date != values["work_date"]:
+            # 跨午夜的結束打卡，時數計入開始打卡的工作日
+            refresh_attendance_daily(db, values["user_id"], values["company_id"], session_date)
+            mark_report_month_stale(db, values["company_id"], session_date)
+    return record_id
+
 @router.post("/check-in", response_model=dict)
 def check_in(
     *,
     db: Session = Depends(deps.get_db),
     attendance_request: AttendanceRequest,
-    current_user: User = Depends(deps.get_current_user)
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_principal)
 ) -> Any:
     """
     Employee check-in (clock-in) with location validation.
@@ -70,57 +111,50 @@ def check_in(
     user_latitude = attendance_request.latitude
     user_longitude = attendance_request.longitude
 
-    # Get company location
-    company = db.query(Company).filter(Company.id == current_user.company_id).first()
-    if not company:
+    # Get company policy from the per-process cache
+    policy = get_company_policy(db, current_user.company_id)
+    if not policy:
         raise HTTPException(status_code=404, detail="Company not found")
 
     # Validate location if company has coordinates set
-    distance_limit = float(company.attendance_distance_limit) if company.attendance_distance_limit else 100.0
     is_valid_location, distance = is_within_range(
         user_latitude, user_longitude,
-        float(company.latitude) if company.latitude else None,
-        float(company.longitude) if company.longitude else None,
-        max_distance=distance_limit
+        policy.latitude, policy.longitude,
+        max_distance=policy.distance_limit
     )
 
     if not is_valid_location:
         raise HTTPException(
             status_code=403,
-            detail=f"您距離公司位置{distance:.1f}公尺。請在距離辦公室{distance_limit:.0f}公尺範圍內打卡。"
+            detail=f"您距離公司位置{distance:.1f}公尺。請在距離辦公室{policy.distance_limit:.0f}公尺範圍內打卡。"
         )
 
-    # Check if already checked in today
-    today_check_in = db.query(AttendanceRecord).filter(
-        AttendanceRecord.user_id == current_user.id,
-        AttendanceRecord.record_type == AttendanceType.check_in,
-        AttendanceRecord.record_time >= datetime.now().date()
-    ).first()
-
-    if today_check_in:
-        raise HTTPException(status_code=400, detail="今日已經上班打卡。")
+    # 以公司當地時區決定今日的工作日期
+    current_time = local_now(policy.timezone)
+    work_date = current_time.date()
 
     # Determine attendance status based on work schedule
-    current_time = datetime.now()
     attendance_status = determine_attendance_status(
-        company=company,
+        policy=policy,
         attendance_type=AttendanceType.check_in,
         current_time=current_time
     )
 
-    # Create attendance record
-    attendance_record = AttendanceRecord(
-        user_id=current_user.id,
-        company_id=current_user.company_id,
-        record_time=current_time,
-        record_type=AttendanceType.check_in,
-        latitude=user_latitude,
-        longitude=user_longitude,
-        status=attendance_status
-    )
-    db.add(attendance_record)
+    # Create attendance record; 今日重複打卡由唯一鍵拒絕
+    record_id = insert_punch(db, {
+        "user_id": current_user.id,
+        "company_id": current_user.company_id,
+        "record_time": current_time,
+        "work_date": work_date,
+        "record_type": AttendanceType.check_in,
+        "latitude": user_latitude,
+        "longitude": user_longitude,
+        "status": attendance_status
+    })
+    if record_id is None:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="今日已經上班打卡。")
     db.commit()
-    db.refresh(attendance_record)
 
     # 構建狀態消息
     status_message = "上班打卡成功"
@@ -131,7 +165,7 @@ def check_in(
 
     return {
         "message": status_message,
-        "record_id": attendance_record.id,
+        "record_id": record_id,
         "distance_from_company": round(distance, 1),
         "status": attendance_status.value,
         "record_time": current_time.isoformat()
@@ -142,7 +176,7 @@ def check_out(
     *,
     db: Session = Depends(deps.get_db),
     attendance_request: AttendanceRequest,
-    current_user: User = Depends(deps.get_current_user)
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_principal)
 ) -> Any:
     """
     Employee check-out (clock-out) with location validation.
@@ -151,57 +185,52 @@ def check_out(
     user_latitude = attendance_request.latitude
     user_longitude = attendance_request.longitude
 
-    # Get company location
-    company = db.query(Company).filter(Company.id == current_user.company_id).first()
-    if not company:
+    # Get company policy from the per-process cache
+    policy = get_company_policy(db, current_user.company_id)
+    if not policy:
         raise HTTPException(status_code=404, detail="Company not found")
 
     # Validate location if company has coordinates set
-    distance_limit = float(company.attendance_distance_limit) if company.attendance_distance_limit else 100.0
     is_valid_location, distance = is_within_range(
         user_latitude, user_longitude,
-        float(company.latitude) if company.latitude else None,
-        float(company.longitude) if company.longitude else None,
-        max_distance=distance_limit
+        policy.latitude, policy.longitude,
+        max_distance=policy.distance_limit
     )
 
     if not is_valid_location:
         raise HTTPException(
             status_code=403,
-            detail=f"您距離公司位置{distance:.1f}公尺。請在距離辦公室{distance_limit:.0f}公尺範圍內打卡。"
+            detail=f"您距離公司位置{distance:.1f}公尺。請在距離辦公室{policy.distance_limit:.0f}公尺範圍內打卡。"
         )
 
-    # Check if already checked out today
-    today_check_out = db.query(AttendanceRecord).filter(
-        AttendanceRecord.user_id == current_user.id,
-        AttendanceRecord.record_type == AttendanceType.check_out,
-        AttendanceRecord.record_time >= datetime.now().date()
-    ).first()
-
-    if today_check_out:
-        raise HTTPException(status_code=400, detail="今日已經下班打卡。")
+    # 以公司當地時區決定今日的工作日期；跨午夜下班時歸屬上班打卡的工作日
+    current_time = local_now(policy.timezone)
+    work_date = open_session_work_date(
+        db, current_user.id, AttendanceType.check_out, current_time
+    ) or current_time.date()
 
     # Determine attendance status based on work schedule
-    current_time = datetime.now()
     attendance_status = determine_attendance_status(
-        company=company,
+        policy=policy,
         attendance_type=AttendanceType.check_out,
         current_time=current_time
     )
 
-    # Create attendance record
-    attendance_record = AttendanceRecord(
-        user_id=current_user.id,
-        company_id=current_user.company_id,
-        record_time=current_time,
-        record_type=AttendanceType.check_out,
-        latitude=user_latitude,
-        longitude=user_longitude,
-        status=attendance_status
-    )
-    db.add(attendance_record)
+    # Create attendance record; 今日重複打卡由唯一鍵拒絕
+    record_id = insert_punch(db, {
+        "user_id": current_user.id,
+        "company_id": current_user.company_id,
+        "record_time": current_time,
+        "work_date": work_date,
+        "record_type": AttendanceType.check_out,
+        "latitude": user_latitude,
+        "longitude": user_longitude,
+        "status": attendance_status
+    })
+    if record_id is None:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="今日已經下班打卡。")
     db.commit()
-    db.refresh(attendance_record)
 
     # 構建狀態消息
     status_message = "下班打卡成功"
@@ -212,54 +241,42 @@ def check_out(
 
     return {
         "message": status_message,
-        "record_id": attendance_record.id,
+        "record_id": record_id,
         "distance_from_company": round(distance, 1),
         "status": attendance_status.value,
         "record_time": current_time.isoformat()
     }
 
-@router.get("/records", response_model=List[AttendanceRecordSchema])
-def get_attendance_records(
-    *,
-    db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user),
-    company_id: int | None = None,
-    department_id: int | None = None,
-    user_id: int | None = None,
-    start_date: date | None = None,
-    end_date: date | None = None,
-    skip: int = 0,
-    limit: int = 100
-) -> Any:
+def filter_attendance_records(
+    query: OrmQuery,
+    current_user: AuthenticatedPrincipal,
+    company_id: Optional[int],
+    department_id: Optional[int],
+    user_id: Optional[int],
+    start_date: Optional[date],
+    end_date: Optional[date],
+    user_joined: bool = False
+) -> OrmQuery:
     """
-    Retrieve attendance records with filtering options.
-    Super admins can view all records. Company admins can view records for their company.
+    套用出勤記錄的角色權限與篩選條件，列表與匯出共用
+    user_joined 表示查詢已 join users 表
     """
-    print(f"Current User ID: {current_user.id}, Role: {current_user.role}, Company ID: {current_user.company_id}, Department ID: {current_user.department_id}")
-    print(f"Params - Company ID: {company_id}, Department ID: {department_id}, User ID: {user_id}, Start Date: {start_date}, End Date: {end_date}")
-
-    query = db.query(AttendanceRecord).options(joinedload(AttendanceRecord.user), joinedload(AttendanceRecord.company))
-
     # Role-based access control
     if current_user.role == models.UserRole.company_admin:
         # Company admins can only see records for their company
         query = query.filter(AttendanceRecord.company_id == current_user.company_id)
         # If company_id is provided by a company admin, ensure it matches their company_id
         if company_id is not None and company_id != current_user.company_id:
-            print("403: Not authorized to view records for this company (company_admin)")
             raise HTTPException(status_code=403, detail="Not authorized to view records for this company")
     elif current_user.role == models.UserRole.employee or current_user.role == models.UserRole.department_head:
         # Employees and department heads can only see their own records
         query = query.filter(AttendanceRecord.user_id == current_user.id)
         # If any filter is provided by an employee/department head, it must match their own data
         if company_id is not None and company_id != current_user.company_id:
-            print("403: Not authorized to view records for this company (employee/department_head)")
             raise HTTPException(status_code=403, detail="Not authorized to view records for this company")
         if department_id is not None and department_id != current_user.department_id:
-            print("403: Not authorized to view records for this department (employee/department_head)")
             raise HTTPException(status_code=403, detail="Not authorized to view records for this department")
         if user_id is not None and user_id != current_user.id:
-            print("403: Not authorized to view records for other users (employee/department_head)")
             raise HTTPException(status_code=403, detail="Not authorized to view records for other users")
 
     # Apply filters
@@ -267,23 +284,112 @@ def get_attendance_records(
         query = query.filter(AttendanceRecord.company_id == company_id)
     if department_id is not None:
         # Need to join with User table to filter by department_id
-        query = query.join(models.User).filter(models.User.department_id == department_id)
+        if not user_joined:
+            query = query.join(models.User, models.User.id == AttendanceRecord.user_id)
+        query = query.filter(models.User.department_id == department_id)
     if user_id is not None:
         query = query.filter(AttendanceRecord.user_id == user_id)
     if start_date:
-        query = query.filter(AttendanceRecord.record_time >= start_date)
+        query = query.filter(AttendanceRecord.work_date >= start_date)
     if end_date:
-        query = query.filter(AttendanceRecord.record_time < datetime.combine(end_date, datetime.max.time()))
+        query = query.filter(AttendanceRecord.work_date <= end_date)
+
+    return query
+
+@router.get("/records", response_model=Union[List[AttendanceRecordSchema], CursorPage[AttendanceRecordSchema]])
+def get_attendance_records(
+    *,
+    db: Session = Depends(deps.get_db),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_principal),
+    company_id: int | None = None,
+    department_id: int | None = None,
+    user_id: int | None = None,
+    start_date: date | None = None,
+    end_date: date | None = None,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    compact: bool = False,
+    fields: Optional[str] = None,
+    user_fields: Optional[str] = Query(None, alias="fields[users]"),
+    company_fields: Optional[str] = Query(None, alias="fields[companies]")
+) -> Any:
+    """
+    Retrieve attendance records with filtering options.
+    Super admins can view all records. Company admins can view records for their company.
+    Pass `cursor` (empty for the first page) to use keyset pagination and get `{items, next_cursor}`;
+    without it the legacy skip/limit list is returned.
+    With `compact=true` rows carry only user_id/company_id and distinct users/companies are
+    returned once in `included`; `fields`, `fields[users]` and `fields[companies]` select columns.
+    """
+
+    query = db.query(AttendanceRecord)
+    if not compact:
+        query = query.options(joinedload(AttendanceRecord.user), joinedload(AttendanceRecord.company))
+
+    query = filter_attendance_records(
+        query, current_user, company_id, department_id, user_id, start_date, end_date
+    )
 
-    records = query.order_by(AttendanceRecord.record_time.desc()).offset(skip).limit(limit).all()
+    if cursor is not None:
+        records, next_cursor = keyset_page(
+            query, AttendanceRecord.record_time, AttendanceRecord.id, cursor, limit
+        )
+    else:
+        records = query.order_by(AttendanceRecord.record_time.desc()).offset(skip).limit(limit).all()
+        next_cursor = None
+
+    if compact:
+        return JSONResponse(build_compact_response(
+            db, records, AttendanceRecordCompact,
+            fields=parse_fields(fields),
+            user_fields=parse_fields(user_fields),
+            company_fields=parse_fields(company_fields),
+            next_cursor=next_cursor
+        ))
+    if cursor is not None:
+        return CursorPage[AttendanceRecordSchema](items=records, next_cursor=next_cursor)
     return records
 
+@router.get("/records/export")
+def export_attendance_records(
+    *,
+    db: Session = Depends(deps.get_db),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_principal),
+    company_id: int | None = None,
+    department_id: int | None = None,
+    user_id: int | None = None,
+    start_date: date | None = None,
+    end_date: date | None = None,
+    export_format: str = Query("csv", alias="format", pattern="^(csv|ndjson)$")
+) -> Any:
+    """
+    Stream attendance records as CSV or NDJSON with the same filters and role checks as /records.
+    Rows are read through a server-side cursor in batches, so memory use does not grow with the export size.
+    """
+    query = filter_attendance_records(
+        attendance_export_query(db), current_user, company_id, department_id, user_id, start_date, end_date, user_joined=True
+    )
+    rows = query.order_by(AttendanceRecord.record_time, AttendanceRecord.id).yield_per(EXPORT_YIELD_PER)
+
+    if export_format == "ndjson":
+        return StreamingResponse(
+            stream_ndjson(rows, ATTENDANCE_EXPORT_COLUMNS),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": 'attachment; filename="attendance_records.ndjson"'}
+        )
+    return StreamingResponse(
+        stream_csv(rows, ATTENDANCE_EXPORT_COLUMNS),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": 'attachment; filename="attendance_records.csv"'}
+    )
+
 @router.post("/overtime-start", response_model=dict)
 def overtime_start(
     *,
     db: Session = Depends(deps.get_db),
     attendance_request: AttendanceRequest,
-    current_user: User = Depends(deps.get_current_user)
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_principal)
 ) -> Any:
     """
     Employee overtime start (clock-in) with location validation.
@@ -292,54 +398,47 @@ def overtime_start(
     user_latitude = attendance_request.latitude
     user_longitude = attendance_request.longitude
 
-    # Get company location
-    company = db.query(Company).filter(Company.id == current_user.company_id).first()
-    if not company:
+    # Get company policy from the per-process cache
+    policy = get_company_policy(db, current_user.company_id)
+    if not policy:
         raise HTTPException(status_code=404, detail="找不到公司資訊")
 
     # Validate location if company has coordinates set
-    distance_limit = float(company.attendance_distance_limit) if company.attendance_distance_limit else 100.0
     is_valid_location, distance = is_within_range(
         user_latitude, user_longitude,
-        float(company.latitude) if company.latitude else None,
-        float(company.longitude) if company.longitude else None,
-        max_distance=distance_limit
+        policy.latitude, policy.longitude,
+        max_distance=policy.distance_limit
     )
 
     if not is_valid_location:
         raise HTTPException(
             status_code=403,
-            detail=f"您距離公司位置{distance:.1f}公尺。請在距離辦公室{distance_limit:.0f}公尺範圍內打卡。"
+            detail=f"您距離公司位置{distance:.1f}公尺。請在距離辦公室{policy.distance_limit:.0f}公尺範圍內打卡。"
         )
 
-    # Check if already started overtime today
-    today_overtime_start = db.query(AttendanceRecord).filter(
-        AttendanceRecord.user_id == current_user.id,
-        AttendanceRecord.record_type == AttendanceType.overtime_start,
-        AttendanceRecord.record_time >= datetime.now().date()
-    ).first()
-
-    if today_overtime_start:
+    # 以公司當地時區決定今日的工作日期
+    current_time = local_now(policy.timezone)
+    work_date = current_time.date()
+
+    # Create attendance record; 今日重複打卡由唯一鍵拒絕
+    record_id = insert_punch(db, {
+        "user_id": current_user.id,
+        "company_id": current_user.company_id,
+        "record_time": current_time,
+        "work_date": work_date,
+        "record_type": AttendanceType.overtime_start,
+        "latitude": user_latitude,
+        "longitude": user_longitude,
+        "status": AttendanceStatus.normal
+    })
+    if record_id is None:
+        db.rollback()
         raise HTTPException(status_code=400, detail="今日已經開始加班打卡。")
-
-    # Create attendance record
-    current_time = datetime.now()
-    attendance_record = AttendanceRecord(
-        user_id=current_user.id,
-        company_id=current_user.company_id,
-        record_time=current_time,
-        record_type=AttendanceType.overtime_start,
-        latitude=user_latitude,
-        longitude=user_longitude,
-        status=AttendanceStatus.normal
-    )
-    db.add(attendance_record)
     db.commit()
-    db.refresh(attendance_record)
 
     return {
         "message": "加班開始打卡成功",
-        "record_id": attendance_record.id,
+        "record_id": record_id,
         "distance_from_company": round(distance, 1),
         "status": "normal",
         "record_time": current_time.isoformat()
@@ -350,7 +449,7 @@ def overtime_end(
     *,
     db: Session = Depends(deps.get_db),
     attendance_request: AttendanceRequest,
-    current_user: User = Depends(deps.get_current_user)
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_principal)
 ) -> Any:
     """
     Employee overtime end (clock-out) with location validation.
@@ -359,64 +458,49 @@ def overtime_end(
     user_latitude = attendance_request.latitude
     user_longitude = attendance_request.longitude
 
-    # Get company location
-    company = db.query(Company).filter(Company.id == current_user.company_id).first()
-    if not company:
+    # Get company policy from the per-process cache
+    policy = get_company_policy(db, current_user.company_id)
+    if not policy:
         raise HTTPException(status_code=404, detail="找不到公司資訊")
 
     # Validate location if company has coordinates set
-    distance_limit = float(company.attendance_distance_limit) if company.attendance_distance_limit else 100.0
     is_valid_location, distance = is_within_range(
         user_latitude, user_longitude,
-        float(company.latitude) if company.latitude else None,
-        float(company.longitude) if company.longitude else None,
-        max_distance=distance_limit
+        policy.latitude, policy.longitude,
+        max_distance=policy.distance_limit
     )
 
     if not is_valid_location:
         raise HTTPException(
             status_code=403,
-            detail=f"您距離公司位置{distance:.1f}公尺。請在距離辦公室{distance_limit:.0f}公尺範圍內打卡。"
+            detail=f"您距離公司位置{distance:.1f}公尺。請在距離辦公室{policy.distance_limit:.0f}公尺範圍內打卡。"
         )
 
-    # Check if overtime started today
-    today_overtime_start = db.query(AttendanceRecord).filter(
-        AttendanceRecord.user_id == current_user.id,
-        AttendanceRecord.record_type == AttendanceType.overtime_start,
-        AttendanceRecord.record_time >= datetime.now().date()
-    ).first()
-
-    if not today_overtime_start:
-        raise HTTPException(status_code=400, detail="今日尚未開始加班，無法結束加班。")
-
-    # Check if already ended overtime today
-    today_overtime_end = db.query(AttendanceRecord).filter(
-        AttendanceRecord.user_id == current_user.id,
-        AttendanceRecord.record_type == AttendanceType.overtime_end,
-        AttendanceRecord.record_time >= datetime.now().date()
-    ).first()
-
-    if today_overtime_end:
-        raise HTTPException(status_code=400, detail="今日已經結束加班打卡。")
-
-    # Create attendance record
-    current_time = datetime.now()
-    attendance_record = AttendanceRecord(
-        user_id=current_user.id,
-        company_id=current_user.company_id,
-        record_time=current_time,
-        record_type=AttendanceType.overtime_end,
-        latitude=user_latitude,
-        longitude=user_longitude,
-        status=AttendanceStatus.normal
-    )
-    db.add(attendance_record)
+    # 以公司當地時區的打卡時間找出 24 小時內未結束的加班，工作日期取加班開始的日期（可跨午夜）
+    current_time = local_now(policy.timezone)
+    work_date = open_session_work_date(db, current_user.id, AttendanceType.overtime_end, current_time)
+    if work_date is None:
+        raise HTTPException(status_code=400, detail="目前沒有進行中的加班，無法結束加班。")
+
+    # Create attendance record; 重複打卡由唯一鍵拒絕
+    record_id = insert_punch(db, {
+        "user_id": current_user.id,
+        "company_id": current_user.company_id,
+        "record_time": current_time,
+        "work_date": work_date,
+        "record_type": AttendanceType.overtime_end,
+        "latitude": user_latitude,
+        "longitude": user_longitude,
+        "status": AttendanceStatus.normal
+    })
+    if record_id is None:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="本次加班已經結束打卡。")
     db.commit()
-    db.refresh(attendance_record)
 
     return {
         "message": "加班結束打卡成功",
-        "record_id": attendance_record.id,
+        "record_id": record_id,
         "distance_from_company": round(distance, 1),
         "status": "normal",
         "record_time": current_time.isoformat()
@@ -1,9 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
-from typing import List, Any
+from typing import List, Any, Optional
+from datetime import date
 
 from app.api import deps
-from app.schemas.company import CompanyCreate, CompanyUpdate, Company, WorkScheduleUpdate, WorkSchedule # Changed from CompanyInDB
+from app.core.principals import AuthenticatedPrincipal
+from app.core.company_policy import invalidate_company_policy
+from app.core.report_cache import mark_report_month_stale
+from app.core.work_calendar import invalidate_work_calendar
+from app.schemas.company import (
+    CompanyCreate, CompanyUpdate, Company, WorkScheduleUpdate, WorkSchedule, # Changed from CompanyInDB
+    CompanyHolidayCreate, CompanyHoliday
+)
 from app.db import models
 
 router = APIRouter()
@@ -13,7 +22,7 @@ def create_company(
     *,
     db: Session = Depends(deps.get_db),
     company_in: CompanyCreate,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Create new company.
@@ -31,7 +40,7 @@ def read_companies(
     db: Session = Depends(deps.get_db),
     skip: int = 0,
     limit: int = 100,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Retrieve companies.
@@ -47,7 +56,7 @@ def read_company(
     *,
     db: Session = Depends(deps.get_db),
     company_id: int,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Get company by ID.
@@ -65,7 +74,7 @@ def update_company(
     db: Session = Depends(deps.get_db),
     company_id: int,
     company_in: CompanyUpdate,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Update a company.
@@ -81,6 +90,7 @@ def update_company(
             setattr(company, field, value)
         db.add(company)
         db.commit()
+        invalidate_company_policy(company_id)
         db.refresh(company)
         return company
     else:
@@ -91,7 +101,7 @@ def delete_company(
     *,
     db: Session = Depends(deps.get_db),
     company_id: int,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Delete a company.
@@ -104,6 +114,7 @@ def delete_company(
     if current_user.role == models.UserRole.super_admin or (current_user.role == models.UserRole.company_admin and company.id == current_user.company_id):
         db.delete(company)
         db.commit()
+        invalidate_company_policy(company_id)
         return company
     else:
         raise HTTPException(status_code=403, detail="Not authorized to delete this company")
@@ -114,7 +125,7 @@ def get_company_work_schedule(
     *,
     db: Session = Depends(deps.get_db),
     company_id: int,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Get company work schedule.
@@ -141,7 +152,7 @@ def update_company_work_schedule(
     db: Session = Depends(deps.get_db),
     company_id: int,
     schedule_in: WorkScheduleUpdate,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Update company work schedule.
@@ -166,6 +177,7 @@ def update_company_work_schedule(
 
     db.add(company)
     db.commit()
+    invalidate_company_policy(company_id)
     db.refresh(company)
 
     return WorkSchedule(
@@ -174,3 +186,91 @@ def update_company_work_schedule(
         late_tolerance_minutes=company.late_tolerance_minutes,
         early_leave_tolerance_minutes=company.early_leave_tolerance_minutes
     )
+
+
+@router.get("/{company_id}/holidays", response_model=List[CompanyHoliday])
+def get_company_holidays(
+    *,
+    db: Session = Depends(deps.get_db),
+    company_id: int,
+    year: Optional[int] = None,
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_principal),
+) -> Any:
+    """
+    Get national and company holidays (including make-up workdays).
+    """
+    if current_user.role != models.UserRole.super_admin and company_id != current_user.company_id:
+        raise HTTPException(status_code=403, detail="Not authorized to access this company")
+
+    query = db.query(models.CompanyHoliday).filter(
+        or_(models.CompanyHoliday.company_id == company_id, models.CompanyHoliday.company_id.is_(None))
+    )
+    if year is not None:
+        query = query.filter(
+            models.CompanyHoliday.holiday_date >= date(year, 1, 1),
+            models.CompanyHoliday.holiday_date < date(year + 1, 1, 1)
+        )
+    return query.order_by(models.CompanyHoliday.holiday_date, models.CompanyHoliday.id).all()
+
+
+@router.post("/{company_id}/holidays", response_model=CompanyHoliday)
+def create_company_holiday(
+    *,
+    db: Session = Depends(deps.get_db),
+    company_id: int,
+    holiday_in: CompanyHolidayCreate,
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_active_admin),
+) -> Any:
+    """
+    Add a company holiday or make-up workday.
+    """
+    company = db.query(models.Company).filter(models.Company.id == company_id).first()
+    if not company:
+        raise HTTPException(status_code=404, detail="Company not found")
+
+    if current_user.role == models.UserRole.company_admin and company.id != current_user.company_id:
+        raise HTTPException(status_code=403, detail="Not authorized to update this company")
+
+    existing = db.query(models.CompanyHoliday).filter(
+        models.CompanyHoliday.company_id == company_id,
+        models.CompanyHoliday.holiday_date == holiday_in.holiday_date
+    ).first()
+    if existing:
+        raise HTTPException(status_code=400, detail="Holiday already exists for this date")
+
+    holiday = models.CompanyHoliday(company_id=company_id, **holiday_in.model_dump())
+    db.add(holiday)
+    # 工作日變動影響缺勤統計與個人出勤表
+    mark_report_month_stale(db, company_id, holiday.holiday_date)
+    db.commit()
+    invalidate_work_calendar(company_id)
+    db.refresh(holiday)
+    return holiday
+
+
+@router.delete("/{company_id}/holidays/{holiday_id}", response_model=CompanyHoliday)
+def delete_company_holiday(
+    *,
+    db: Session = Depends(deps.get_db),
+    company_id: int,
+    holiday_id: int,
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_active_admin),
+) -> Any:
+    """
+    Delete a company holiday. National holidays are maintained by import_holidays.py.
+    """
+    if current_user.role == models.UserRole.company_admin and company_id != current_user.company_id:
+        raise HTTPException(status_code=403, detail="Not authorized to update this company")
+
+    holiday = db.query(models.CompanyHoliday).filter(
+        models.CompanyHoliday.id == holiday_id,
+        models.CompanyHoliday.company_id == company_id
+    ).first()
+    if not holiday:
+        raise HTTPException(status_code=404, detail="Holiday not found")
+
+    db.delete(holiday)
+    mark_report_month_stale(db, company_id, holiday.holiday_date)
+    db.commit()
+    invalidate_work_calendar(company_id)
+    return holiday
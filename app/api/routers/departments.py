@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from typing import List, Any
 
 from app.api import deps
+from app.core.principals import AuthenticatedPrincipal
 from app.schemas.department import DepartmentCreate, DepartmentUpdate, DepartmentInDB
 from app.db import models
 
@@ -14,7 +15,7 @@ def create_department(
     db: Session = Depends(deps.get_db),
     company_id: int,
     department_in: DepartmentCreate,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Create new department for a company.
@@ -34,7 +35,7 @@ def read_departments(
     company_id: int,
     skip: int = 0,
     limit: int = 100,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Retrieve departments for a company.
@@ -50,7 +51,7 @@ def read_department(
     db: Session = Depends(deps.get_db),
     company_id: int,
     department_id: int,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Get department by ID.
@@ -69,7 +70,7 @@ def update_department(
     company_id: int,
     department_id: int,
     department_in: DepartmentUpdate,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Update a department.
@@ -93,7 +94,7 @@ def delete_department(
     db: Session = Depends(deps.get_db),
     company_id: int,
     department_id: int,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Delete a department.
@@ -1,10 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session, joinedload
-from typing import Any, List, Optional
+from typing import Any, List, Optional, Union
 from datetime import datetime, date
 
 from app.api import deps
-from app.db.models import LeaveApplication, LeaveType, LeaveStatus, User, Company
+from app.core.principals import AuthenticatedPrincipal
+from app.core.report_cache import mark_report_range_stale
+from app.db.models import LeaveApplication, LeaveType, LeaveStatus, User, Company, LEAVE_OVERLAP_CONSTRAINT
 from app.schemas.leave import (
     LeaveApplicationCreate,
     LeaveApplicationUpdate,
@@ -12,19 +17,46 @@ from app.schemas.leave import (
     LeaveApplication as LeaveApplicationSchema,
     LeaveApplicationWithDetails,
     LeaveTypeInfo,
-    LeaveStatistics
+    LeaveStatistics,
+    LeaveBalance as LeaveBalanceSchema,
+    LeaveBalanceAdjustment,
+    LeaveAccrualRequest,
+    LeaveAccrualResult,
+    LeaveBulkReview,
+    LeaveBulkReviewResult
 )
 from app.db import models
+from app.schemas.pagination import CursorPage
+from app.utils.leave_counters import apply_leave_status_changes, count_leaves_by_status, read_leave_status_counts
+from app.utils.leave_ledger import adjust_leave_balance, get_leave_balances, record_leave_usage, reverse_leave_usage, run_yearly_accrual
+from app.utils.pagination import keyset_page
+from app.utils.sideload import build_compact_response, parse_fields
 
 router = APIRouter()
 
 
+def commit_leave(db: Session) -> None:
+    """
+    提交請假的新增或修改；時段重疊由資料庫約束原子地拒絕，不先查詢再寫入
+    """
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if LEAVE_OVERLAP_CONSTRAINT not in str(e.orig):
+            raise
+        raise HTTPException(
+            status_code=400,
+            detail="Leave application overlaps with existing leave request"
+        )
+
+
 @router.post("/", response_model=LeaveApplicationSchema)
 def create_leave_application(
     *,
     db: Session = Depends(deps.get_db),
     leave_in: LeaveApplicationCreate,
-    current_user: User = Depends(deps.get_current_user)
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_principal)
 ) -> Any:
     """
     Create new leave application.
@@ -33,21 +65,7 @@ def create_leave_application(
     if leave_in.start_date >= leave_in.end_date:
         raise HTTPException(status_code=400, detail="Start date must be before end date")
 
-    # 檢查是否有重疊的請假申請
-    overlapping_leave = db.query(LeaveApplication).filter(
-        LeaveApplication.user_id == current_user.id,
-        LeaveApplication.status.in_([LeaveStatus.pending, LeaveStatus.approved]),
-        LeaveApplication.start_date <= leave_in.end_date,
-        LeaveApplication.end_date >= leave_in.start_date
-    ).first()
-
-    if overlapping_leave:
-        raise HTTPException(
-            status_code=400,
-            detail="Leave application overlaps with existing leave request"
-        )
-
-    # 創建請假申請
+    # 創建請假申請，與既有請假重疊時由資料庫約束拒絕
     leave_application = LeaveApplication(
         user_id=current_user.id,
         company_id=current_user.company_id,
@@ -59,32 +77,43 @@ def create_leave_application(
     )
 
     db.add(leave_application)
-    db.commit()
+    apply_leave_status_changes(db, [(current_user.company_id, current_user.id, None, LeaveStatus.pending)])
+    commit_leave(db)
     db.refresh(leave_application)
 
     return leave_application
 
 
-@router.get("/", response_model=List[LeaveApplicationWithDetails])
+@router.get("/", response_model=Union[List[LeaveApplicationWithDetails], CursorPage[LeaveApplicationWithDetails]])
 def get_leave_applications(
     *,
     db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_principal),
     company_id: Optional[int] = None,
     user_id: Optional[int] = None,
     status: Optional[LeaveStatus] = None,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    compact: bool = False,
+    fields: Optional[str] = None,
+    user_fields: Optional[str] = Query(None, alias="fields[users]"),
+    company_fields: Optional[str] = Query(None, alias="fields[companies]")
 ) -> Any:
     """
     Retrieve leave applications with filtering options.
+    Pass `cursor` (empty for the first page) to use keyset pagination and get `{items, next_cursor}`.
+    With `compact=true` rows carry only user_id/company_id and distinct users/companies are
+    returned once in `included`; `fields`, `fields[users]` and `fields[companies]` select columns.
     """
-    query = db.query(LeaveApplication).options(
-        joinedload(LeaveApplication.user),
-        joinedload(LeaveApplication.company)
-    )
+    query = db.query(LeaveApplication)
+    if not compact:
+        query = query.options(
+            joinedload(LeaveApplication.user),
+            joinedload(LeaveApplication.company)
+        )
 
     # 權限控制
     if current_user.role == models.UserRole.employee:
@@ -120,13 +149,30 @@ def get_leave_applications(
     if end_date:
         query = query.filter(LeaveApplication.end_date <= datetime.combine(end_date, datetime.max.time()))
 
-    leaves = query.order_by(LeaveApplication.created_at.desc()).offset(skip).limit(limit).all()
+    if cursor is not None:
+        leaves, next_cursor = keyset_page(
+            query, LeaveApplication.created_at, LeaveApplication.id, cursor, limit
+        )
+    else:
+        leaves = query.order_by(LeaveApplication.created_at.desc()).offset(skip).limit(limit).all()
+        next_cursor = None
+
+    if compact:
+        return JSONResponse(build_compact_response(
+            db, leaves, LeaveApplicationSchema,
+            fields=parse_fields(fields),
+            user_fields=parse_fields(user_fields),
+            company_fields=parse_fields(company_fields),
+            next_cursor=next_cursor
+        ))
+    if cursor is not None:
+        return CursorPage[LeaveApplicationWithDetails](items=leaves, next_cursor=next_cursor)
     return leaves
 
 
 @router.get("/types", response_model=List[LeaveTypeInfo])
 def get_leave_types(
-    current_user: User = Depends(deps.get_current_user)
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_principal)
 ) -> Any:
     """
     Get all available leave types.
@@ -144,12 +190,212 @@ def get_leave_types(
     return leave_types
 
 
+@router.get("/statistics", response_model=LeaveStatistics)
+def get_leave_statistics(
+    *,
+    db: Session = Depends(deps.get_db),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_principal),
+    company_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    leave_type: Optional[LeaveType] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> Any:
+    """
+    Get leave application statistics.
+    只依公司/員工篩選時讀取計數表；指定假別或期間時以單一分組查詢計算
+    """
+    # 權限控制
+    if current_user.role == models.UserRole.employee:
+        user_id = current_user.id
+        company_id = None
+    elif current_user.role == models.UserRole.company_admin:
+        if company_id and company_id != current_user.company_id:
+            raise HTTPException(status_code=403, detail="Not authorized")
+        company_id = current_user.company_id
+    elif current_user.role != models.UserRole.super_admin:
+        company_id = None
+
+    if leave_type is None and start_date is None and end_date is None:
+        counts = read_leave_status_counts(db, company_id=company_id or None, user_id=user_id or None)
+    else:
+        query = db.query(LeaveApplication)
+        if company_id:
+            query = query.filter(LeaveApplication.company_id == company_id)
+        if user_id:
+            query = query.filter(LeaveApplication.user_id == user_id)
+        if leave_type:
+            query = query.filter(LeaveApplication.leave_type == leave_type)
+        # 與期間有重疊的請假
+        if start_date:
+            query = query.filter(LeaveApplication.end_date >= start_date)
+        if end_date:
+            query = query.filter(LeaveApplication.start_date <= end_date)
+        counts = count_leaves_by_status(query)
+
+    return LeaveStatistics(
+        total_applications=sum(counts.values()),
+        pending_applications=counts.get(LeaveStatus.pending, 0),
+        approved_applications=counts.get(LeaveStatus.approved, 0),
+        rejected_applications=counts.get(LeaveStatus.rejected, 0),
+        cancelled_applications=counts.get(LeaveStatus.cancelled, 0)
+    )
+
+
+@router.get("/balances", response_model=List[LeaveBalanceSchema])
+def get_leave_balance(
+    *,
+    db: Session = Depends(deps.get_db),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_principal),
+    user_id: Optional[int] = None,
+    year: Optional[int] = None
+) -> Any:
+    """
+    Get leave balances (entitled, used, remaining days) of a user for a year.
+    """
+    target_user_id = user_id or current_user.id
+    if target_user_id != current_user.id:
+        if current_user.role not in [models.UserRole.super_admin, models.UserRole.company_admin]:
+            raise HTTPException(status_code=403, detail="Not authorized to view this user's leave balance")
+        if current_user.role == models.UserRole.company_admin:
+            target_user = db.query(User.company_id).filter(User.id == target_user_id).first()
+            if not target_user or target_user.company_id != current_user.company_id:
+                raise HTTPException(status_code=403, detail="Not authorized to view this user's leave balance")
+
+    return get_leave_balances(db, target_user_id, year or datetime.now().year)
+
+
+@router.post("/balances/adjustments", response_model=List[LeaveBalanceSchema])
+def adjust_leave_balance_entry(
+    *,
+    db: Session = Depends(deps.get_db),
+    adjustment_in: LeaveBalanceAdjustment,
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_active_admin)
+) -> Any:
+    """
+    Adjust a user's leave entitlement. Recorded as a ledger entry.
+    """
+    target_user = db.query(User).filter(User.id == adjustment_in.user_id).first()
+    if not target_user or target_user.company_id is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    if current_user.role == models.UserRole.company_admin and target_user.company_id != current_user.company_id:
+        raise HTTPException(status_code=403, detail="Not authorized to adjust this user's leave balance")
+
+    adjust_leave_balance(
+        db, target_user, adjustment_in.leave_type, adjustment_in.year, adjustment_in.days,
+        note=adjustment_in.note, created_by=current_user.id
+    )
+    db.commit()
+    return get_leave_balances(db, target_user.id, adjustment_in.year)
+
+
+@router.post("/balances/accrual", response_model=LeaveAccrualResult)
+def accrue_leave_balances(
+    *,
+    db: Session = Depends(deps.get_db),
+    accrual_in: LeaveAccrualRequest,
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_active_admin)
+) -> Any:
+    """
+    Grant a yearly entitlement to every active employee of a company.
+    Employees who already received it for the year are skipped.
+    """
+    company_id = current_user.company_id
+    if current_user.role == models.UserRole.super_admin and accrual_in.company_id:
+        company_id = accrual_in.company_id
+    elif accrual_in.company_id and accrual_in.company_id != current_user.company_id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if company_id is None:
+        raise HTTPException(status_code=400, detail="company_id is required")
+
+    accrued = run_yearly_accrual(
+        db, company_id, accrual_in.year, accrual_in.leave_type, accrual_in.days, created_by=current_user.id
+    )
+    db.commit()
+    return LeaveAccrualResult(year=accrual_in.year, leave_type=accrual_in.leave_type, accrued_users=accrued)
+
+
+@router.post("/review/bulk", response_model=List[LeaveBulkReviewResult])
+def bulk_review_leave_applications(
+    *,
+    db: Session = Depends(deps.get_db),
+    review_in: LeaveBulkReview,
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_principal)
+) -> Any:
+    """
+    Approve or reject many leave applications in one transaction.
+    權限規則與單筆審核相同；不符合的項目於結果中標示失敗，其餘一次更新並 commit
+    """
+    if current_user.role == models.UserRole.employee:
+        raise HTTPException(status_code=403, detail="Not authorized to review leave applications")
+
+    # 請假與申請人一次載入，並鎖定以免與其他審核同時進行
+    leave_ids = {item.leave_id for item in review_in.items}
+    rows = db.query(LeaveApplication, User.department_id).join(
+        User, User.id == LeaveApplication.user_id
+    ).filter(LeaveApplication.id.in_(leave_ids)).with_for_update(of=LeaveApplication).all()
+    leaves_by_id = {leave.id: (leave, department_id) for leave, department_id in rows}
+
+    reviewed_at = datetime.now()
+    results: List[LeaveBulkReviewResult] = []
+    updates = []
+    reviewed = []
+    seen = set()
+    for item in review_in.items:
+        found = leaves_by_id.get(item.leave_id)
+        detail = None
+        if item.leave_id in seen:
+            detail = "Duplicate leave application in request"
+        elif found is None:
+            detail = "Leave application not found"
+        elif current_user.role == models.UserRole.company_admin and found[0].company_id != current_user.company_id:
+            detail = "Not authorized to review this leave application"
+        elif current_user.role == models.UserRole.department_head and found[1] != current_user.department_id:
+            # 部門主管只能審核自己部門的申請
+            detail = "Not authorized to review this leave application"
+        elif found[0].status != LeaveStatus.pending:
+            detail = "Can only review pending leave applications"
+        elif item.status not in [LeaveStatus.approved, LeaveStatus.rejected]:
+            detail = "Review status must be approved or rejected"
+        seen.add(item.leave_id)
+
+        if detail:
+            results.append(LeaveBulkReviewResult(leave_id=item.leave_id, success=False, detail=detail))
+            continue
+
+        leave = found[0]
+        values = {"id": leave.id, "status": item.status, "reviewed_by": current_user.id, "reviewed_at": reviewed_at}
+        if item.review_comment:
+            values["review_comment"] = item.review_comment
+        updates.append(values)
+        reviewed.append((leave, item.status))
+        results.append(LeaveBulkReviewResult(leave_id=leave.id, success=True, status=item.status))
+
+    if updates:
+        # 依主鍵批次更新；有無審核意見的項目欄位不同，分兩組執行
+        for with_comment in (True, False):
+            batch = [values for values in updates if ("review_comment" in values) == with_comment]
+            if batch:
+                db.execute(update(LeaveApplication), batch)
+
+        apply_leave_status_changes(
+            db, [(leave.company_id, leave.user_id, LeaveStatus.pending, status) for leave, status in reviewed]
+        )
+        approved = [leave for leave, status in reviewed if status == LeaveStatus.approved]
+        for leave in approved:
+            mark_report_range_stale(db, leave.company_id, leave.start_date, leave.end_date)
+        record_leave_usage(db, approved, created_by=current_user.id)
+        db.commit()
+
+    return results
+
+
 @router.get("/{leave_id}", response_model=LeaveApplicationWithDetails)
 def get_leave_application(
     *,
     db: Session = Depends(deps.get_db),
     leave_id: int,
-    current_user: User = Depends(deps.get_current_user)
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_principal)
 ) -> Any:
     """
     Get leave application by ID.
@@ -177,7 +423,7 @@ def update_leave_application(
     db: Session = Depends(deps.get_db),
     leave_id: int,
     leave_in: LeaveApplicationUpdate,
-    current_user: User = Depends(deps.get_current_user)
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_principal)
 ) -> Any:
     """
     Update leave application. Only the applicant can update pending applications.
@@ -203,23 +449,9 @@ def update_leave_application(
         if leave.start_date >= leave.end_date:
             raise HTTPException(status_code=400, detail="Start date must be before end date")
 
-        # 檢查重疊（排除自己）
-        overlapping_leave = db.query(LeaveApplication).filter(
-            LeaveApplication.user_id == current_user.id,
-            LeaveApplication.id != leave_id,
-            LeaveApplication.status.in_([LeaveStatus.pending, LeaveStatus.approved]),
-            LeaveApplication.start_date <= leave.end_date,
-            LeaveApplication.end_date >= leave.start_date
-        ).first()
-
-        if overlapping_leave:
-            raise HTTPException(
-                status_code=400,
-                detail="Leave application overlaps with existing leave request"
-            )
-
+    # 與其他請假重疊時由資料庫約束拒絕（排除自己）
     db.add(leave)
-    db.commit()
+    commit_leave(db)
     db.refresh(leave)
 
     return leave
@@ -231,7 +463,7 @@ def review_leave_application(
     db: Session = Depends(deps.get_db),
     leave_id: int,
     review_in: LeaveApplicationReview,
-    current_user: User = Depends(deps.get_current_user)
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_principal)
 ) -> Any:
     """
     Review leave application. Only admins and department heads can review.
@@ -257,7 +489,11 @@ def review_leave_application(
         raise HTTPException(status_code=400, detail="Can only review pending leave applications")
 
     # 更新審核信息
+    apply_leave_status_changes(db, [(leave.company_id, leave.user_id, leave.status, review_in.status)])
     leave.status = review_in.status
+    if leave.status == LeaveStatus.approved:
+        mark_report_range_stale(db, leave.company_id, leave.start_date, leave.end_date)
+        record_leave_usage(db, [leave], created_by=current_user.id)
     leave.reviewed_by = current_user.id
     leave.reviewed_at = datetime.now()
     if review_in.review_comment:
@@ -275,7 +511,7 @@ def cancel_leave_application(
     *,
     db: Session = Depends(deps.get_db),
     leave_id: int,
-    current_user: User = Depends(deps.get_current_user)
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_principal)
 ) -> Any:
     """
     Cancel leave application. Only the applicant can cancel.
@@ -290,52 +526,13 @@ def cancel_leave_application(
     if leave.status not in [LeaveStatus.pending, LeaveStatus.approved]:
         raise HTTPException(status_code=400, detail="Cannot cancel this leave application")
 
+    if leave.status == LeaveStatus.approved:
+        mark_report_range_stale(db, leave.company_id, leave.start_date, leave.end_date)
+        reverse_leave_usage(db, [leave], created_by=current_user.id)
+    apply_leave_status_changes(db, [(leave.company_id, leave.user_id, leave.status, LeaveStatus.cancelled)])
     leave.status = LeaveStatus.cancelled
     db.add(leave)
     db.commit()
     db.refresh(leave)
 
     return leave
-
-
-
-@router.get("/statistics", response_model=LeaveStatistics)
-def get_leave_statistics(
-    *,
-    db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user),
-    company_id: Optional[int] = None,
-    user_id: Optional[int] = None
-) -> Any:
-    """
-    Get leave application statistics.
-    """
-    query = db.query(LeaveApplication)
-
-    # 權限控制
-    if current_user.role == models.UserRole.employee:
-        query = query.filter(LeaveApplication.user_id == current_user.id)
-    elif current_user.role == models.UserRole.company_admin:
-        query = query.filter(LeaveApplication.company_id == current_user.company_id)
-
-    if company_id and current_user.role in [models.UserRole.super_admin, models.UserRole.company_admin]:
-        if current_user.role == models.UserRole.company_admin and company_id != current_user.company_id:
-            raise HTTPException(status_code=403, detail="Not authorized")
-        query = query.filter(LeaveApplication.company_id == company_id)
-
-    if user_id and current_user.role != models.UserRole.employee:
-        query = query.filter(LeaveApplication.user_id == user_id)
-
-    total = query.count()
-    pending = query.filter(LeaveApplication.status == LeaveStatus.pending).count()
-    approved = query.filter(LeaveApplication.status == LeaveStatus.approved).count()
-    rejected = query.filter(LeaveApplication.status == LeaveStatus.rejected).count()
-    cancelled = query.filter(LeaveApplication.status == LeaveStatus.cancelled).count()
-
-    return LeaveStatistics(
-        total_applications=total,
-        pending_applications=pending,
-        approved_applications=approved,
-        rejected_applications=rejected,
-        cancelled_applications=cancelled
-    )
\ No newline at end of file
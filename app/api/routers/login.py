@@ -4,13 +4,17 @@ from sqlalchemy.orm import Session
 from typing import Any
 
 from app.api import deps
-from app.core.security import create_access_token, verify_password
+from app.core.principals import principal_claims
+from app.core.hashing import verify_password
+from app.core.refresh_tokens import consume_refresh_token, issue_refresh_token, revoke_refresh_token_family
+from app.core.security import create_access_token
 from app.db.models import User as DBUser
+from app.schemas.token import RefreshTokenRequest, Token
 from app.schemas.user import User
 
 router = APIRouter()
 
-@router.post("/login/access-token")
+@router.post("/login/access-token", response_model=Token)
 def login_access_token(db: Session = Depends(deps.get_db), form_data: OAuth2PasswordRequestForm = Depends()):
     """
     OAuth2 compatible token login, get an access token for future requests.
@@ -46,11 +50,44 @@ def login_access_token(db: Session = Depends(deps.get_db), form_data: OAuth2Pass
 
     print("[SUCCESS] User is active")
 
-    access_token = create_access_token(subject=user.id)
+    access_token = create_access_token(subject=user.id, claims=principal_claims(user))
+    refresh_token = issue_refresh_token(db, user.id)
+    db.commit()
     print(f"[SUCCESS] Token created for user ID: {user.id}")
     print("=== LOGIN SUCCESS ===\n")
 
-    return {"access_token": access_token, "token_type": "bearer"}
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@router.post("/login/refresh", response_model=Token)
+def refresh_access_token(
+    *,
+    db: Session = Depends(deps.get_db),
+    refresh_in: RefreshTokenRequest
+) -> Any:
+    """
+    Exchange a refresh token for a new access token without re-entering the password.
+    The refresh token is rotated: the presented token is revoked and a new one is returned.
+    """
+    consumed = consume_refresh_token(db, refresh_in.refresh_token)
+    if consumed is None:
+        db.commit()
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    user = db.query(DBUser).filter(DBUser.id == consumed.user_id).first()
+    if not user or not user.is_active:
+        revoke_refresh_token_family(db, consumed.family_id)
+        db.commit()
+        raise HTTPException(status_code=400, detail="Inactive user")
+
+    access_token = create_access_token(subject=user.id, claims=principal_claims(user))
+    refresh_token = issue_refresh_token(db, user.id, family_id=consumed.family_id)
+    db.commit()
+
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
 
 @router.get("/users/me", response_model=User)
 def read_user_me(
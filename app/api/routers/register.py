@@ -3,9 +3,10 @@ from sqlalchemy.orm import Session
 from typing import Any
 
 from app.api import deps
+from app.core.principals import AuthenticatedPrincipal
 from app.schemas.user import UserRegister, User
 from app.db import models
-from app.core.security import get_password_hash
+from app.core.hashing import get_password_hash
 
 router = APIRouter()
 
@@ -77,7 +78,7 @@ def register_user(
 @router.get("/pending-users", response_model=list[User])
 def get_pending_users(
     db: Session = Depends(deps.get_db),
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Get all pending user registrations for admin approval.
@@ -92,7 +93,7 @@ def get_pending_users(
         # Company admin can only see pending users for their company
         pending_users = db.query(models.User).filter(
             models.User.status == models.UserStatus.pending,
-            models.User.company_tax_id == current_user.company.tax_id
+            models.User.company_id == current_user.company_id
         ).all()
     else:
         raise HTTPException(
@@ -108,7 +109,7 @@ def approve_user(
     db: Session = Depends(deps.get_db),
     user_id: int,
     department_id: int = None,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Approve a pending user registration.
@@ -128,7 +129,7 @@ def approve_user(
     # Check if current user can approve this user
     if current_user.role == models.UserRole.company_admin:
         # Company admin can only approve users for their company
-        if pending_user.company_tax_id != current_user.company.tax_id:
+        if pending_user.company_id != current_user.company_id:
             raise HTTPException(
                 status_code=403,
                 detail="您只能審核本公司的用戶申請"
@@ -178,7 +179,7 @@ def reject_user(
     db: Session = Depends(deps.get_db),
     user_id: int,
     rejection_reason: str,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Reject a pending user registration.
@@ -198,7 +199,7 @@ def reject_user(
     # Check if current user can reject this user
     if current_user.role == models.UserRole.company_admin:
         # Company admin can only reject users for their company
-        if pending_user.company_tax_id != current_user.company.tax_id:
+        if pending_user.company_id != current_user.company_id:
             raise HTTPException(
                 status_code=403,
                 detail="您只能審核本公司的用戶申請"
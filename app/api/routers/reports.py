@@ -1,15 +1,27 @@
-from datetime import datetime, date, timedelta
+from datetime import date
 from typing import List, Optional, Any, Dict
 from calendar import monthrange
-import calendar
-
-from fastapi import APIRouter, Depends, HTTPException, Query
+import json
+import os
+import secrets
+import tempfile
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_, extract, case
 
 from app.api import deps
-from app.db.models import AttendanceRecord, User, Company, AttendanceType, AttendanceStatus
-from app.schemas.user import User as UserSchema
+from app.core.principals import AuthenticatedPrincipal
+from app.core.report_cache import cached_report
+from app.core.report_jobs import ARTIFACT_FORMATS, ReportJobsBusy, submit_report_job
+from app.db.models import User, ReportJob, ReportJobStatus, ReportJobType
+from app.schemas.report_job import ReportJob as ReportJobSchema, ReportJobCreate
+from app.utils.attendance_summary import build_individual_record, build_individual_records, summarize_company_month
+from app.utils.department_summary import summarize_departments
+from app.utils.export import stream_csv
+from app.utils.report_export import SUMMARY_COLUMNS, ExportDependencyMissing, write_monthly_pdf, write_monthly_xlsx
+from app.utils.yearly_analytics import summarize_company_months
 
 router = APIRouter()
 
@@ -18,7 +30,7 @@ router = APIRouter()
 def get_monthly_attendance_summary(
     *,
     db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_principal),
     year: int = Query(..., description="年份"),
     month: int = Query(..., description="月份 (1-12)"),
     company_id: Optional[int] = Query(None, description="公司ID (super_admin可選其他公司)")
@@ -42,96 +54,156 @@ def get_monthly_attendance_summary(
     first_day = date(year, month, 1)
     last_day = date(year, month, monthrange(year, month)[1])
 
-    # 查詢該公司該月份的所有出勤記錄
-    query = db.query(
-        User.id.label('user_id'),
-        func.concat(User.first_name, ' ', User.last_name).label('user_name'),
-        User.email.label('user_email'),
-        func.count(
-            case(
-                (AttendanceRecord.record_type == AttendanceType.check_in, 1),
-                else_=None
-            )
-        ).label('check_in_count'),
-        func.count(
-            case(
-                (AttendanceRecord.record_type == AttendanceType.check_out, 1),
-                else_=None
-            )
-        ).label('check_out_count'),
-        func.count(
-            case(
-                (AttendanceRecord.record_type == AttendanceType.overtime_start, 1),
-                else_=None
-            )
-        ).label('overtime_start_count'),
-        func.count(
-            case(
-                (AttendanceRecord.record_type == AttendanceType.overtime_end, 1),
-                else_=None
-            )
-        ).label('overtime_end_count')
-    ).join(
-        AttendanceRecord, User.id == AttendanceRecord.user_id, isouter=True
-    ).filter(
-        User.company_id == target_company_id,
-        User.is_active == True,
-        or_(
-            AttendanceRecord.record_time == None,
-            and_(
-                func.date(AttendanceRecord.record_time) >= first_day,
-                func.date(AttendanceRecord.record_time) <= last_day
-            )
+    return cached_report(
+        db, "monthly_summary", target_company_id, year, month,
+        lambda: summarize_company_month(db, target_company_id, first_day, last_day)
+    )
+
+
+EXPORT_MEDIA_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "pdf": "application/pdf",
+    "csv": "text/csv; charset=utf-8",
+}
+
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+@router.get("/monthly-summary/export")
+def export_monthly_attendance_summary(
+    *,
+    db: Session = Depends(deps.get_db),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_principal),
+    year: int = Query(..., description="年份"),
+    month: int = Query(..., ge=1, le=12, description="月份 (1-12)"),
+    company_id: Optional[int] = Query(None, description="公司ID (super_admin可選其他公司)"),
+    export_format: str = Query("xlsx", alias="format", pattern="^(xlsx|pdf|csv)$")
+) -> Any:
+    """
+    匯出月度出勤統計與每位員工的出勤明細（Excel / PDF），CSV 僅包含月度統計
+    員工明細逐位產生，檔案先寫入暫存檔再分塊串流；PDF 在產生完成前會保留所有頁面，記憶體隨員工數增加
+    """
+
+    # 權限檢查
+    if current_user.role not in ["super_admin", "company_admin"]:
+        raise HTTPException(status_code=403, detail="沒有權限查看報表")
+
+    # 設定查詢的公司
+    if current_user.role == "super_admin" and company_id:
+        target_company_id = company_id
+    else:
+        target_company_id = current_user.company_id
+
+    first_day = date(year, month, 1)
+    last_day = date(year, month, monthrange(year, month)[1])
+    summary = cached_report(
+        db, "monthly_summary", target_company_id, year, month,
+        lambda: summarize_company_month(db, target_company_id, first_day, last_day)
+    )
+
+    filename = f"attendance_{year}{month:02d}.{export_format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+    if export_format == "csv":
+        rows = ([row[key] for _, key in SUMMARY_COLUMNS] for row in summary)
+        return StreamingResponse(
+            stream_csv(rows, [title for title, _ in SUMMARY_COLUMNS]),
+            media_type=EXPORT_MEDIA_TYPES["csv"],
+            headers=headers
         )
-    ).group_by(User.id, User.first_name, User.last_name, User.email)
-
-    results = query.all()
-
-    # 計算加班時數
-    summary_data = []
-    for result in results:
-        user_id = result.user_id
-
-        # 計算加班時數 - 查詢該用戶的加班記錄
-        overtime_records = db.query(AttendanceRecord).filter(
-            AttendanceRecord.user_id == user_id,
-            func.date(AttendanceRecord.record_time) >= first_day,
-            func.date(AttendanceRecord.record_time) <= last_day,
-            AttendanceRecord.record_type.in_([AttendanceType.overtime_start, AttendanceType.overtime_end])
-        ).order_by(AttendanceRecord.record_time).all()
-
-        # 計算配對的加班時數
-        overtime_hours = calculate_overtime_hours(overtime_records)
-
-        # 計算出勤天數（有check_in或check_out的天數）
-        attendance_days = db.query(
-            func.count(func.distinct(func.date(AttendanceRecord.record_time)))
-        ).filter(
-            AttendanceRecord.user_id == user_id,
-            func.date(AttendanceRecord.record_time) >= first_day,
-            func.date(AttendanceRecord.record_time) <= last_day,
-            AttendanceRecord.record_type.in_([AttendanceType.check_in, AttendanceType.check_out])
-        ).scalar() or 0
-
-        summary_data.append({
-            "user_id": user_id,
-            "user_name": result.user_name,
-            "user_email": result.user_email,
-            "attendance_days": attendance_days,
-            "check_in_count": result.check_in_count,
-            "check_out_count": result.check_out_count,
-            "overtime_hours": round(overtime_hours, 2),
-            "overtime_sessions": result.overtime_start_count
-        })
-
-    return summary_data
 
+    sheets = build_individual_records(db, target_company_id, year, month)
+    output = tempfile.SpooledTemporaryFile(max_size=EXPORT_CHUNK_SIZE * 16)
+    try:
+        if export_format == "xlsx":
+            write_monthly_xlsx(output, summary, sheets)
+        else:
+            write_monthly_pdf(output, f"{year} 年 {month} 月出勤統計", summary, sheets)
+    except ExportDependencyMissing as e:
+        output.close()
+        raise HTTPException(status_code=501, detail=f"伺服器未安裝 {e} 套件，無法匯出 {export_format}")
+    output.seek(0)
+
+    def stream_file():
+        try:
+            while chunk := output.read(EXPORT_CHUNK_SIZE):
+                yield chunk
+        finally:
+            output.close()
+
+    return StreamingResponse(stream_file(), media_type=EXPORT_MEDIA_TYPES[export_format], headers=headers)
+
+@router.get("/yearly-summary", response_model=List[Dict[str, Any]])
+def get_yearly_attendance_summary(
+    *,
+    db: Session = Depends(deps.get_db),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_principal),
+    year: int = Query(..., description="年份"),
+    start_month: int = Query(1, ge=1, le=12, description="起始月份"),
+    end_month: int = Query(12, ge=1, le=12, description="結束月份"),
+    company_id: Optional[int] = Query(None, description="公司ID (super_admin可選其他公司)"),
+    department_id: Optional[int] = Query(None, description="部門ID")
+) -> Any:
+    """
+    獲取多個月份的員工出勤統計（年度考核）
+    包含：每月與合計的出勤天數、工作時數、加班時數、遲到/早退次數及遲到率
+    """
+
+    # 權限檢查
+    if current_user.role not in ["super_admin", "company_admin"]:
+        raise HTTPException(status_code=403, detail="沒有權限查看報表")
+
+    if start_month > end_month:
+        raise HTTPException(status_code=400, detail="起始月份不可大於結束月份")
+
+    # 設定查詢的公司
+    if current_user.role == "super_admin" and company_id:
+        target_company_id = company_id
+    else:
+        target_company_id = current_user.company_id
+
+    return summarize_company_months(db, target_company_id, year, start_month, end_month, department_id)
+
+@router.get("/department-summary", response_model=Dict[str, Any])
+def get_department_summary(
+    *,
+    db: Session = Depends(deps.get_db),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_principal),
+    year: int = Query(..., description="年份"),
+    month: int = Query(..., ge=1, le=12, description="月份 (1-12)"),
+    company_id: Optional[int] = Query(None, description="公司ID (super_admin可選其他公司)"),
+    department_id: Optional[int] = Query(None, description="部門ID")
+) -> Any:
+    """
+    獲取部門出勤統計
+    包含：每位員工、各部門小計與公司合計；部門主管只能查看自己的部門
+    """
+
+    # 權限檢查
+    if current_user.role not in ["super_admin", "company_admin", "department_head"]:
+        raise HTTPException(status_code=403, detail="沒有權限查看報表")
+
+    # 設定查詢的公司與部門
+    if current_user.role == "super_admin" and company_id:
+        target_company_id = company_id
+    else:
+        target_company_id = current_user.company_id
+
+    if current_user.role == "department_head":
+        if not current_user.department_id:
+            raise HTTPException(status_code=403, detail="尚未指派部門，無法查看部門報表")
+        department_id = current_user.department_id
+
+    first_day = date(year, month, 1)
+    last_day = date(year, month, monthrange(year, month)[1])
+
+    return summarize_departments(db, target_company_id, first_day, last_day, department_id)
 
 @router.get("/individual-record", response_model=Dict[str, Any])
 def get_individual_attendance_record(
     *,
     db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_principal),
     user_id: int = Query(..., description="員工ID"),
     year: int = Query(..., description="年份"),
     month: int = Query(..., description="月份 (1-12)")
@@ -154,159 +226,157 @@ def get_individual_attendance_record(
     if current_user.role == "company_admin" and target_user.company_id != current_user.company_id:
         raise HTTPException(status_code=403, detail="沒有權限查看其他公司員工記錄")
 
-    # 計算月份範圍
-    first_day = date(year, month, 1)
-    last_day = date(year, month, monthrange(year, month)[1])
+    return cached_report(
+        db, "individual_record", target_user.company_id, year, month,
+        lambda: build_individual_record(db, target_user, year, month),
+        user_id=user_id
+    )
 
-    # 查詢該員工該月份的所有出勤記錄
-    attendance_records = db.query(AttendanceRecord).filter(
-        AttendanceRecord.user_id == user_id,
-        func.date(AttendanceRecord.record_time) >= first_day,
-        func.date(AttendanceRecord.record_time) <= last_day
-    ).order_by(AttendanceRecord.record_time).all()
-
-    # 按日期組織數據
-    daily_records = {}
-    for record in attendance_records:
-        record_date = record.record_time.date()
-        if record_date not in daily_records:
-            daily_records[record_date] = {
-                "date": record_date,
-                "weekday": calendar.day_name[record_date.weekday()],
-                "weekday_zh": get_chinese_weekday(record_date.weekday()),
-                "check_in": None,
-                "check_out": None,
-                "overtime_start": None,
-                "overtime_end": None,
-                "work_hours": 0,
-                "overtime_hours": 0
-            }
-
-        if record.record_type == AttendanceType.check_in:
-            daily_records[record_date]["check_in"] = record.record_time.strftime("%H:%M")
-        elif record.record_type == AttendanceType.check_out:
-            daily_records[record_date]["check_out"] = record.record_time.strftime("%H:%M")
-        elif record.record_type == AttendanceType.overtime_start:
-            daily_records[record_date]["overtime_start"] = record.record_time.strftime("%H:%M")
-        elif record.record_type == AttendanceType.overtime_end:
-            daily_records[record_date]["overtime_end"] = record.record_time.strftime("%H:%M")
-
-    # 計算工作時數和加班時數
-    for date_key, day_data in daily_records.items():
-        # 計算正常工作時數
-        if day_data["check_in"] and day_data["check_out"]:
-            check_in_time = datetime.strptime(day_data["check_in"], "%H:%M").time()
-            check_out_time = datetime.strptime(day_data["check_out"], "%H:%M").time()
-
-            check_in_datetime = datetime.combine(date_key, check_in_time)
-            check_out_datetime = datetime.combine(date_key, check_out_time)
-
-            # 如果下班時間小於上班時間，說明跨天了
-            if check_out_time < check_in_time:
-                check_out_datetime += timedelta(days=1)
-
-            work_duration = check_out_datetime - check_in_datetime
-            day_data["work_hours"] = round(work_duration.total_seconds() / 3600, 2)
-
-        # 計算加班時數
-        if day_data["overtime_start"] and day_data["overtime_end"]:
-            overtime_start_time = datetime.strptime(day_data["overtime_start"], "%H:%M").time()
-            overtime_end_time = datetime.strptime(day_data["overtime_end"], "%H:%M").time()
-
-            overtime_start_datetime = datetime.combine(date_key, overtime_start_time)
-            overtime_end_datetime = datetime.combine(date_key, overtime_end_time)
-
-            # 如果加班結束時間小於開始時間，說明跨天了
-            if overtime_end_time < overtime_start_time:
-                overtime_end_datetime += timedelta(days=1)
-
-            overtime_duration = overtime_end_datetime - overtime_start_datetime
-            day_data["overtime_hours"] = round(overtime_duration.total_seconds() / 3600, 2)
-
-    # 建立完整月份的記錄（包含沒有出勤記錄的日期）
-    monthly_records = []
-    current_date = first_day
-
-    while current_date <= last_day:
-        weekday = current_date.weekday()
-        # 只排除周末，但如果有加班記錄則保留
-        is_weekend = weekday in [5, 6]  # 5=Saturday, 6=Sunday
-
-        if current_date in daily_records:
-            # 有記錄的日期
-            record = daily_records[current_date]
-            monthly_records.append(record)
-        elif not is_weekend:
-            # 工作日但沒有記錄
-            monthly_records.append({
-                "date": current_date,
-                "weekday": calendar.day_name[weekday],
-                "weekday_zh": get_chinese_weekday(weekday),
-                "check_in": None,
-                "check_out": None,
-                "overtime_start": None,
-                "overtime_end": None,
-                "work_hours": 0,
-                "overtime_hours": 0
-            })
-        elif is_weekend and current_date in daily_records and (
-            daily_records[current_date]["overtime_start"] or daily_records[current_date]["overtime_end"]
-        ):
-            # 周末但有加班記錄
-            record = daily_records[current_date]
-            monthly_records.append(record)
-
-        current_date += timedelta(days=1)
-
-    # 計算月度統計
-    total_work_hours = sum(record["work_hours"] for record in monthly_records)
-    total_overtime_hours = sum(record["overtime_hours"] for record in monthly_records)
-    total_attendance_days = len([record for record in monthly_records if record["check_in"]])
-
-    # 獲取用戶和公司信息
-    company = db.query(Company).filter(Company.id == target_user.company_id).first()
-
-    return {
-        "user_info": {
-            "id": target_user.id,
-            "name": f"{target_user.first_name} {target_user.last_name}",
-            "email": target_user.email,
-            "company_name": company.name if company else "",
-            "department_name": target_user.department.name if target_user.department else ""
-        },
-        "period": {
-            "year": year,
-            "month": month,
-            "month_name": calendar.month_name[month]
-        },
-        "daily_records": monthly_records,
-        "summary": {
-            "total_work_hours": round(total_work_hours, 2),
-            "total_overtime_hours": round(total_overtime_hours, 2),
-            "total_attendance_days": total_attendance_days,
-            "total_records": len(monthly_records)
-        }
-    }
 
 
-def calculate_overtime_hours(overtime_records: List[AttendanceRecord]) -> float:
-    """計算加班時數，將start和end記錄配對"""
-    overtime_hours = 0.0
-    start_record = None
+@router.get("/individual-records/bulk")
+def get_bulk_individual_attendance_records(
+    *,
+    db: Session = Depends(deps.get_db),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_principal),
+    year: int = Query(..., description="年份"),
+    month: int = Query(..., ge=1, le=12, description="月份 (1-12)"),
+    company_id: Optional[int] = Query(None, description="公司ID (super_admin可選其他公司)"),
+    department_id: Optional[int] = Query(None, description="部門ID")
+) -> Any:
+    """
+    一次取得公司（或部門）所有在職員工的個人出勤紀錄表（薪資作業用）
+    以 JSON 陣列串流回傳，每個元素與 /individual-record 的格式相同
+    """
+
+    # 權限檢查
+    if current_user.role not in ["super_admin", "company_admin"]:
+        raise HTTPException(status_code=403, detail="沒有權限查看報表")
+
+    # 設定查詢的公司
+    if current_user.role == "super_admin" and company_id:
+        target_company_id = company_id
+    else:
+        target_company_id = current_user.company_id
+
+    sheets = build_individual_records(db, target_company_id, year, month, department_id)
+
+    def stream_sheets():
+        yield "["
+        for index, sheet in enumerate(sheets):
+            if index:
+                yield ","
+            yield json.dumps(jsonable_encoder(sheet), ensure_ascii=False)
+        yield "]"
 
-    for record in overtime_records:
-        if record.record_type == AttendanceType.overtime_start:
-            start_record = record
-        elif record.record_type == AttendanceType.overtime_end and start_record:
-            # 計算加班時數
-            duration = record.record_time - start_record.record_time
-            overtime_hours += duration.total_seconds() / 3600
-            start_record = None
+    return StreamingResponse(stream_sheets(), media_type="application/json")
 
-    return overtime_hours
+def report_job_response(request: Request, job: ReportJob) -> ReportJobSchema:
+    response = ReportJobSchema.model_validate(job)
+    if job.status == ReportJobStatus.completed:
+        # 由路由產生網址，掛載前綴或 root_path 變動時不需修改
+        response.download_url = str(request.url_for("download_report_job", job_id=job.id))
+    return response
 
 
-def get_chinese_weekday(weekday: int) -> str:
-    """轉換星期幾為中文"""
-    weekdays = ["一", "二", "三", "四", "五", "六", "日"]
-    return weekdays[weekday]
\ No newline at end of file
+def get_visible_report_job(db: Session, job_id: str, current_user: AuthenticatedPrincipal) -> ReportJob:
+    job = db.query(ReportJob).filter(ReportJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="報表工作不存在")
+    if current_user.role != "super_admin" and job.company_id != current_user.company_id:
+        raise HTTPException(status_code=403, detail="沒有權限查看此報表工作")
+    return job
+
+
+@router.post("/jobs", response_model=ReportJobSchema, status_code=status.HTTP_202_ACCEPTED)
+def create_report_job(
+    *,
+    request: Request,
+    db: Session = Depends(deps.get_db),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_active_admin),
+    job_in: ReportJobCreate
+) -> Any:
+    """
+    建立背景報表工作，於報表專用的行程池執行
+    以 GET /jobs/{job_id} 查詢進度，完成後由 download_url 下載
+    """
+    if current_user.role == "super_admin" and job_in.company_id:
+        target_company_id = job_in.company_id
+    else:
+        target_company_id = current_user.company_id
+    if not target_company_id:
+        raise HTTPException(status_code=400, detail="請指定公司")
+
+    if job_in.job_type == ReportJobType.records_export:
+        if not job_in.start_date or not job_in.end_date or job_in.start_date > job_in.end_date:
+            raise HTTPException(status_code=400, detail="請提供有效的 start_date 與 end_date")
+        params = {
+            "start_date": job_in.start_date.isoformat(),
+            "end_date": job_in.end_date.isoformat(),
+            "department_id": job_in.department_id,
+            "user_id": job_in.user_id
+        }
+    else:
+        if not job_in.year or not job_in.month or not 1 <= job_in.month <= 12:
+            raise HTTPException(status_code=400, detail="請提供有效的 year 與 month")
+        params = {"year": job_in.year, "month": job_in.month}
+
+    job = ReportJob(
+        id=secrets.token_hex(16),
+        company_id=target_company_id,
+        requested_by=current_user.id,
+        job_type=job_in.job_type,
+        params=params,
+        status=ReportJobStatus.queued,
+        progress=0
+    )
+    db.add(job)
+    db.commit()
+
+    try:
+        submit_report_job(job.id)
+    except ReportJobsBusy:
+        db.delete(job)
+        db.commit()
+        raise HTTPException(
+            status_code=503,
+            detail="報表工作佇列已滿，請稍後再試",
+            headers={"Retry-After": "30"}
+        )
+
+    db.refresh(job)
+    return report_job_response(request, job)
+
+
+@router.get("/jobs/{job_id}", response_model=ReportJobSchema)
+def get_report_job(
+    *,
+    request: Request,
+    db: Session = Depends(deps.get_db),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_active_admin),
+    job_id: str
+) -> Any:
+    """查詢報表工作狀態與進度"""
+    return report_job_response(request, get_visible_report_job(db, job_id, current_user))
+
+
+@router.get("/jobs/{job_id}/download")
+def download_report_job(
+    *,
+    db: Session = Depends(deps.get_db),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_active_admin),
+    job_id: str
+) -> Any:
+    """下載已完成的報表"""
+    job = get_visible_report_job(db, job_id, current_user)
+    if job.status != ReportJobStatus.completed:
+        raise HTTPException(status_code=409, detail="報表尚未完成")
+    if not job.artifact_path or not os.path.exists(job.artifact_path):
+        raise HTTPException(status_code=410, detail="報表檔案已不存在")
+
+    extension, media_type = ARTIFACT_FORMATS[job.job_type]
+    return FileResponse(
+        job.artifact_path,
+        media_type=media_type,
+        filename=f"{job.job_type.value}_{job.id}.{extension}"
+    )
@@ -1,11 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from typing import List, Any
+from typing import List, Any, Optional, Union
 
 from app.api import deps
+from app.core.principals import AuthenticatedPrincipal, bump_token_version, principal_cache
+from app.core.refresh_tokens import revoke_user_refresh_tokens
 from app.schemas.user import UserCreate, UserUpdate, User
 from app.db import models
-from app.core.security import get_password_hash
+from app.schemas.pagination import CursorPage
+from app.utils.pagination import keyset_page
+from app.core.hashing import get_password_hash
 
 router = APIRouter()
 
@@ -15,7 +19,7 @@ def create_user(
     db: Session = Depends(deps.get_db),
     company_id: int,
     user_in: UserCreate,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Create new user.
@@ -31,7 +35,7 @@ def create_user(
     db_obj = models.User(
         username=user_in.username,
         email=user_in.email,
-        password_hash=get_password_hash(user_in.password),
+        hashed_password=get_password_hash(user_in.password),
         first_name=user_in.first_name,
         last_name=user_in.last_name,
         role=user_in.role,
@@ -43,21 +47,29 @@ def create_user(
     db.refresh(db_obj)
     return db_obj
 
-@router.get("/", response_model=List[User])
+@router.get("/", response_model=Union[List[User], CursorPage[User]])
 def read_users(
     *,
     db: Session = Depends(deps.get_db),
     company_id: int,
     skip: int = 0,
     limit: int = 100,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    cursor: Optional[str] = None,
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Retrieve users for a company.
+    Pass `cursor` (empty for the first page) to page by (created_at, id) and get `{items, next_cursor}`.
     """
     if current_user.role == models.UserRole.company_admin and company_id != current_user.company_id:
         raise HTTPException(status_code=403, detail="Not authorized to view users for this company")
-    users = db.query(models.User).filter(models.User.company_id == company_id).offset(skip).limit(limit).all()
+    query = db.query(models.User).filter(models.User.company_id == company_id)
+    if cursor is not None:
+        users, next_cursor = keyset_page(
+            query, models.User.created_at, models.User.id, cursor, limit, descending=False
+        )
+        return CursorPage[User](items=users, next_cursor=next_cursor)
+    users = query.offset(skip).limit(limit).all()
     return users
 
 @router.get("/{user_id}", response_model=User)
@@ -66,7 +78,7 @@ def read_user(
     db: Session = Depends(deps.get_db),
     company_id: int,
     user_id: int,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Get user by ID.
@@ -85,7 +97,7 @@ def update_user(
     company_id: int,
     user_id: int,
     user_in: UserUpdate,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Update a user.
@@ -97,12 +109,16 @@ def update_user(
         raise HTTPException(status_code=404, detail="User not found")
     update_data = user_in.model_dump(exclude_unset=True)
     if "password" in update_data and update_data["password"]:
-        update_data["password_hash"] = get_password_hash(update_data["password"])
-        del update_data["password"]
+        update_data["hashed_password"] = get_password_hash(update_data["password"])
+    update_data.pop("password", None)
     for field, value in update_data.items():
         setattr(user, field, value)
+    # 帳號異動後既有 token 內的 claims 已過時，refresh token 也一併撤銷，避免再換發新的 access token
+    token_version = bump_token_version(user)
+    revoke_user_refresh_tokens(db, user.id)
     db.add(user)
     db.commit()
+    principal_cache.revoke(user.id, token_version)
     db.refresh(user)
     return user
 
@@ -112,7 +128,7 @@ def delete_user(
     db: Session = Depends(deps.get_db),
     company_id: int,
     user_id: int,
-    current_user: models.User = Depends(deps.get_current_active_admin),
+    current_user: AuthenticatedPrincipal = Depends(deps.get_current_active_admin),
 ) -> Any:
     """
     Delete a user.
@@ -122,6 +138,8 @@ def delete_user(
     user = db.query(models.User).filter(models.User.company_id == company_id, models.User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    revoke_user_refresh_tokens(db, user.id)
     db.delete(user)
     db.commit()
+    principal_cache.revoke(user_id, (user.token_version or 0) + 1)
     return user
\ No newline at end of file
@@ -0,0 +1,85 @@
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import Company
+
+DEFAULT_DISTANCE_LIMIT = 100.0
+
+
+class CompanyPolicy:
+    """
+    打卡所需的公司設定快照（座標、距離限制、工作時間、時區）
+    DECIMAL 欄位於建立時一次轉換為 float
+    """
+    __slots__ = (
+        "company_id",
+        "latitude",
+        "longitude",
+        "distance_limit",
+        "work_start_time",
+        "work_end_time",
+        "late_tolerance_minutes",
+        "early_leave_tolerance_minutes",
+        "timezone",
+    )
+
+    def __init__(self, company: Company):
+        self.company_id = company.id
+        self.latitude = float(company.latitude) if company.latitude is not None else None
+        self.longitude = float(company.longitude) if company.longitude is not None else None
+        self.distance_limit = (
+            float(company.attendance_distance_limit) if company.attendance_distance_limit else DEFAULT_DISTANCE_LIMIT
+        )
+        self.work_start_time = company.work_start_time
+        self.work_end_time = company.work_end_time
+        self.late_tolerance_minutes = company.late_tolerance_minutes
+        self.early_leave_tolerance_minutes = company.early_leave_tolerance_minutes
+        self.timezone = company.timezone
+
+
+# company_id -> (policy, 載入時間)
+_policies: Dict[int, Tuple[CompanyPolicy, float]] = {}
+_lock = threading.Lock()
+
+
+def get_company_policy(db: Session, company_id: Optional[int]) -> Optional[CompanyPolicy]:
+    """
+    取得公司打卡設定，快取未命中或過期時才查詢資料庫
+    TTL 僅作為多個 worker 行程之間的保險，設定變更時由 companies router 主動失效
+    """
+    if company_id is None:
+        return None
+
+    cached = _policies.get(company_id)
+    if cached is not None and time.monotonic() - cached[1] < settings.COMPANY_POLICY_CACHE_TTL_SECONDS:
+        return cached[0]
+
+    company = db.query(Company).filter(Company.id == company_id).first()
+    if not company:
+        invalidate_company_policy(company_id)
+        return None
+
+    policy = CompanyPolicy(company)
+    with _lock:
+        _policies[company_id] = (policy, time.monotonic())
+    return policy
+
+
+def invalidate_company_policy(company_id: int) -> None:
+    """公司設定變更或刪除後移除快取"""
+    with _lock:
+        _policies.pop(company_id, None)
+
+
+def warm_company_policies(db: Session) -> int:
+    """啟動時預先載入所有公司的打卡設定"""
+    loaded_at = time.monotonic()
+    policies = {company.id: (CompanyPolicy(company), loaded_at) for company in db.query(Company).all()}
+    with _lock:
+        _policies.clear()
+        _policies.update(policies)
+    return len(policies)
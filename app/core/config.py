@@ -7,6 +7,25 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "your_12541_super_secret_key_for_dev"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 14
+
+    # Cache Configuration
+    COMPANY_POLICY_CACHE_TTL_SECONDS: int = 300
+    WORK_CALENDAR_CACHE_TTL_SECONDS: int = 300
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10000
+    REPORT_CACHE_TTL_SECONDS: int = 300
+    REPORT_CACHE_MAX_SIZE: int = 1000
+
+    # Password Hashing Pool Configuration
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_CONCURRENCY: int = 8
+    PASSWORD_HASH_TIMEOUT_SECONDS: float = 5.0
+
+    # Report Job Configuration
+    REPORT_JOB_WORKERS: int = 2
+    REPORT_JOB_MAX_PENDING: int = 16
+    REPORT_JOB_DIR: str = "report_jobs"
 
     # PostgreSQL Configuration
     POSTGRES_DB: Optional[str] = None
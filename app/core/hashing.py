@@ -0,0 +1,58 @@
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from app.core import security
+from app.core.config import settings
+
+T = TypeVar("T")
+
+
+class PasswordHashingBusy(Exception):
+    """密碼雜湊的併發數已達上限，請求應立即被拒絕而非排隊"""
+
+
+_executor: Optional[Executor] = None
+_executor_lock = threading.Lock()
+_admission = threading.BoundedSemaphore(settings.PASSWORD_HASH_MAX_CONCURRENCY)
+
+
+def start_password_pool() -> None:
+    """建立專用的 bcrypt 行程池；PASSWORD_HASH_WORKERS 為 0 時於呼叫端執行緒計算"""
+    global _executor
+    with _executor_lock:
+        if _executor is None and settings.PASSWORD_HASH_WORKERS > 0:
+            _executor = ProcessPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS)
+
+
+def shutdown_password_pool() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def _run(func: Callable[..., T], *args) -> T:
+    # 超過併發上限時直接拒絕，避免登入尖峰佔滿共用的執行緒池
+    if not _admission.acquire(blocking=False):
+        raise PasswordHashingBusy()
+    try:
+        start_password_pool()
+        if _executor is None:
+            return func(*args)
+        return _executor.submit(func, *args).result(timeout=settings.PASSWORD_HASH_TIMEOUT_SECONDS)
+    except TimeoutError:
+        raise PasswordHashingBusy()
+    finally:
+        _admission.release()
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """於行程池中驗證密碼"""
+    return _run(security.verify_password, plain_password, hashed_password)
+
+
+def get_password_hash(password: str) -> str:
+    """於行程池中計算密碼雜湊"""
+    return _run(security.get_password_hash, password)
@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.db.models import User, UserRole
+
+
+class AuthenticatedPrincipal:
+    """
+    已驗證的使用者身分，由 JWT 內的 claims 建立，不需查詢 users 表
+    欄位名稱與 models.User 相同，權限檢查的程式碼可直接沿用
+    """
+    __slots__ = ("id", "role", "company_id", "department_id", "is_active", "token_version")
+
+    def __init__(
+        self,
+        id: int,
+        role: UserRole,
+        company_id: Optional[int],
+        department_id: Optional[int],
+        is_active: bool,
+        token_version: int
+    ):
+        self.id = id
+        self.role = role
+        self.company_id = company_id
+        self.department_id = department_id
+        self.is_active = is_active
+        self.token_version = token_version
+
+    @classmethod
+    def from_claims(cls, payload: Dict[str, Any]) -> "AuthenticatedPrincipal":
+        """由 JWT payload 建立，缺少必要 claims 時拋出 KeyError 或 ValueError"""
+        return cls(
+            id=int(payload["sub"]),
+            role=UserRole(payload["role"]),
+            company_id=payload.get("company_id"),
+            department_id=payload.get("department_id"),
+            is_active=bool(payload["is_active"]),
+            token_version=int(payload["ver"])
+        )
+
+
+def principal_claims(user: User) -> Dict[str, Any]:
+    """建立放入 access token 的身分 claims"""
+    return {
+        "role": user.role.value if isinstance(user.role, UserRole) else user.role,
+        "company_id": user.company_id,
+        "department_id": user.department_id,
+        "is_active": bool(user.is_active),
+        "ver": user.token_version or 0
+    }
+
+
+class PrincipalCache:
+    """
+    以 token 為鍵的短 TTL LRU 快取
+    TTL 內的請求完全不查詢資料庫；過期後重新比對一次 token_version，
+    讓其他 worker 行程撤銷的 token 最多在 TTL 後失效
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: int):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[AuthenticatedPrincipal, float]]" = OrderedDict()
+        self._revoked: Dict[int, int] = {}  # user_id -> 最低有效 token_version
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[AuthenticatedPrincipal]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            principal, expires_at = entry
+            if expires_at < time.monotonic() or self._is_revoked(principal):
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return principal
+
+    def put(self, token: str, principal: AuthenticatedPrincipal) -> None:
+        with self._lock:
+            self._entries[token] = (principal, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def is_revoked(self, principal: AuthenticatedPrincipal) -> bool:
+        with self._lock:
+            return self._is_revoked(principal)
+
+    def revoke(self, user_id: int, min_version: int) -> None:
+        """撤銷某使用者 min_version 以前的所有 token"""
+        with self._lock:
+            self._revoked[user_id] = max(min_version, self._revoked.get(user_id, 0))
+            stale = [token for token, (principal, _) in self._entries.items() if principal.id == user_id]
+            for token in stale:
+                del self._entries[token]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._revoked.clear()
+
+    def _is_revoked(self, principal: AuthenticatedPrincipal) -> bool:
+        return principal.token_version < self._revoked.get(principal.id, 0)
+
+
+principal_cache = PrincipalCache(
+    max_size=settings.PRINCIPAL_CACHE_MAX_SIZE,
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS
+)
+
+
+def bump_token_version(user: User) -> int:
+    """
+    遞增 token_version，使帳號既有的 token 失效
+    呼叫端於 commit 後再以 principal_cache.revoke 清除本行程的快取
+    """
+    user.token_version = (user.token_version or 0) + 1
+    return user.token_version
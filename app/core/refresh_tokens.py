@@ -0,0 +1,76 @@
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import Row, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.security import create_refresh_token, hash_refresh_token
+from app.db.models import RefreshToken
+
+
+def issue_refresh_token(db: Session, user_id: int, family_id: Optional[str] = None) -> str:
+    """
+    建立新的 refresh token，資料庫只保存其 SHA-256
+    family_id 為空時代表新的登入工作階段
+    呼叫端負責 commit
+    """
+    token = create_refresh_token()
+    db.add(RefreshToken(
+        user_id=user_id,
+        token_hash=hash_refresh_token(token),
+        family_id=family_id or secrets.token_hex(16),
+        expires_at=datetime.now(timezone.utc) + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    ))
+    return token
+
+
+def consume_refresh_token(db: Session, token: str) -> Optional[Row]:
+    """
+    以單一 UPDATE 原子性地撤銷 token 並取回其擁有者，同一 token 只能成功使用一次
+    已被使用過的 token 再次出現時視為外洩，撤銷整個 family
+    回傳 (id, user_id, family_id)，無效時回傳 None；呼叫端負責 commit
+    """
+    now = datetime.now(timezone.utc)
+    token_hash = hash_refresh_token(token)
+
+    consumed = db.execute(
+        update(RefreshToken)
+        .where(
+            RefreshToken.token_hash == token_hash,
+            RefreshToken.revoked_at.is_(None),
+            RefreshToken.expires_at > now
+        )
+        .values(revoked_at=now)
+        .returning(RefreshToken.id, RefreshToken.user_id, RefreshToken.family_id)
+    ).first()
+
+    if consumed is not None:
+        return consumed
+
+    reused = db.query(RefreshToken.family_id).filter(
+        RefreshToken.token_hash == token_hash,
+        RefreshToken.revoked_at.isnot(None)
+    ).first()
+    if reused is not None:
+        revoke_refresh_token_family(db, reused.family_id)
+    return None
+
+
+def revoke_refresh_token_family(db: Session, family_id: str) -> None:
+    """撤銷同一登入工作階段的所有 refresh token"""
+    db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.now(timezone.utc))
+    )
+
+
+def revoke_user_refresh_tokens(db: Session, user_id: int) -> None:
+    """帳號異動（改密碼、停用、刪除）時撤銷該使用者所有的 refresh token；呼叫端負責 commit"""
+    db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.user_id == user_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.now(timezone.utc))
+    )
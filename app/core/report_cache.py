@@ -0,0 +1,198 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete, event
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.core.company_policy import get_company_policy
+from app.core.config import settings
+from app.db.models import ReportSnapshot
+from app.utils.local_time import local_now
+
+# (company_id, year, month)
+MonthKey = Tuple[int, int, int]
+# (report_type, company_id, year, month, user_id)；全公司報表的 user_id 為 0
+ReportKey = Tuple[str, int, int, int, int]
+
+_STALE_MONTHS_KEY = "stale_report_months"
+
+
+class _Flight:
+    """進行中的報表計算，相同鍵的其他請求等待其結果"""
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class ReportCache:
+    """
+    行程內的報表快取，相同鍵的併發請求只計算一次（single-flight）
+    每個月份有世代號，計算期間月份被失效時結果不寫入快取，避免存入過期資料
+    TTL 僅作為多個 worker 行程之間的保險
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: int):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[ReportKey, Tuple[Any, float]]" = OrderedDict()
+        self._inflight: Dict[ReportKey, _Flight] = {}
+        self._generations: Dict[MonthKey, int] = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: ReportKey, compute: Callable[[], Any]) -> Any:
+        month_key = key[1:4]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                return entry[0]
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                generation = self._generations.get(month_key, 0)
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = compute()
+            with self._lock:
+                if self._generations.get(month_key, 0) == generation:
+                    self._entries[key] = (flight.result, time.monotonic() + self.ttl_seconds)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_size:
+                        self._entries.popitem(last=False)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def invalidate_month(self, company_id: int, year: int, month: int) -> None:
+        month_key = (company_id, year, month)
+        with self._lock:
+            self._generations[month_key] = self._generations.get(month_key, 0) + 1
+            stale = [key for key in self._entries if key[1:4] == month_key]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+
+
+report_cache = ReportCache(
+    max_size=settings.REPORT_CACHE_MAX_SIZE,
+    ttl_seconds=settings.REPORT_CACHE_TTL_SECONDS
+)
+
+
+def is_closed_month(db: Session, company_id: int, year: int, month: int) -> bool:
+    """月份已於公司當地時區結束，內容只會因補登或修正而改變"""
+    policy = get_company_policy(db, company_id)
+    today = local_now(policy.timezone if policy else None).date()
+    return (year, month) < (today.year, today.month)
+
+
+def cached_report(
+    db: Session,
+    report_type: str,
+    company_id: int,
+    year: int,
+    month: int,
+    compute: Callable[[], Any],
+    user_id: Optional[int] = None
+) -> Any:
+    """
+    取得報表，依序查詢行程內快取、已結束月份的持久化快照，最後才計算
+    回傳 JSON 相容的結構，呼叫端不可修改
+    """
+    key: ReportKey = (report_type, company_id, year, month, user_id or 0)
+
+    def load() -> Any:
+        closed = is_closed_month(db, company_id, year, month)
+        if closed:
+            snapshot = db.query(ReportSnapshot.payload).filter(
+                ReportSnapshot.report_type == report_type,
+                ReportSnapshot.company_id == company_id,
+                ReportSnapshot.year == year,
+                ReportSnapshot.month == month,
+                ReportSnapshot.user_id == key[4]
+            ).first()
+            if snapshot is not None:
+                return snapshot.payload
+
+        payload = jsonable_encoder(compute())
+        if closed:
+            dialect_insert = postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+            db.execute(dialect_insert(ReportSnapshot).values(
+                report_type=report_type,
+                company_id=company_id,
+                year=year,
+                month=month,
+                user_id=key[4],
+                payload=payload
+            ).on_conflict_do_nothing(
+                index_elements=["report_type", "company_id", "year", "month", "user_id"]
+            ))
+            db.commit()
+        return payload
+
+    return report_cache.get_or_compute(key, load)
+
+
+def mark_report_month_stale(db: Session, company_id: int, day: date) -> None:
+    """
+    資料異動影響某月報表時呼叫：已結束的月份於同一交易內刪除持久化快照，commit 後再清除行程內快取
+    快照只為已結束的月份保存（與 cached_report 相同的判斷），當月的打卡不寫入 report_snapshots
+    只清除本行程的快取，其他 worker 行程的快取在 REPORT_CACHE_TTL_SECONDS 後才過期
+    """
+    mark_report_range_stale(db, company_id, day, day)
+
+
+def mark_report_range_stale(db: Session, company_id: int, start: date, end: date) -> None:
+    """同 mark_report_month_stale，涵蓋 start 至 end 之間的所有月份（請假可能跨月）"""
+    if isinstance(start, datetime):
+        start = start.date()
+    if isinstance(end, datetime):
+        end = end.date()
+
+    stale: Set[MonthKey] = db.info.setdefault(_STALE_MONTHS_KEY, set())
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        if is_closed_month(db, company_id, year, month):
+            db.execute(delete(ReportSnapshot).where(
+                ReportSnapshot.company_id == company_id,
+                ReportSnapshot.year == year,
+                ReportSnapshot.month == month
+            ))
+        stale.add((company_id, year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_months(session: Session) -> None:
+    for company_id, year, month in session.info.pop(_STALE_MONTHS_KEY, ()):
+        report_cache.invalidate_month(company_id, year, month)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_stale_months(session: Session) -> None:
+    session.info.pop(_STALE_MONTHS_KEY, None)
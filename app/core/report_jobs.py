@@ -0,0 +1,262 @@
+import json
+import multiprocessing
+import os
+import threading
+from calendar import monthrange
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from functools import partial
+from datetime import date, datetime, timezone
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.db.base import SessionLocal, engine
+from app.db.models import AttendanceRecord, ReportJob, ReportJobStatus, ReportJobType, User
+from app.utils.attendance_summary import build_individual_records, summarize_company_month
+from app.utils.export import ATTENDANCE_EXPORT_COLUMNS, EXPORT_YIELD_PER, attendance_export_query, stream_csv
+
+# 工作類型 -> (副檔名, media type)
+ARTIFACT_FORMATS: Dict[ReportJobType, Tuple[str, str]] = {
+    ReportJobType.monthly_summary: ("json", "application/json"),
+    ReportJobType.individual_sheets: ("json", "application/json"),
+    ReportJobType.records_export: ("csv", "text/csv; charset=utf-8"),
+}
+
+
+class ReportJobsBusy(Exception):
+    """等待中的報表工作已達上限"""
+
+
+_executor: Optional[Executor] = None
+_executor_lock = threading.Lock()
+_admission = threading.BoundedSemaphore(settings.REPORT_JOB_MAX_PENDING)
+
+
+def _init_worker() -> None:
+    # 子行程不可沿用父行程的資料庫連線
+    engine.dispose(close=False)
+
+
+def _pool_context():
+    # 行程池在第一次 submit 時才建立子行程，此時 API 的其他執行緒可能正持有鎖；
+    # 以 forkserver（不支援時用 spawn）建立乾淨的子行程，不繼承父行程的鎖與連線
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def start_report_pool() -> None:
+    """建立報表專用的行程池，與處理打卡的 API worker 分開；REPORT_JOB_WORKERS 為 0 時於呼叫端執行"""
+    global _executor
+    with _executor_lock:
+        if _executor is None and settings.REPORT_JOB_WORKERS > 0:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.REPORT_JOB_WORKERS,
+                mp_context=_pool_context(),
+                initializer=_init_worker
+            )
+
+
+def shutdown_report_pool() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def submit_report_job(job_id: str) -> None:
+    """將已建立的工作交給行程池，等待中的工作過多時拋出 ReportJobsBusy"""
+    if not _admission.acquire(blocking=False):
+        raise ReportJobsBusy()
+    start_report_pool()
+    if _executor is None:
+        try:
+            run_report_job(job_id)
+        finally:
+            _admission.release()
+        return
+    future = _executor.submit(run_report_job, job_id)
+    future.add_done_callback(lambda _: _admission.release())
+    future.add_done_callback(partial(fail_crashed_report_job, SessionLocal, job_id))
+
+
+def _mark_jobs_failed(db: Session, error: str, *filters) -> int:
+    """將仍為 queued/running 的工作標為失敗，回傳更新筆數；呼叫端負責 commit"""
+    return db.query(ReportJob).filter(
+        ReportJob.status.in_([ReportJobStatus.queued, ReportJobStatus.running]),
+        *filters
+    ).update({
+        "status": ReportJobStatus.failed,
+        "error": error,
+        "finished_at": datetime.now(timezone.utc)
+    }, synchronize_session=False)
+
+
+def fail_crashed_report_job(session_factory: sessionmaker, job_id: str, future: Future) -> None:
+    """
+    行程池工作的 done callback：execute_report_job 本身會記錄錯誤，
+    只有子行程當掉（BrokenProcessPool）或工作被取消時才會到這裡，將工作標為失敗讓輪詢端得到結果
+    """
+    if future.cancelled():
+        error = "報表工作已取消"
+    elif future.exception() is not None:
+        exception = future.exception()
+        error = str(exception) or exception.__class__.__name__
+    else:
+        return
+    db = session_factory()
+    try:
+        _mark_jobs_failed(db, error, ReportJob.id == job_id)
+        db.commit()
+    finally:
+        db.close()
+
+
+def fail_orphaned_report_jobs(db: Session) -> int:
+    """
+    啟動時將上次執行中斷而停在 queued/running 的工作標為失敗，回傳筆數
+    行程池隨 API 行程啟動，此時資料庫中未完成的工作都已沒有行程在執行
+    """
+    count = _mark_jobs_failed(db, "服務重新啟動，報表工作已中斷")
+    db.commit()
+    return count
+
+
+def run_report_job(job_id: str) -> None:
+    """行程池入口"""
+    execute_report_job(SessionLocal, job_id)
+
+
+def artifact_path(job: ReportJob) -> str:
+    extension, _ = ARTIFACT_FORMATS[job.job_type]
+    return os.path.join(settings.REPORT_JOB_DIR, f"{job.id}.{extension}")
+
+
+class _Progress:
+    """以獨立的 session 更新進度，commit 不會使產生報表的 session 中已載入的物件過期"""
+
+    def __init__(self, session_factory: sessionmaker, job_id: str):
+        self.session_factory = session_factory
+        self.job_id = job_id
+        self.reported = -1
+
+    def update(self, done: int, total: int) -> None:
+        progress = min(99, done * 100 // total) if total else 0
+        if progress == self.reported:
+            return
+        self.reported = progress
+        db = self.session_factory()
+        try:
+            db.query(ReportJob).filter(ReportJob.id == self.job_id).update({"progress": progress})
+            db.commit()
+        finally:
+            db.close()
+
+
+def execute_report_job(session_factory: sessionmaker, job_id: str) -> None:
+    """
+    執行報表工作並將結果寫入 REPORT_JOB_DIR
+    成功時狀態為 completed，任何錯誤都記錄於 error 欄位而不向外拋出
+    """
+    db = session_factory()
+    try:
+        job = db.get(ReportJob, job_id)
+        if job is None or job.status != ReportJobStatus.queued:
+            return
+        job.status = ReportJobStatus.running
+        job.started_at = datetime.now(timezone.utc)
+        db.commit()
+
+        path = artifact_path(job)
+        temp_path = f"{path}.tmp"
+        try:
+            os.makedirs(settings.REPORT_JOB_DIR, exist_ok=True)
+            with open(temp_path, "w", encoding="utf-8", newline="") as artifact:
+                RUNNERS[job.job_type](db, job, artifact, _Progress(session_factory, job_id))
+            os.replace(temp_path, path)
+        except Exception as e:
+            db.rollback()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            job = db.get(ReportJob, job_id)
+            job.status = ReportJobStatus.failed
+            job.error = str(e) or e.__class__.__name__
+        else:
+            job = db.get(ReportJob, job_id)
+            job.status = ReportJobStatus.completed
+            job.progress = 100
+            job.artifact_path = path
+        job.finished_at = datetime.now(timezone.utc)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _month_range(job: ReportJob) -> Tuple[date, date]:
+    year, month = job.params["year"], job.params["month"]
+    return date(year, month, 1), date(year, month, monthrange(year, month)[1])
+
+
+def _run_monthly_summary(db: Session, job: ReportJob, artifact, progress: _Progress) -> None:
+    first_day, last_day = _month_range(job)
+    json.dump(summarize_company_month(db, job.company_id, first_day, last_day), artifact, ensure_ascii=False)
+
+
+def _run_individual_sheets(db: Session, job: ReportJob, artifact, progress: _Progress) -> None:
+    total = db.query(User).filter(
+        User.company_id == job.company_id,
+        User.is_active == True
+    ).count()
+
+    # 逐位員工寫出，檔案為 JSON 陣列
+    artifact.write("[")
+    sheets = build_individual_records(db, job.company_id, job.params["year"], job.params["month"])
+    for index, sheet in enumerate(sheets):
+        if index:
+            artifact.write(",")
+        json.dump(sheet, artifact, ensure_ascii=False, default=str)
+        progress.update(index + 1, total)
+    artifact.write("]")
+
+
+def _run_records_export(db: Session, job: ReportJob, artifact, progress: _Progress) -> None:
+    params = job.params
+    query = attendance_export_query(db).filter(
+        AttendanceRecord.company_id == job.company_id,
+        AttendanceRecord.work_date >= date.fromisoformat(params["start_date"]),
+        AttendanceRecord.work_date <= date.fromisoformat(params["end_date"])
+    )
+    if params.get("department_id"):
+        query = query.filter(User.department_id == params["department_id"])
+    if params.get("user_id"):
+        query = query.filter(AttendanceRecord.user_id == params["user_id"])
+
+    total = query.count()
+
+    def batches():
+        # 以 (record_time, id) 鍵集分批讀取，每批讀完才更新進度，不讓長時間開啟的游標卡住進度寫入
+        last_key = None
+        written = 0
+        while True:
+            batch_query = query
+            if last_key is not None:
+                batch_query = batch_query.filter(tuple_(AttendanceRecord.record_time, AttendanceRecord.id) > last_key)
+            rows = batch_query.order_by(AttendanceRecord.record_time, AttendanceRecord.id).limit(EXPORT_YIELD_PER).all()
+            if not rows:
+                return
+            yield from rows
+            written += len(rows)
+            progress.update(written, total)
+            last_key = tuple_(rows[-1].record_time, rows[-1].id)
+
+    for chunk in stream_csv(batches(), ATTENDANCE_EXPORT_COLUMNS):
+        artifact.write(chunk)
+
+
+RUNNERS: Dict[ReportJobType, Callable[[Session, ReportJob, object, _Progress], None]] = {
+    ReportJobType.monthly_summary: _run_monthly_summary,
+    ReportJobType.individual_sheets: _run_individual_sheets,
+    ReportJobType.records_export: _run_records_export,
+}
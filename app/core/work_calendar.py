@@ -0,0 +1,113 @@
+import threading
+import time
+from array import array
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import CompanyHoliday
+
+
+class WorkCalendar:
+    """
+    某公司某一年的工作日表，預設週一至週五上班，再套用國定假日與公司假日/補班日
+    每天一個旗標並附前綴和，查詢是否為工作日與區間工作日數皆為 O(1)
+    """
+    __slots__ = ("year", "first_day", "flags", "prefix")
+
+    def __init__(self, year: int, overrides: Dict[date, bool]):
+        self.year = year
+        self.first_day = date(year, 1, 1)
+        day_count = (date(year + 1, 1, 1) - self.first_day).days
+
+        flags = bytearray(day_count)
+        for offset in range(day_count):
+            flags[offset] = (self.first_day + timedelta(days=offset)).weekday() < 5
+        for day, is_workday in overrides.items():
+            flags[(day - self.first_day).days] = is_workday
+
+        # prefix[i] 為一月一日起前 i 天的工作日數
+        prefix = array("H", [0]) * (day_count + 1)
+        for offset in range(day_count):
+            prefix[offset + 1] = prefix[offset] + flags[offset]
+
+        self.flags = bytes(flags)
+        self.prefix = prefix
+
+    def is_working_day(self, day: date) -> bool:
+        return bool(self.flags[(day - self.first_day).days])
+
+    def count_working_days(self, start: date, end: date) -> int:
+        """start 至 end（含）之間的工作日數，兩者須在同一年"""
+        if end < start:
+            return 0
+        return self.prefix[(end - self.first_day).days + 1] - self.prefix[(start - self.first_day).days]
+
+
+# (company_id, year) -> (calendar, 載入時間)
+_calendars: Dict[Tuple[int, int], Tuple[WorkCalendar, float]] = {}
+_lock = threading.Lock()
+
+
+def _load_calendar(db: Session, company_id: int, year: int) -> WorkCalendar:
+    holidays = db.query(
+        CompanyHoliday.company_id,
+        CompanyHoliday.holiday_date,
+        CompanyHoliday.is_workday
+    ).filter(
+        or_(CompanyHoliday.company_id == company_id, CompanyHoliday.company_id.is_(None)),
+        CompanyHoliday.holiday_date >= date(year, 1, 1),
+        CompanyHoliday.holiday_date < date(year + 1, 1, 1)
+    ).all()
+
+    # 同一天同時有國定假日與公司設定時以公司設定為準
+    overrides: Dict[date, bool] = {}
+    for holiday in sorted(holidays, key=lambda holiday: holiday.company_id is not None):
+        overrides[holiday.holiday_date] = holiday.is_workday
+    return WorkCalendar(year, overrides)
+
+
+def get_work_calendar(db: Session, company_id: int, year: int) -> WorkCalendar:
+    """
+    取得公司某年的工作日表，快取未命中或過期時才查詢資料庫
+    假日異動時由 companies router 主動失效
+    """
+    key = (company_id, year)
+    cached = _calendars.get(key)
+    if cached is not None and time.monotonic() - cached[1] < settings.WORK_CALENDAR_CACHE_TTL_SECONDS:
+        return cached[0]
+
+    calendar = _load_calendar(db, company_id, year)
+    with _lock:
+        _calendars[key] = (calendar, time.monotonic())
+    return calendar
+
+
+def invalidate_work_calendar(company_id: Optional[int] = None) -> None:
+    """假日異動後移除快取；company_id 為空（國定假日異動）時清除所有公司"""
+    with _lock:
+        if company_id is None:
+            _calendars.clear()
+            return
+        for key in [key for key in _calendars if key[0] == company_id]:
+            del _calendars[key]
+
+
+def _year_spans(start: date, end: date) -> Iterable[Tuple[int, date, date]]:
+    for year in range(start.year, end.year + 1):
+        yield year, max(start, date(year, 1, 1)), min(end, date(year, 12, 31))
+
+
+def working_days(db: Session, company_id: int, start: date, end: date) -> List[date]:
+    """start 至 end（含）之間的工作日清單"""
+    days = []
+    for year, span_start, span_end in _year_spans(start, end):
+        calendar = get_work_calendar(db, company_id, year)
+        offset = (span_start - calendar.first_day).days
+        for index in range((span_end - span_start).days + 1):
+            if calendar.flags[offset + index]:
+                days.append(span_start + timedelta(days=index))
+    return days
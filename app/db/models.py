@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Boolean, DECIMAL, Date, Time
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Boolean, DECIMAL, Date, Time, Index, UniqueConstraint, JSON, DDL, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -27,6 +27,27 @@ class AttendanceType(str, enum.Enum):
     overtime_start = "overtime_start"
     overtime_end = "overtime_end"
 
+class WorkSessionType(str, enum.Enum):
+    work = "work"          # 上班 ~ 下班
+    overtime = "overtime"  # 加班開始 ~ 加班結束
+
+class LeaveLedgerEntryType(str, enum.Enum):
+    accrual = "accrual"        # 年度給假
+    usage = "usage"            # 請假核准扣除
+    reversal = "reversal"      # 已核准請假取消，沖回扣除
+    adjustment = "adjustment"  # 人工調整
+
+class ReportJobType(str, enum.Enum):
+    monthly_summary = "monthly_summary"        # 公司月度出勤統計
+    individual_sheets = "individual_sheets"    # 全體員工個人出勤表
+    records_export = "records_export"          # 日期區間出勤記錄 CSV
+
+class ReportJobStatus(str, enum.Enum):
+    queued = "queued"
+    running = "running"
+    completed = "completed"
+    failed = "failed"
+
 class AttendanceStatus(str, enum.Enum):
     normal = "normal"
     late = "late"
@@ -72,6 +93,7 @@ class Company(Base):
     work_end_time = Column(Time, default='18:00:00')    # 下班時間
     late_tolerance_minutes = Column(Integer, default=5)  # 遲到容忍時間(分鐘)
     early_leave_tolerance_minutes = Column(Integer, default=0)  # 早退容忍時間(分鐘)
+    timezone = Column(String, nullable=False, default='Asia/Taipei')  # 公司所在時區，用於計算打卡的工作日期
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -100,6 +122,10 @@ class Department(Base):
 
 class User(Base):
     __tablename__ = 'users'
+    __table_args__ = (
+        # 游標分頁排序鍵 (created_at, id)
+        Index('ix_users_company_created_at_id', 'company_id', 'created_at', 'id'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     company_id = Column(Integer, ForeignKey('companies.id', ondelete='CASCADE'), nullable=True)  # 註冊時可能為空
@@ -135,6 +161,7 @@ class User(Base):
     # 系統欄位
     is_active = Column(Boolean, default=False)  # 預設為 false，審核通過後才啟用
     last_login_at = Column(DateTime(timezone=True))
+    token_version = Column(Integer, nullable=False, default=0)  # 帳號異動時遞增，使既有 token 失效
     notes = Column(String)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -146,13 +173,28 @@ class User(Base):
     leave_applications = relationship("LeaveApplication", back_populates="user", foreign_keys="[LeaveApplication.user_id]")
 
 
+def _default_work_date(context):
+    """未指定工作日期時，以打卡時間本身的日期作為工作日期"""
+    record_time = context.get_current_parameters().get('record_time')
+    return record_time.date() if record_time else None
+
+
 class AttendanceRecord(Base):
     __tablename__ = 'attendance_records'
+    __table_args__ = (
+        # 同一員工同一工作日每種打卡類型只能有一筆，打卡以衝突感知的 INSERT 寫入
+        UniqueConstraint('user_id', 'record_type', 'work_date', name='uq_attendance_records_user_type_work_date'),
+        Index('ix_attendance_records_user_record_time', 'user_id', 'record_time'),
+        Index('ix_attendance_records_company_work_date', 'company_id', 'work_date'),
+        # 游標分頁排序鍵 (record_time, id)
+        Index('ix_attendance_records_company_record_time_id', 'company_id', 'record_time', 'id'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     company_id = Column(Integer, ForeignKey('companies.id', ondelete='CASCADE'), nullable=False)
     record_time = Column(DateTime(timezone=True), nullable=False)
+    work_date = Column(Date, nullable=False, default=_default_work_date)  # 公司當地時區的工作日期
     record_type = Column(Enum(AttendanceType), nullable=False)
     latitude = Column(DECIMAL(10, 8))
     longitude = Column(DECIMAL(11, 8))
@@ -166,8 +208,56 @@ class AttendanceRecord(Base):
     company = relationship("Company", back_populates="attendance_records")
 
 
+
+
+class WorkSession(Base):
+    """由打卡配對出的工作/加班時段，可跨午夜；end_time 為空表示尚未結束（缺下班打卡）"""
+    __tablename__ = 'work_sessions'
+    __table_args__ = (
+        Index('ix_work_sessions_user_start_time', 'user_id', 'start_time'),
+        Index('ix_work_sessions_company_work_date', 'company_id', 'work_date'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    company_id = Column(Integer, ForeignKey('companies.id', ondelete='CASCADE'), nullable=False)
+    session_type = Column(Enum(WorkSessionType), nullable=False)
+    work_date = Column(Date, nullable=False)  # 開始打卡所屬的工作日期
+    start_time = Column(DateTime(timezone=True), nullable=False)
+    end_time = Column(DateTime(timezone=True), nullable=True)
+    duration_seconds = Column(Integer, nullable=True)
+    start_record_id = Column(Integer, ForeignKey('attendance_records.id', ondelete='CASCADE'), nullable=False, unique=True)
+    end_record_id = Column(Integer, ForeignKey('attendance_records.id', ondelete='SET NULL'), nullable=True)
+
+class AttendanceDaily(Base):
+    """每位員工每個工作日一筆的出勤彙總，打卡時於同一交易內更新，報表只讀取此表"""
+    __tablename__ = 'attendance_daily'
+    __table_args__ = (
+        Index('ix_attendance_daily_company_work_date', 'company_id', 'work_date'),
+    )
+
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    work_date = Column(Date, primary_key=True)
+    company_id = Column(Integer, ForeignKey('companies.id', ondelete='CASCADE'), nullable=False)
+    first_check_in = Column(DateTime(timezone=True), nullable=True)
+    last_check_out = Column(DateTime(timezone=True), nullable=True)
+    overtime_start = Column(DateTime(timezone=True), nullable=True)
+    overtime_end = Column(DateTime(timezone=True), nullable=True)
+    worked_seconds = Column(Integer, nullable=False, default=0)
+    overtime_seconds = Column(Integer, nullable=False, default=0)
+    is_late = Column(Boolean, nullable=False, default=False)
+    is_early_leave = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 class LeaveApplication(Base):
     __tablename__ = 'leave_applications'
+    __table_args__ = (
+        # 游標分頁排序鍵 (created_at, id)
+        Index('ix_leave_applications_company_created_at_id', 'company_id', 'created_at', 'id'),
+        Index('ix_leave_applications_user_created_at_id', 'user_id', 'created_at', 'id'),
+        # 重疊檢查依員工與開始時間做範圍掃描（SQLite 觸發器使用；PostgreSQL 另有 GiST 排除約束）
+        Index('ix_leave_applications_user_start_date', 'user_id', 'start_date'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
@@ -190,3 +280,169 @@ class LeaveApplication(Base):
     user = relationship("User", back_populates="leave_applications", foreign_keys=[user_id])
     company = relationship("Company", back_populates="leave_applications")
     reviewer = relationship("User", foreign_keys=[reviewed_by])
+
+
+
+class RefreshToken(Base):
+    __tablename__ = 'refresh_tokens'
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    token_hash = Column(String(64), unique=True, index=True, nullable=False)  # SHA-256，不儲存原始 token
+    family_id = Column(String(32), nullable=False, index=True)  # 同一次登入輪替出的 token 共用，重複使用時整組撤銷
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    revoked_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Relationships
+    user = relationship("User")
+
+
+# 同一員工待審或已核准的請假時段不可重疊（含端點，與原本的 start <= end AND end >= start 一致）
+# 由資料庫保證：PostgreSQL 為 tstzrange 的 GiST 排除約束，SQLite 為以索引查詢的觸發器
+# 違反時兩者的錯誤訊息都包含 LEAVE_OVERLAP_CONSTRAINT
+LEAVE_OVERLAP_CONSTRAINT = "ex_leave_applications_no_overlap"
+
+_LEAVE_OVERLAP_SQLITE_CHECK = f"""
+    SELECT RAISE(ABORT, '{LEAVE_OVERLAP_CONSTRAINT}') WHERE EXISTS (
+        SELECT 1 FROM leave_applications
+        WHERE user_id = NEW.user_id
+          AND id IS NOT NEW.id
+          AND status IN ('pending', 'approved')
+          AND start_date <= NEW.end_date
+          AND end_date >= NEW.start_date
+    );
+"""
+
+LEAVE_OVERLAP_DDL = {
+    "postgresql": [
+        "CREATE EXTENSION IF NOT EXISTS btree_gist",
+        f"""
+        ALTER TABLE leave_applications ADD CONSTRAINT {LEAVE_OVERLAP_CONSTRAINT}
+        EXCLUDE USING gist (user_id WITH =, tstzrange(start_date, end_date, '[]') WITH &&)
+        WHERE (status IN ('pending', 'approved'))
+        """,
+    ],
+    "sqlite": [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_leave_applications_no_overlap_insert
+        BEFORE INSERT ON leave_applications
+        WHEN NEW.status IN ('pending', 'approved')
+        BEGIN {_LEAVE_OVERLAP_SQLITE_CHECK} END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_leave_applications_no_overlap_update
+        BEFORE UPDATE OF user_id, start_date, end_date, status ON leave_applications
+        WHEN NEW.status IN ('pending', 'approved')
+        BEGIN {_LEAVE_OVERLAP_SQLITE_CHECK} END
+        """,
+    ],
+}
+
+for _dialect, _statements in LEAVE_OVERLAP_DDL.items():
+    for _statement in _statements:
+        event.listen(LeaveApplication.__table__, "after_create", DDL(_statement).execute_if(dialect=_dialect))
+
+
+class LeaveStatusCounter(Base):
+    """
+    各公司、員工、狀態的請假件數，請假新增、審核與取消時於同一交易內增減
+    以請假申請的 company_id 計，員工轉調公司後舊公司的件數仍歸屬舊公司
+    """
+    __tablename__ = 'leave_status_counters'
+
+    company_id = Column(Integer, ForeignKey('companies.id', ondelete='CASCADE'), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True, index=True)
+    status = Column(Enum(LeaveStatus), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class LeaveLedgerEntry(Base):
+    """請假額度帳，只新增不修改；取消已核准的請假時新增 reversal 沖回"""
+    __tablename__ = 'leave_ledger_entries'
+    __table_args__ = (
+        Index('ix_leave_ledger_entries_user_type_year', 'user_id', 'leave_type', 'year'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    company_id = Column(Integer, ForeignKey('companies.id', ondelete='CASCADE'), nullable=False)
+    leave_type = Column(Enum(LeaveType), nullable=False)
+    year = Column(Integer, nullable=False)
+    entry_type = Column(Enum(LeaveLedgerEntryType), nullable=False)
+    days = Column(DECIMAL(7, 2), nullable=False)  # 給假與調整為額度增減，usage/reversal 為使用天數增減
+    leave_application_id = Column(Integer, ForeignKey('leave_applications.id', ondelete='SET NULL'), nullable=True, index=True)
+    note = Column(String)
+    created_by = Column(Integer, ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class LeaveBalance(Base):
+    """每位員工每種假別每年的額度與已使用天數，與 leave_ledger_entries 在同一交易內更新"""
+    __tablename__ = 'leave_balances'
+
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    leave_type = Column(Enum(LeaveType), primary_key=True)
+    year = Column(Integer, primary_key=True)
+    company_id = Column(Integer, ForeignKey('companies.id', ondelete='CASCADE'), nullable=False, index=True)
+    entitled_days = Column(DECIMAL(7, 2), nullable=False, default=0)
+    used_days = Column(DECIMAL(7, 2), nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    @property
+    def remaining_days(self):
+        return self.entitled_days - self.used_days
+
+
+class CompanyHoliday(Base):
+    """
+    假日與補班日：company_id 為空表示國定假日，適用所有公司
+    is_workday 為 True 表示週末補班
+    """
+    __tablename__ = 'company_holidays'
+    __table_args__ = (
+        UniqueConstraint('company_id', 'holiday_date', name='uq_company_holidays_company_date'),
+        Index('ix_company_holidays_holiday_date', 'holiday_date'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    company_id = Column(Integer, ForeignKey('companies.id', ondelete='CASCADE'), nullable=True)
+    holiday_date = Column(Date, nullable=False)
+    name = Column(String, nullable=False)
+    is_workday = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class ReportSnapshot(Base):
+    """已結束月份的報表快照，補登、修正打卡或請假核准時刪除"""
+    __tablename__ = 'report_snapshots'
+    __table_args__ = (
+        UniqueConstraint('report_type', 'company_id', 'year', 'month', 'user_id', name='uq_report_snapshots_key'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    report_type = Column(String(32), nullable=False)
+    company_id = Column(Integer, ForeignKey('companies.id', ondelete='CASCADE'), nullable=False)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False, default=0)  # 0 表示全公司報表
+    payload = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class ReportJob(Base):
+    """背景報表工作，狀態與進度存於資料庫，任一 API worker 都能查詢"""
+    __tablename__ = 'report_jobs'
+
+    id = Column(String(32), primary_key=True)
+    company_id = Column(Integer, ForeignKey('companies.id', ondelete='CASCADE'), nullable=False, index=True)
+    requested_by = Column(Integer, ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+    job_type = Column(Enum(ReportJobType), nullable=False)
+    params = Column(JSON, nullable=False)
+    status = Column(Enum(ReportJobStatus), nullable=False, default=ReportJobStatus.queued)
+    progress = Column(Integer, nullable=False, default=0)  # 0-100
+    error = Column(String, nullable=True)
+    artifact_path = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
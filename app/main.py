@@ -1,11 +1,45 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 import uvicorn
 
 from app.api.routers import companies, departments, users, login, attendance, register, leaves, reports
+from app.core.company_policy import warm_company_policies
+from app.core.hashing import PasswordHashingBusy, shutdown_password_pool, start_password_pool
+from app.core.report_jobs import fail_orphaned_report_jobs, shutdown_report_pool, start_report_pool
 from app.core.config import settings
+from app.db.base import SessionLocal
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 預先載入公司打卡設定，打卡時不需查詢公司資料
+    db = SessionLocal()
+    try:
+        count = warm_company_policies(db)
+        print(f"Company policy cache warmed: {count} companies")
+    except Exception as e:
+        db.rollback()
+        print(f"[WARN] Company policy cache warm-up skipped: {e}")
+    # 上次執行中斷而停在 queued/running 的報表工作已沒有行程處理，標為失敗讓輪詢端結束
+    try:
+        count = fail_orphaned_report_jobs(db)
+        print(f"Interrupted report jobs marked failed: {count}")
+    except Exception as e:
+        db.rollback()
+        print(f"[WARN] Report job recovery skipped: {e}")
+    finally:
+        db.close()
+    start_password_pool()
+    start_report_pool()
+    yield
+    shutdown_report_pool()
+    shutdown_password_pool()
 
-app = FastAPI(title="Timesheet System API", version="1.0.0")
+
+app = FastAPI(title="Timesheet System API", version="1.0.0", lifespan=lifespan)
 
 # CORS configuration
 origins = [
@@ -31,6 +65,14 @@ if os.getenv('ENVIRONMENT') == 'production':
             f"http://{domain}",
         ])
 
+@app.exception_handler(PasswordHashingBusy)
+def password_hashing_busy_handler(request: Request, exc: PasswordHashingBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "系統忙碌中，請稍後再試"},
+        headers={"Retry-After": "1"},
+    )
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import datetime, date
 from typing import Optional
 from app.db.models import AttendanceType, AttendanceStatus
 from app.schemas.user import User # Import User schema
@@ -11,6 +11,7 @@ class AttendanceRequest(BaseModel):
 
 class AttendanceRecordBase(BaseModel):
     record_time: datetime
+    work_date: date | None = None
     record_type: AttendanceType
     status: AttendanceStatus
     latitude: float | None = None
@@ -21,4 +22,12 @@ class AttendanceRecord(AttendanceRecordBase):
     user: User # Add user details
     company: Company # Add company details
 
-    model_config = {"from_attributes": True}
\ No newline at end of file
+    model_config = {"from_attributes": True}
+
+# 精簡格式：只帶 user_id / company_id，使用者與公司資料另放在 included
+class AttendanceRecordCompact(AttendanceRecordBase):
+    id: int
+    user_id: int
+    company_id: int
+
+    model_config = {"from_attributes": True}
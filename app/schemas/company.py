@@ -1,7 +1,20 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, field_validator
 from typing import Optional
 from decimal import Decimal
-from datetime import time
+from datetime import date, time
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+
+def validate_timezone_name(value: Optional[str]) -> str:
+    """時區必須是 IANA 時區名稱（如 Asia/Taipei），不可為空值"""
+    if value is None:
+        raise ValueError("timezone cannot be null")
+    try:
+        ZoneInfo(value)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone: {value}")
+    return value
+
 
 # Schema for request body on creation
 class CompanyCreate(BaseModel):
@@ -19,6 +32,9 @@ class CompanyCreate(BaseModel):
     work_end_time: Optional[time] = None
     late_tolerance_minutes: Optional[int] = 5
     early_leave_tolerance_minutes: Optional[int] = 0
+    timezone: str = "Asia/Taipei"  # 公司所在時區
+
+    _check_timezone = field_validator("timezone")(validate_timezone_name)
 
 # Schema for request body on update
 class CompanyUpdate(BaseModel):
@@ -36,6 +52,9 @@ class CompanyUpdate(BaseModel):
     work_end_time: Optional[time] = None
     late_tolerance_minutes: Optional[int] = None
     early_leave_tolerance_minutes: Optional[int] = None
+    timezone: Optional[str] = None  # 公司所在時區，未傳入時不變更，不可傳入 null
+
+    _check_timezone = field_validator("timezone")(validate_timezone_name)
 
 # Schema for response body
 class Company(BaseModel):
@@ -56,6 +75,7 @@ class Company(BaseModel):
     work_end_time: Optional[time] = None
     late_tolerance_minutes: Optional[int] = None
     early_leave_tolerance_minutes: Optional[int] = None
+    timezone: str = "Asia/Taipei"  # 公司所在時區
 
 
 # 專門用於工作時間設定的Schema
@@ -72,3 +92,19 @@ class WorkSchedule(BaseModel):
     work_end_time: Optional[time] = None
     late_tolerance_minutes: Optional[int] = None
     early_leave_tolerance_minutes: Optional[int] = None
+
+
+# 公司假日與補班日
+class CompanyHolidayCreate(BaseModel):
+    holiday_date: date
+    name: str
+    is_workday: bool = False  # True 表示週末補班
+
+class CompanyHoliday(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    company_id: Optional[int] = None  # 空值為國定假日
+    holiday_date: date
+    name: str
+    is_workday: bool
@@ -1,6 +1,7 @@
-from pydantic import BaseModel, ConfigDict
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List, Optional
 from datetime import datetime
+from decimal import Decimal
 from app.db.models import LeaveType, LeaveStatus
 from app.schemas.user import User
 from app.schemas.company import Company
@@ -28,6 +29,22 @@ class LeaveApplicationReview(BaseModel):
     review_comment: Optional[str] = None
 
 
+# 批次審核Schema
+class LeaveBulkReviewItem(LeaveApplicationReview):
+    leave_id: int
+
+
+class LeaveBulkReview(BaseModel):
+    items: List[LeaveBulkReviewItem] = Field(min_length=1, max_length=500)
+
+
+class LeaveBulkReviewResult(BaseModel):
+    leave_id: int
+    success: bool
+    status: Optional[LeaveStatus] = None
+    detail: Optional[str] = None  # 失敗原因
+
+
 # 請假申請響應Schema
 class LeaveApplication(BaseModel):
     model_config = ConfigDict(from_attributes=True)
@@ -78,4 +95,39 @@ class LeaveStatistics(BaseModel):
     pending_applications: int
     approved_applications: int
     rejected_applications: int
-    cancelled_applications: int
\ No newline at end of file
+    cancelled_applications: int
+
+
+# 請假額度Schema
+class LeaveBalance(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    user_id: int
+    leave_type: LeaveType
+    year: int
+    entitled_days: Decimal
+    used_days: Decimal
+    remaining_days: Decimal
+
+
+# 請假額度人工調整Schema
+class LeaveBalanceAdjustment(BaseModel):
+    user_id: int
+    leave_type: LeaveType
+    year: int
+    days: Decimal  # 正數增加、負數減少
+    note: Optional[str] = None
+
+
+# 年度給假Schema
+class LeaveAccrualRequest(BaseModel):
+    year: int
+    leave_type: LeaveType
+    days: Decimal
+    company_id: Optional[int] = None  # 僅 super_admin 可指定
+
+
+class LeaveAccrualResult(BaseModel):
+    year: int
+    leave_type: LeaveType
+    accrued_users: int
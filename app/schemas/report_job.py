@@ -0,0 +1,32 @@
+from pydantic import BaseModel, ConfigDict
+from typing import Optional
+from datetime import date, datetime
+from app.db.models import ReportJobType, ReportJobStatus
+
+
+# 報表工作建立Schema
+class ReportJobCreate(BaseModel):
+    job_type: ReportJobType
+    company_id: Optional[int] = None     # super_admin 可指定其他公司
+    year: Optional[int] = None           # monthly_summary / individual_sheets 必填
+    month: Optional[int] = None
+    start_date: Optional[date] = None    # records_export 必填
+    end_date: Optional[date] = None
+    department_id: Optional[int] = None
+    user_id: Optional[int] = None
+
+
+# 報表工作狀態響應Schema
+class ReportJob(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: str
+    company_id: int
+    job_type: ReportJobType
+    status: ReportJobStatus
+    progress: int
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    download_url: Optional[str] = None  # 完成後才有
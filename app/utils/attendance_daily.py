@@ -0,0 +1,177 @@
+from datetime import date
+from itertools import groupby
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import case, delete, func, insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.db.models import (
+    AttendanceDaily, AttendanceRecord, AttendanceStatus, AttendanceType, WorkSession, WorkSessionType
+)
+
+# 打卡類型對應到彙總表的時間欄位
+PUNCH_COLUMNS = {
+    AttendanceType.check_in: "first_check_in",
+    AttendanceType.check_out: "last_check_out",
+    AttendanceType.overtime_start: "overtime_start",
+    AttendanceType.overtime_end: "overtime_end",
+}
+
+REBUILD_BATCH_SIZE = 1000
+
+
+def daily_values(punches: Iterable[Any]) -> Dict[str, Any]:
+    """
+    由同一員工同一工作日的打卡記錄計算打卡時間與遲到/早退旗標
+    punches 需有 record_type、record_time、status 屬性
+    """
+    values: Dict[str, Any] = {column: None for column in PUNCH_COLUMNS.values()}
+    values["is_late"] = False
+    values["is_early_leave"] = False
+
+    for punch in punches:
+        column = PUNCH_COLUMNS.get(punch.record_type)
+        if column is None:
+            continue
+        current = values[column]
+        # 上班取最早、其餘取最晚
+        if punch.record_type == AttendanceType.check_in:
+            if current is None or punch.record_time < current:
+                values[column] = punch.record_time
+        elif current is None or punch.record_time > current:
+            values[column] = punch.record_time
+
+        if punch.record_type == AttendanceType.check_in and punch.status == AttendanceStatus.late:
+            values["is_late"] = True
+        elif punch.record_type == AttendanceType.check_out and punch.status == AttendanceStatus.early_leave:
+            values["is_early_leave"] = True
+
+    return values
+
+
+def _session_seconds_query(db: Session):
+    """依 (user_id, work_date) 加總已結束時段的工作與加班秒數"""
+    def total(session_type: WorkSessionType):
+        return func.coalesce(func.sum(case(
+            (WorkSession.session_type == session_type, WorkSession.duration_seconds), else_=0
+        )), 0)
+
+    return db.query(
+        WorkSession.user_id,
+        WorkSession.work_date,
+        total(WorkSessionType.work).label('worked_seconds'),
+        total(WorkSessionType.overtime).label('overtime_seconds')
+    ).filter(
+        WorkSession.end_time.isnot(None)
+    ).group_by(WorkSession.user_id, WorkSession.work_date)
+
+
+def refresh_attendance_daily(db: Session, user_id: int, company_id: int, work_date: date) -> None:
+    """
+    重新計算某員工某工作日的彙總列，於打卡的同一交易內呼叫
+    當日打卡受唯一鍵限制最多四筆，時數取自 work_sessions，重算成本固定；呼叫端負責 commit
+    """
+    punches = db.query(
+        AttendanceRecord.record_type,
+        AttendanceRecord.record_time,
+        AttendanceRecord.status
+    ).filter(
+        AttendanceRecord.user_id == user_id,
+        AttendanceRecord.work_date == work_date
+    ).all()
+
+    if not punches:
+        db.execute(delete(AttendanceDaily).where(
+            AttendanceDaily.user_id == user_id,
+            AttendanceDaily.work_date == work_date
+        ))
+        return
+
+    values = daily_values(punches)
+    seconds = _session_seconds_query(db).filter(
+        WorkSession.user_id == user_id,
+        WorkSession.work_date == work_date
+    ).first()
+    values["worked_seconds"] = seconds.worked_seconds if seconds else 0
+    values["overtime_seconds"] = seconds.overtime_seconds if seconds else 0
+
+    dialect_insert = postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    stmt = dialect_insert(AttendanceDaily).values(
+        user_id=user_id, work_date=work_date, company_id=company_id, **values
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[AttendanceDaily.user_id, AttendanceDaily.work_date],
+        set_={"company_id": company_id, **values}
+    ))
+
+
+def rebuild_attendance_daily(
+    db: Session,
+    company_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+) -> int:
+    """
+    由原始打卡記錄重建彙總表，用於資料回補或手動修正後的重算
+    時數取自 work_sessions，需先執行 rebuild_work_sessions；回傳寫入的列數，呼叫端負責 commit
+    """
+    daily_filters = []
+    punch_filters = []
+    if company_id is not None:
+        daily_filters.append(AttendanceDaily.company_id == company_id)
+        punch_filters.append(AttendanceRecord.company_id == company_id)
+    if start_date is not None:
+        daily_filters.append(AttendanceDaily.work_date >= start_date)
+        punch_filters.append(AttendanceRecord.work_date >= start_date)
+    if end_date is not None:
+        daily_filters.append(AttendanceDaily.work_date <= end_date)
+        punch_filters.append(AttendanceRecord.work_date <= end_date)
+
+    db.execute(delete(AttendanceDaily).where(*daily_filters))
+
+    session_filters = []
+    if company_id is not None:
+        session_filters.append(WorkSession.company_id == company_id)
+    if start_date is not None:
+        session_filters.append(WorkSession.work_date >= start_date)
+    if end_date is not None:
+        session_filters.append(WorkSession.work_date <= end_date)
+    seconds_by_day = {
+        (row.user_id, row.work_date): (row.worked_seconds, row.overtime_seconds)
+        for row in _session_seconds_query(db).filter(*session_filters)
+    }
+
+    punches = db.query(
+        AttendanceRecord.user_id,
+        AttendanceRecord.company_id,
+        AttendanceRecord.work_date,
+        AttendanceRecord.record_type,
+        AttendanceRecord.record_time,
+        AttendanceRecord.status
+    ).filter(*punch_filters).order_by(
+        AttendanceRecord.user_id, AttendanceRecord.work_date
+    ).yield_per(REBUILD_BATCH_SIZE)
+
+    written = 0
+    batch = []
+    for (user_id, work_date), day_punches in groupby(punches, key=lambda punch: (punch.user_id, punch.work_date)):
+        day_punches = list(day_punches)
+        worked_seconds, overtime_seconds = seconds_by_day.get((user_id, work_date), (0, 0))
+        batch.append({
+            "user_id": user_id,
+            "work_date": work_date,
+            "company_id": day_punches[0].company_id,
+            "worked_seconds": worked_seconds,
+            "overtime_seconds": overtime_seconds,
+            **daily_values(day_punches)
+        })
+        if len(batch) >= REBUILD_BATCH_SIZE:
+            db.execute(insert(AttendanceDaily), batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        db.execute(insert(AttendanceDaily), batch)
+        written += len(batch)
+    return written
@@ -0,0 +1,359 @@
+import calendar
+from calendar import monthrange
+from datetime import date, datetime, time, timedelta
+from itertools import groupby
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import DateTime, Date, and_, case, exists, func, literal, or_, select, union_all
+from sqlalchemy.orm import Session, aliased, joinedload
+
+from app.core.company_policy import get_company_policy
+from app.core.work_calendar import WorkCalendar, get_work_calendar, working_days
+from app.db.models import AttendanceDaily, Company, LeaveApplication, LeaveStatus, User
+from app.utils.leave_intervals import (
+    DayLeave, approved_leaves_query, leave_days_by_type, leave_interval, load_approved_leaves, sweep_leave_days
+)
+from app.utils.local_time import get_zone, local_now
+
+# 批次匯出個人出勤表時每次自資料庫讀取的列數
+INDIVIDUAL_RECORDS_YIELD_PER = 500
+
+
+def _absence_days_column(company_tz: Optional[str], days: List[date]):
+    """
+    缺勤天數的相關子查詢：工作日中沒有出勤、也沒有已核准請假涵蓋的天數
+    工作日以常數列組成衍生表，與外層的 User 關聯，仍在同一個查詢中計算
+    """
+    if not days:
+        return literal(0).label('absence_days')
+
+    zone = get_zone(company_tz)
+    workdays = union_all(*(
+        select(
+            literal(day, Date).label('work_date'),
+            literal(datetime.combine(day, time.min, tzinfo=zone), DateTime(timezone=True)).label('day_start'),
+            literal(datetime.combine(day + timedelta(days=1), time.min, tzinfo=zone), DateTime(timezone=True)).label('day_end')
+        )
+        for day in days
+    )).subquery('workdays')
+
+    # 外層查詢已 outer join attendance_daily，這裡需用別名才不會被關聯到外層
+    daily = aliased(AttendanceDaily)
+    attended = exists().where(
+        daily.user_id == User.id,
+        daily.work_date == workdays.c.work_date,
+        or_(daily.first_check_in.isnot(None), daily.last_check_out.isnot(None))
+    ).correlate_except(daily)
+    on_leave = exists().where(
+        LeaveApplication.user_id == User.id,
+        LeaveApplication.status == LeaveStatus.approved,
+        LeaveApplication.start_date < workdays.c.day_end,
+        LeaveApplication.end_date > workdays.c.day_start
+    ).correlate_except(LeaveApplication)
+    return select(func.count()).select_from(workdays).where(
+        ~attended, ~on_leave
+    ).scalar_subquery().label('absence_days')
+
+
+def summarize_company_month(
+    db: Session,
+    company_id: int,
+    first_day: date,
+    last_day: date
+) -> List[Dict[str, Any]]:
+    """
+    以單一查詢計算公司某月所有員工的出勤統計
+    讀取 attendance_daily 彙總表，每位員工最多一個月的天數，不掃描原始打卡記錄
+    缺卡與缺勤只計算公司當地時間已結束的日期，當天仍在上班中的不算
+    """
+    in_period = and_(
+        AttendanceDaily.user_id == User.id,
+        AttendanceDaily.work_date >= first_day,
+        AttendanceDaily.work_date <= last_day
+    )
+    policy = get_company_policy(db, company_id)
+    company_tz = policy.timezone if policy else None
+    today = local_now(company_tz).date()
+    ended = AttendanceDaily.work_date < today
+
+    rows = db.query(
+        User.id.label('user_id'),
+        (User.first_name + ' ' + User.last_name).label('user_name'),
+        User.email.label('user_email'),
+        func.count(AttendanceDaily.first_check_in).label('check_in_count'),
+        func.count(AttendanceDaily.last_check_out).label('check_out_count'),
+        func.count(AttendanceDaily.overtime_start).label('overtime_start_count'),
+        func.count(case(
+            (or_(AttendanceDaily.first_check_in.isnot(None), AttendanceDaily.last_check_out.isnot(None)), 1),
+            else_=None
+        )).label('attendance_days'),
+        func.coalesce(func.sum(AttendanceDaily.overtime_seconds), 0).label('overtime_seconds'),
+        func.count(case((AttendanceDaily.is_late == True, 1), else_=None)).label('late_count'),
+        func.count(case((AttendanceDaily.is_early_leave == True, 1), else_=None)).label('early_leave_count'),
+        func.count(case(
+            (and_(ended, AttendanceDaily.first_check_in.is_(None), AttendanceDaily.last_check_out.isnot(None)), 1),
+            else_=None
+        )).label('missing_check_in_days'),
+        func.count(case(
+            (and_(ended, AttendanceDaily.first_check_in.isnot(None), AttendanceDaily.last_check_out.is_(None)), 1),
+            else_=None
+        )).label('missing_check_out_days'),
+        _absence_days_column(company_tz, working_days(db, company_id, first_day, min(last_day, today - timedelta(days=1))))
+    ).outerjoin(
+        AttendanceDaily, in_period
+    ).filter(
+        User.company_id == company_id,
+        User.is_active == True
+    ).group_by(User.id, User.first_name, User.last_name, User.email).order_by(User.id).all()
+
+    return [
+        {
+            "user_id": row.user_id,
+            "user_name": row.user_name,
+            "user_email": row.user_email,
+            "attendance_days": row.attendance_days or 0,
+            "check_in_count": row.check_in_count,
+            "check_out_count": row.check_out_count,
+            "overtime_hours": round(row.overtime_seconds / 3600, 2),
+            "overtime_sessions": row.overtime_start_count,
+            "late_count": row.late_count,
+            "early_leave_count": row.early_leave_count,
+            "missing_check_in_days": row.missing_check_in_days,
+            "missing_check_out_days": row.missing_check_out_days,
+            "absence_days": row.absence_days or 0
+        }
+        for row in rows
+    ]
+
+
+def build_individual_record(db: Session, target_user: User, year: int, month: int) -> Dict[str, Any]:
+    """組出個人月出勤表，包含每日上下班時間、工作與加班時數"""
+    # 計算月份範圍
+    first_day = date(year, month, 1)
+    last_day = date(year, month, monthrange(year, month)[1])
+
+    # 讀取該員工該月份的每日彙總，最多一個月的天數
+    daily_rows = db.query(AttendanceDaily).filter(
+        AttendanceDaily.user_id == target_user.id,
+        AttendanceDaily.work_date >= first_day,
+        AttendanceDaily.work_date <= last_day
+    ).order_by(AttendanceDaily.work_date).all()
+
+    # 獲取公司信息
+    company = db.query(Company).filter(Company.id == target_user.company_id).first()
+
+    work_calendar = get_work_calendar(db, target_user.company_id, year)
+    policy = get_company_policy(db, target_user.company_id)
+    leaves = load_approved_leaves(
+        db, target_user.company_id, first_day, last_day,
+        policy.timezone if policy else None, user_ids=[target_user.id]
+    )
+    day_leaves = sweep_leave_days(
+        leaves.get(target_user.id, []), first_day, last_day, work_calendar,
+        policy.work_start_time if policy else None, policy.work_end_time if policy else None
+    )
+
+    return assemble_individual_record(
+        target_user,
+        company.name if company else "",
+        daily_rows,
+        year,
+        month,
+        work_calendar,
+        day_leaves,
+        policy.timezone if policy else None
+    )
+
+
+class _UserGroups:
+    """
+    依 user_id 排序的串流資料，依員工順序逐一取出該員工的列
+    與同樣依 user_id 排序的員工清單一起走訪，一次只保留一位員工的資料
+    """
+
+    def __init__(self, rows: Iterable[Any], key: Callable[[Any], int]):
+        self._groups = groupby(rows, key=key)
+        self._current = next(self._groups, None)
+
+    def take(self, user_id: int) -> List[Any]:
+        while self._current is not None and self._current[0] < user_id:
+            self._current = next(self._groups, None)
+        if self._current is None or self._current[0] != user_id:
+            return []
+        rows = list(self._current[1])
+        self._current = next(self._groups, None)
+        return rows
+
+
+def build_individual_records(
+    db: Session,
+    company_id: int,
+    year: int,
+    month: int,
+    department_id: Optional[int] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    逐位組出公司（或部門）所有在職員工的個人月出勤表
+    員工、公司、每日彙總與請假各只查詢一次；三者皆依 user_id 排序並以 yield_per 串流讀取，
+    依員工順序合併，記憶體中只保留目前這位員工的資料
+    """
+    first_day = date(year, month, 1)
+    last_day = date(year, month, monthrange(year, month)[1])
+
+    staff_filters = [User.company_id == company_id, User.is_active == True]
+    if department_id is not None:
+        staff_filters.append(User.department_id == department_id)
+
+    staff = db.query(User).options(joinedload(User.department)).filter(
+        *staff_filters
+    ).order_by(User.id).yield_per(INDIVIDUAL_RECORDS_YIELD_PER)
+    company = db.query(Company).filter(Company.id == company_id).first()
+    company_name = company.name if company else ""
+
+    daily_rows = db.query(AttendanceDaily).join(
+        User, User.id == AttendanceDaily.user_id
+    ).filter(
+        *staff_filters,
+        AttendanceDaily.work_date >= first_day,
+        AttendanceDaily.work_date <= last_day
+    ).order_by(AttendanceDaily.user_id, AttendanceDaily.work_date).yield_per(INDIVIDUAL_RECORDS_YIELD_PER)
+    daily_by_user = _UserGroups(daily_rows, key=lambda daily: daily.user_id)
+
+    work_calendar = get_work_calendar(db, company_id, year)
+    policy = get_company_policy(db, company_id)
+    company_tz = policy.timezone if policy else None
+    leave_rows = approved_leaves_query(
+        db, company_id, first_day, last_day, company_tz, department_id=department_id
+    ).yield_per(INDIVIDUAL_RECORDS_YIELD_PER)
+    leaves_by_user = _UserGroups(leave_rows, key=lambda leave: leave.user_id)
+
+    for user in staff:
+        day_leaves = sweep_leave_days(
+            [leave_interval(row, company_tz) for row in leaves_by_user.take(user.id)], first_day, last_day,
+            work_calendar, policy.work_start_time if policy else None, policy.work_end_time if policy else None
+        )
+        yield assemble_individual_record(
+            user, company_name, daily_by_user.take(user.id), year, month, work_calendar, day_leaves, company_tz
+        )
+
+
+def assemble_individual_record(
+    target_user: User,
+    company_name: str,
+    daily_rows: List[AttendanceDaily],
+    year: int,
+    month: int,
+    work_calendar: WorkCalendar,
+    day_leaves: Dict[date, DayLeave],
+    company_tz: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    由已載入的每日彙總（依日期排序）、公司工作日表與每日請假組出個人月出勤表，不查詢資料庫
+    打卡時間以公司時區顯示
+    """
+    first_day = date(year, month, 1)
+    last_day = date(year, month, monthrange(year, month)[1])
+
+    # 按日期組織數據
+    daily_records = {}
+    for daily in daily_rows:
+        record_date = daily.work_date
+        daily_records[record_date] = {
+            "date": record_date,
+            "weekday": calendar.day_name[record_date.weekday()],
+            "weekday_zh": get_chinese_weekday(record_date.weekday()),
+            "check_in": format_punch_time(daily.first_check_in, company_tz),
+            "check_out": format_punch_time(daily.last_check_out, company_tz),
+            "overtime_start": format_punch_time(daily.overtime_start, company_tz),
+            "overtime_end": format_punch_time(daily.overtime_end, company_tz),
+            "work_hours": round(daily.worked_seconds / 3600, 2),
+            "overtime_hours": round(daily.overtime_seconds / 3600, 2)
+        }
+
+    # 建立完整月份的記錄（包含沒有出勤記錄的日期）
+    monthly_records = []
+    current_date = first_day
+
+    while current_date <= last_day:
+        weekday = current_date.weekday()
+        # 只排除週末與假日（補班日照常列出），有出勤記錄的日期一律保留
+        is_day_off = not work_calendar.is_working_day(current_date)
+
+        if current_date in daily_records:
+            # 有記錄的日期
+            record = daily_records[current_date]
+            monthly_records.append(record)
+        elif not is_day_off:
+            # 工作日但沒有記錄
+            monthly_records.append({
+                "date": current_date,
+                "weekday": calendar.day_name[weekday],
+                "weekday_zh": get_chinese_weekday(weekday),
+                "check_in": None,
+                "check_out": None,
+                "overtime_start": None,
+                "overtime_end": None,
+                "work_hours": 0,
+                "overtime_hours": 0
+            })
+        elif is_day_off and current_date in daily_records and (
+            daily_records[current_date]["overtime_start"] or daily_records[current_date]["overtime_end"]
+        ):
+            # 週末或假日但有加班記錄
+            record = daily_records[current_date]
+            monthly_records.append(record)
+
+        current_date += timedelta(days=1)
+
+    # 併入已核准的請假，沒有打卡的請假日也已在上面列為工作日
+    for record in monthly_records:
+        day_leave = day_leaves.get(record["date"])
+        record["leave_type"] = day_leave.leave_type if day_leave else None
+        record["leave_hours"] = day_leave.hours if day_leave else 0
+
+    # 計算月度統計
+    total_work_hours = sum(record["work_hours"] for record in monthly_records)
+    total_overtime_hours = sum(record["overtime_hours"] for record in monthly_records)
+    total_attendance_days = len([record for record in monthly_records if record["check_in"]])
+
+    return {
+        "user_info": {
+            "id": target_user.id,
+            "name": f"{target_user.first_name} {target_user.last_name}",
+            "email": target_user.email,
+            "company_name": company_name,
+            "department_name": target_user.department.name if target_user.department else ""
+        },
+        "period": {
+            "year": year,
+            "month": month,
+            "month_name": calendar.month_name[month]
+        },
+        "daily_records": monthly_records,
+        "summary": {
+            "total_work_hours": round(total_work_hours, 2),
+            "total_overtime_hours": round(total_overtime_hours, 2),
+            "total_attendance_days": total_attendance_days,
+            "total_leave_hours": round(sum(day_leave.hours for day_leave in day_leaves.values()), 2),
+            "leave_days_by_type": leave_days_by_type(day_leaves.values()),
+            "total_records": len(monthly_records)
+        }
+    }
+
+
+def format_punch_time(punch_time: Optional[datetime], company_tz: Optional[str] = None) -> Optional[str]:
+    """
+    打卡時間轉為公司當地時間的 HH:MM
+    沒有時區資訊的舊資料視為已是當地時間
+    """
+    if not punch_time:
+        return None
+    if punch_time.tzinfo is not None:
+        punch_time = punch_time.astimezone(get_zone(company_tz))
+    return punch_time.strftime("%H:%M")
+
+
+def get_chinese_weekday(weekday: int) -> str:
+    """轉換星期幾為中文"""
+    weekdays = ["一", "二", "三", "四", "五", "六", "日"]
+    return weekdays[weekday]
@@ -0,0 +1,143 @@
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import Integer, and_, case, func, literal, null, or_, select, union_all
+from sqlalchemy.orm import Session
+
+from app.db.models import AttendanceDaily, Department, User
+
+# GROUPING(department_id, user_id) 的結果：員工列、部門小計、公司合計
+EMPLOYEE_LEVEL = 0
+DEPARTMENT_LEVEL = 1
+COMPANY_LEVEL = 3
+
+
+def _measures() -> list:
+    """各層級共用的彙總欄位，來源為 attendance_daily"""
+    attended = or_(AttendanceDaily.first_check_in.isnot(None), AttendanceDaily.last_check_out.isnot(None))
+    return [
+        func.count(func.distinct(User.id)).label('employee_count'),
+        func.count(case((attended, 1), else_=None)).label('attendance_days'),
+        func.coalesce(func.sum(AttendanceDaily.worked_seconds), 0).label('worked_seconds'),
+        func.coalesce(func.sum(AttendanceDaily.overtime_seconds), 0).label('overtime_seconds'),
+        func.count(case((AttendanceDaily.is_late == True, 1), else_=None)).label('late_count'),
+        func.count(case((AttendanceDaily.is_early_leave == True, 1), else_=None)).label('early_leave_count'),
+    ]
+
+
+def _totals(row) -> Dict[str, Any]:
+    return {
+        "employee_count": row.employee_count,
+        "attendance_days": row.attendance_days,
+        "work_hours": round(row.worked_seconds / 3600, 2),
+        "overtime_hours": round(row.overtime_seconds / 3600, 2),
+        "late_count": row.late_count,
+        "early_leave_count": row.early_leave_count,
+    }
+
+
+def summarize_departments(
+    db: Session,
+    company_id: int,
+    first_day: date,
+    last_day: date,
+    department_id: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    以單一分組查詢計算員工、部門小計與公司合計
+    PostgreSQL 使用 GROUP BY ROLLUP 並以 GROUPING() 區分層級；SQLite 以 UNION ALL 組出相同的三個層級
+    """
+    in_period = and_(
+        AttendanceDaily.user_id == User.id,
+        AttendanceDaily.work_date >= first_day,
+        AttendanceDaily.work_date <= last_day
+    )
+    staff_filters = [User.company_id == company_id, User.is_active == True]
+    if department_id is not None:
+        staff_filters.append(User.department_id == department_id)
+
+    def grouped(*columns):
+        return select(*columns, *_measures()).select_from(User).outerjoin(AttendanceDaily, in_period).where(*staff_filters)
+
+    if db.get_bind().dialect.name == "postgresql":
+        stmt = grouped(
+            User.department_id.label('department_id'),
+            User.id.label('user_id'),
+            func.grouping(User.department_id, User.id).label('level')
+        ).group_by(func.rollup(User.department_id, User.id))
+    else:
+        stmt = union_all(
+            grouped(
+                User.department_id.label('department_id'),
+                User.id.label('user_id'),
+                literal(EMPLOYEE_LEVEL, Integer).label('level')
+            ).group_by(User.department_id, User.id),
+            grouped(
+                User.department_id.label('department_id'),
+                null().label('user_id'),
+                literal(DEPARTMENT_LEVEL, Integer).label('level')
+            ).group_by(User.department_id),
+            grouped(
+                null().label('department_id'),
+                null().label('user_id'),
+                literal(COMPANY_LEVEL, Integer).label('level')
+            )
+        )
+    rows = db.execute(stmt).all()
+
+    staff = {
+        member.id: member
+        for member in db.query(
+            User.id, (User.first_name + ' ' + User.last_name).label('user_name'), User.email
+        ).filter(*staff_filters)
+    }
+    department_names = dict(
+        db.query(Department.id, Department.name).filter(Department.company_id == company_id).all()
+    )
+
+    company_totals = None
+    departments: Dict[Optional[int], Dict[str, Any]] = {}
+    for row in rows:
+        if row.level == COMPANY_LEVEL:
+            company_totals = _totals(row)
+            continue
+        department = departments.setdefault(row.department_id, {
+            "department_id": row.department_id,
+            "department_name": department_names.get(row.department_id, "未分配部門"),
+            "totals": None,
+            "employees": []
+        })
+        if row.level == DEPARTMENT_LEVEL:
+            department["totals"] = _totals(row)
+        else:
+            member = staff[row.user_id]
+            department["employees"].append({
+                "user_id": row.user_id,
+                "user_name": member.user_name,
+                "user_email": member.email,
+                **_totals(row)
+            })
+
+    ordered: List[Dict[str, Any]] = sorted(
+        departments.values(),
+        key=lambda department: (department["department_id"] is None, department["department_id"] or 0)
+    )
+    for department in ordered:
+        department["employees"].sort(key=lambda employee: employee["user_id"])
+
+    return {
+        "period": {"start_date": first_day, "end_date": last_day},
+        "company": company_totals or _totals_empty(),
+        "departments": ordered
+    }
+
+
+def _totals_empty() -> Dict[str, Any]:
+    return {
+        "employee_count": 0,
+        "attendance_days": 0,
+        "work_hours": 0.0,
+        "overtime_hours": 0.0,
+        "late_count": 0,
+        "early_leave_count": 0,
+    }
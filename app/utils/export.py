@@ -0,0 +1,89 @@
+import csv
+import enum
+import io
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Iterable, Iterator, List, Sequence
+
+from sqlalchemy.orm import Query, Session
+
+from app.db.models import AttendanceRecord, User
+
+# 每累積多少列輸出一次，避免逐列產生過小的網路封包
+STREAM_CHUNK_ROWS = 500
+
+# 伺服器端游標每批讀取的列數
+EXPORT_YIELD_PER = 1000
+
+ATTENDANCE_EXPORT_COLUMNS = [
+    "id", "user_id", "user_name", "user_email", "company_id", "record_time", "work_date",
+    "record_type", "status", "latitude", "longitude", "is_manual_correction", "note"
+]
+
+
+def attendance_export_query(db: Session) -> Query:
+    """出勤記錄匯出的欄位投影，已 join users 表，欄位順序與 ATTENDANCE_EXPORT_COLUMNS 相同"""
+    return db.query(
+        AttendanceRecord.id,
+        AttendanceRecord.user_id,
+        (User.first_name + ' ' + User.last_name).label('user_name'),
+        User.email.label('user_email'),
+        AttendanceRecord.company_id,
+        AttendanceRecord.record_time,
+        AttendanceRecord.work_date,
+        AttendanceRecord.record_type,
+        AttendanceRecord.status,
+        AttendanceRecord.latitude,
+        AttendanceRecord.longitude,
+        AttendanceRecord.is_manual_correction,
+        AttendanceRecord.note
+    ).join(User, User.id == AttendanceRecord.user_id)
+
+
+def export_value(value: Any) -> Any:
+    """將資料庫值轉為可輸出的基本型別"""
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def stream_csv(rows: Iterable[Sequence[Any]], columns: List[str]) -> Iterator[str]:
+    """
+    逐批輸出 CSV，記憶體用量與總列數無關
+    開頭加上 UTF-8 BOM 讓 Excel 正確辨識中文
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(columns)
+
+    pending = 0
+    for row in rows:
+        writer.writerow([export_value(value) for value in row])
+        pending += 1
+        if pending >= STREAM_CHUNK_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+    yield buffer.getvalue()
+
+
+def stream_ndjson(rows: Iterable[Sequence[Any]], columns: List[str]) -> Iterator[str]:
+    """逐批輸出 NDJSON，每列一個 JSON 物件"""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(
+            {column: export_value(value) for column, value in zip(columns, row)},
+            ensure_ascii=False
+        ))
+        if len(lines) >= STREAM_CHUNK_ROWS:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
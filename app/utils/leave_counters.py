@@ -0,0 +1,79 @@
+from collections import Counter
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Query, Session
+
+from app.db.models import LeaveApplication, LeaveStatus, LeaveStatusCounter
+
+# (company_id, user_id, 原狀態, 新狀態)；新增請假時原狀態為 None
+StatusChange = Tuple[int, int, Optional[LeaveStatus], LeaveStatus]
+
+
+def apply_leave_status_changes(db: Session, changes: Iterable[StatusChange]) -> None:
+    """
+    依狀態變更增減計數，多筆變更先合併後以單一 upsert 寫入
+    於呼叫端的交易內執行，與請假狀態一同 commit
+    """
+    deltas: Counter = Counter()
+    for company_id, user_id, old_status, new_status in changes:
+        if old_status == new_status:
+            continue
+        if old_status is not None:
+            deltas[(company_id, user_id, old_status)] -= 1
+        deltas[(company_id, user_id, new_status)] += 1
+
+    rows = [
+        {"company_id": company_id, "user_id": user_id, "status": status, "count": delta}
+        for (company_id, user_id, status), delta in deltas.items()
+        if delta
+    ]
+    if not rows:
+        return
+
+    dialect_insert = postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    stmt = dialect_insert(LeaveStatusCounter).values(rows)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["company_id", "user_id", "status"],
+        set_={"count": LeaveStatusCounter.count + stmt.excluded.count}
+    ))
+
+
+def read_leave_status_counts(
+    db: Session,
+    company_id: Optional[int] = None,
+    user_id: Optional[int] = None
+) -> Dict[LeaveStatus, int]:
+    """由計數表讀取各狀態件數，指定公司時為主鍵前綴查詢，指定員工時使用 user_id 索引"""
+    query = db.query(LeaveStatusCounter.status, func.sum(LeaveStatusCounter.count))
+    if company_id is not None:
+        query = query.filter(LeaveStatusCounter.company_id == company_id)
+    if user_id is not None:
+        query = query.filter(LeaveStatusCounter.user_id == user_id)
+    return {status: int(count or 0) for status, count in query.group_by(LeaveStatusCounter.status)}
+
+
+def count_leaves_by_status(query: Query) -> Dict[LeaveStatus, int]:
+    """任意條件的請假查詢以單一分組查詢計算各狀態件數"""
+    return dict(
+        query.with_entities(LeaveApplication.status, func.count(LeaveApplication.id))
+        .order_by(None)
+        .group_by(LeaveApplication.status)
+        .all()
+    )
+
+
+def rebuild_leave_status_counters(db: Session) -> int:
+    """由 leave_applications 重新計算所有計數，回傳寫入的列數"""
+    db.execute(delete(LeaveStatusCounter))
+    grouped = select(
+        LeaveApplication.company_id,
+        LeaveApplication.user_id,
+        LeaveApplication.status,
+        func.count(LeaveApplication.id)
+    ).group_by(LeaveApplication.company_id, LeaveApplication.user_id, LeaveApplication.status)
+    return db.execute(insert(LeaveStatusCounter).from_select(
+        ["company_id", "user_id", "status", "count"], grouped
+    )).rowcount
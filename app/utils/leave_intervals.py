@@ -0,0 +1,179 @@
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy.orm import Query, Session
+
+from app.core.work_calendar import WorkCalendar
+from app.db.models import LeaveApplication, LeaveStatus, LeaveType, User
+from app.utils.local_time import get_zone
+
+# 公司未設定工作時間時以 models.Company 的預設值計算請假時數
+DEFAULT_WORK_START = time(9, 0)
+DEFAULT_WORK_END = time(18, 0)
+
+
+class LeaveInterval(NamedTuple):
+    start: datetime  # 公司當地時間，不含時區
+    end: datetime
+    leave_type: LeaveType
+
+
+class DayLeave(NamedTuple):
+    leave_type: LeaveType  # 同一天有多筆假時取時數最多的假別
+    hours: float
+    day_fraction: float  # 請假時數占當天工作時間的比例
+    hours_by_type: Dict[LeaveType, float]
+
+
+def local_naive(value: datetime, tz_name: Optional[str]) -> datetime:
+    # 沒有時區資訊的舊資料視為已是當地時間
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(get_zone(tz_name)).replace(tzinfo=None)
+
+
+def approved_leaves_query(
+    db: Session,
+    company_id: int,
+    first_day: date,
+    last_day: date,
+    tz_name: Optional[str],
+    user_ids: Optional[Iterable[int]] = None,
+    department_id: Optional[int] = None
+) -> Query:
+    """期間內已核准的請假，依員工與開始時間排序；每列以 leave_interval 轉為當地時間區間"""
+    zone = get_zone(tz_name)
+    period_start = datetime.combine(first_day, time.min, tzinfo=zone)
+    period_end = datetime.combine(last_day + timedelta(days=1), time.min, tzinfo=zone)
+
+    query = db.query(
+        LeaveApplication.user_id,
+        LeaveApplication.start_date,
+        LeaveApplication.end_date,
+        LeaveApplication.leave_type
+    ).filter(
+        LeaveApplication.company_id == company_id,
+        LeaveApplication.status == LeaveStatus.approved,
+        LeaveApplication.start_date < period_end,
+        LeaveApplication.end_date > period_start
+    )
+    if user_ids is not None:
+        query = query.filter(LeaveApplication.user_id.in_(list(user_ids)))
+    if department_id is not None:
+        query = query.join(User, User.id == LeaveApplication.user_id).filter(User.department_id == department_id)
+    return query.order_by(LeaveApplication.user_id, LeaveApplication.start_date)
+
+
+def leave_interval(row, tz_name: Optional[str]) -> LeaveInterval:
+    return LeaveInterval(local_naive(row.start_date, tz_name), local_naive(row.end_date, tz_name), row.leave_type)
+
+
+def load_approved_leaves(
+    db: Session,
+    company_id: int,
+    first_day: date,
+    last_day: date,
+    tz_name: Optional[str],
+    user_ids: Optional[Iterable[int]] = None,
+    department_id: Optional[int] = None
+) -> Dict[int, List[LeaveInterval]]:
+    """
+    以單一查詢載入期間內已核准的請假，依員工分組並按開始時間排序
+    """
+    leaves: Dict[int, List[LeaveInterval]] = defaultdict(list)
+    for row in approved_leaves_query(db, company_id, first_day, last_day, tz_name, user_ids, department_id):
+        leaves[row.user_id].append(leave_interval(row, tz_name))
+    return leaves
+
+
+def sweep_leave_days(
+    intervals: List[LeaveInterval],
+    first_day: date,
+    last_day: date,
+    work_calendar: WorkCalendar,
+    work_start: Optional[time],
+    work_end: Optional[time]
+) -> Dict[date, DayLeave]:
+    """
+    依日期順序掃描已排序的請假區間，計算每個工作日與上班時段重疊的請假時數
+    區間只在開始時加入、結束後移出，整個月份只走訪一次
+    """
+    work_start = work_start or DEFAULT_WORK_START
+    work_end = work_end or DEFAULT_WORK_END
+    day_hours = (datetime.combine(first_day, work_end) - datetime.combine(first_day, work_start)).total_seconds() / 3600
+
+    result: Dict[date, DayLeave] = {}
+    active: List[LeaveInterval] = []
+    next_index = 0
+    current = first_day
+    while current <= last_day:
+        shift_start = datetime.combine(current, work_start)
+        shift_end = datetime.combine(current, work_end)
+
+        while next_index < len(intervals) and intervals[next_index].start < shift_end:
+            active.append(intervals[next_index])
+            next_index += 1
+        active = [interval for interval in active if interval.end > shift_start]
+
+        if active and work_calendar.is_working_day(current) and day_hours > 0:
+            hours_by_type: Dict[LeaveType, float] = defaultdict(float)
+            for interval in active:
+                overlap = (min(interval.end, shift_end) - max(interval.start, shift_start)).total_seconds()
+                if overlap > 0:
+                    hours_by_type[interval.leave_type] += overlap / 3600
+            if hours_by_type:
+                hours = min(sum(hours_by_type.values()), day_hours)
+                result[current] = DayLeave(
+                    leave_type=max(hours_by_type, key=hours_by_type.get),
+                    hours=round(hours, 2),
+                    day_fraction=hours / day_hours,
+                    hours_by_type=dict(hours_by_type)
+                )
+
+        current += timedelta(days=1)
+    return result
+
+
+def count_leave_days(
+    interval: LeaveInterval,
+    first_day: date,
+    last_day: date,
+    work_calendar: WorkCalendar,
+    work_start: Optional[time],
+    work_end: Optional[time]
+) -> float:
+    """
+    單一請假區間在 first_day 至 last_day（同一年）涵蓋的工作日天數，半天假為 0.5
+    頭尾以外的日期整天請假，以工作日表的前綴和計算；只有頭尾兩天逐日計算時數
+    """
+    if (work_end or DEFAULT_WORK_END) <= (work_start or DEFAULT_WORK_START):
+        return 0.0
+
+    full_start = max(first_day, interval.start.date() + timedelta(days=1))
+    full_end = min(last_day, interval.end.date() - timedelta(days=1))
+    if full_start > full_end:
+        edges = [(first_day, last_day)]
+        full_days = 0
+    else:
+        edges = [(first_day, full_start - timedelta(days=1)), (full_end + timedelta(days=1), last_day)]
+        full_days = work_calendar.count_working_days(full_start, full_end)
+
+    partial_days = sum(
+        day_leave.day_fraction
+        for edge_start, edge_end in edges if edge_start <= edge_end
+        for day_leave in sweep_leave_days(
+            [interval], edge_start, edge_end, work_calendar, work_start, work_end
+        ).values()
+    )
+    return full_days + partial_days
+
+
+def leave_days_by_type(day_leaves: Iterable[DayLeave]) -> Dict[str, float]:
+    """各假別的請假天數（以當天工作時間比例計，半天假為 0.5）"""
+    totals: Dict[str, float] = defaultdict(float)
+    for day_leave in day_leaves:
+        day_total = sum(day_leave.hours_by_type.values())
+        for leave_type, hours in day_leave.hours_by_type.items():
+            totals[leave_type.value] += day_leave.day_fraction * hours / day_total
+    return {leave_type: round(days, 2) for leave_type, days in sorted(totals.items())}
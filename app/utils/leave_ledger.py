@@ -0,0 +1,230 @@
+from datetime import date
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import Integer, and_, cast, exists, func, insert, literal, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.core.company_policy import get_company_policy
+from app.core.work_calendar import get_work_calendar
+from app.db.models import (
+    LeaveApplication,
+    LeaveBalance,
+    LeaveLedgerEntry,
+    LeaveLedgerEntryType,
+    LeaveType,
+    User,
+)
+from app.utils.leave_intervals import LeaveInterval, count_leave_days, local_naive
+
+# 影響額度的帳目；其餘（usage/reversal）影響已使用天數
+ENTITLEMENT_ENTRIES = (LeaveLedgerEntryType.accrual, LeaveLedgerEntryType.adjustment)
+
+TWO_PLACES = Decimal("0.01")
+
+
+def _dialect_insert(db: Session):
+    return postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+
+
+def post_ledger_entries(db: Session, entries: List[Dict[str, Any]]) -> None:
+    """
+    寫入帳目並以單一 upsert 更新對應的額度列
+    於呼叫端的交易內執行，與請假狀態一同 commit
+    """
+    if not entries:
+        return
+
+    db.execute(insert(LeaveLedgerEntry), entries)
+
+    deltas: Dict[tuple, Dict[str, Any]] = {}
+    for entry in entries:
+        key = (entry["user_id"], entry["leave_type"], entry["year"])
+        delta = deltas.setdefault(key, {
+            "user_id": entry["user_id"],
+            "leave_type": entry["leave_type"],
+            "year": entry["year"],
+            "company_id": entry["company_id"],
+            "entitled_days": Decimal(0),
+            "used_days": Decimal(0)
+        })
+        column = "entitled_days" if entry["entry_type"] in ENTITLEMENT_ENTRIES else "used_days"
+        delta[column] += entry["days"]
+
+    stmt = _dialect_insert(db)(LeaveBalance).values(list(deltas.values()))
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["user_id", "leave_type", "year"],
+        set_={
+            "entitled_days": LeaveBalance.entitled_days + stmt.excluded.entitled_days,
+            "used_days": LeaveBalance.used_days + stmt.excluded.used_days,
+            "updated_at": func.now()
+        }
+    ))
+
+
+def leave_days_by_year(db: Session, leave: LeaveApplication) -> Dict[int, Decimal]:
+    """
+    請假涵蓋的工作日天數，依年度分開（跨年請假分別扣各年度額度）
+    與月出勤表相同，以公司工作日表與上班時段計算，半天假為 0.5
+    """
+    policy = get_company_policy(db, leave.company_id)
+    tz_name = policy.timezone if policy else None
+    interval = LeaveInterval(
+        local_naive(leave.start_date, tz_name),
+        local_naive(leave.end_date, tz_name),
+        leave.leave_type
+    )
+
+    days: Dict[int, Decimal] = {}
+    for year in range(interval.start.year, interval.end.year + 1):
+        first_day = max(interval.start.date(), date(year, 1, 1))
+        last_day = min(interval.end.date(), date(year, 12, 31))
+        total = count_leave_days(
+            interval, first_day, last_day, get_work_calendar(db, leave.company_id, year),
+            policy.work_start_time if policy else None, policy.work_end_time if policy else None
+        )
+        if total:
+            days[year] = Decimal(str(total)).quantize(TWO_PLACES)
+    return days
+
+
+def record_leave_usage(db: Session, leaves: Iterable[LeaveApplication], created_by: Optional[int] = None) -> None:
+    """請假核准時扣除額度"""
+    entries = []
+    for leave in leaves:
+        for year, days in leave_days_by_year(db, leave).items():
+            entries.append({
+                "user_id": leave.user_id,
+                "company_id": leave.company_id,
+                "leave_type": leave.leave_type,
+                "year": year,
+                "entry_type": LeaveLedgerEntryType.usage,
+                "days": days,
+                "leave_application_id": leave.id,
+                "created_by": created_by
+            })
+    post_ledger_entries(db, entries)
+
+
+def reverse_leave_usage(db: Session, leaves: Iterable[LeaveApplication], created_by: Optional[int] = None) -> None:
+    """
+    已核准的請假取消時沖回扣除的天數
+    依帳上實際扣除的金額沖回，不因之後工作日表變動而出現差額
+    """
+    leaves_by_id = {leave.id: leave for leave in leaves}
+    if not leaves_by_id:
+        return
+
+    posted = db.query(
+        LeaveLedgerEntry.leave_application_id,
+        LeaveLedgerEntry.year,
+        func.sum(LeaveLedgerEntry.days)
+    ).filter(
+        LeaveLedgerEntry.leave_application_id.in_(list(leaves_by_id)),
+        LeaveLedgerEntry.entry_type.in_([LeaveLedgerEntryType.usage, LeaveLedgerEntryType.reversal])
+    ).group_by(LeaveLedgerEntry.leave_application_id, LeaveLedgerEntry.year).all()
+
+    entries = []
+    for leave_id, year, days in posted:
+        if not days:
+            continue
+        leave = leaves_by_id[leave_id]
+        entries.append({
+            "user_id": leave.user_id,
+            "company_id": leave.company_id,
+            "leave_type": leave.leave_type,
+            "year": year,
+            "entry_type": LeaveLedgerEntryType.reversal,
+            "days": -Decimal(days),
+            "leave_application_id": leave.id,
+            "created_by": created_by
+        })
+    post_ledger_entries(db, entries)
+
+
+def adjust_leave_balance(
+    db: Session,
+    user: User,
+    leave_type: LeaveType,
+    year: int,
+    days: Decimal,
+    note: Optional[str] = None,
+    created_by: Optional[int] = None
+) -> None:
+    """人工調整額度（正數增加、負數減少）"""
+    post_ledger_entries(db, [{
+        "user_id": user.id,
+        "company_id": user.company_id,
+        "leave_type": leave_type,
+        "year": year,
+        "entry_type": LeaveLedgerEntryType.adjustment,
+        "days": days,
+        "note": note,
+        "created_by": created_by
+    }])
+
+
+def get_leave_balances(db: Session, user_id: int, year: int) -> List[LeaveBalance]:
+    """員工某年度各假別的額度，每種假別一列主鍵讀取"""
+    return db.query(LeaveBalance).filter(
+        LeaveBalance.user_id == user_id,
+        LeaveBalance.year == year
+    ).order_by(LeaveBalance.leave_type).all()
+
+
+def run_yearly_accrual(
+    db: Session,
+    company_id: int,
+    year: int,
+    leave_type: LeaveType,
+    days: Decimal,
+    created_by: Optional[int] = None
+) -> int:
+    """
+    對公司所有在職員工給予年度額度，回傳給假人數
+    以兩個 INSERT ... SELECT 在資料庫內完成，不逐一員工處理
+    已給過同年度同假別額度的員工略過，可重複執行
+    """
+    already_accrued = exists().where(
+        LeaveLedgerEntry.user_id == User.id,
+        LeaveLedgerEntry.leave_type == leave_type,
+        LeaveLedgerEntry.year == year,
+        LeaveLedgerEntry.entry_type == LeaveLedgerEntryType.accrual
+    )
+    eligible = and_(User.company_id == company_id, User.is_active == True, ~already_accrued)
+
+    # 先更新額度列，判斷是否已給假的帳目在下一個語句才寫入
+    # 常數需明確轉型，PostgreSQL 的 INSERT ... SELECT 不會自動將文字轉為列舉
+    balances = select(
+        User.id,
+        cast(literal(leave_type.name), LeaveBalance.leave_type.type),
+        literal(year, Integer),
+        User.company_id,
+        cast(literal(days), LeaveBalance.entitled_days.type),
+        cast(literal(Decimal(0)), LeaveBalance.used_days.type)
+    ).where(eligible)
+    stmt = _dialect_insert(db)(LeaveBalance).from_select(
+        ["user_id", "leave_type", "year", "company_id", "entitled_days", "used_days"], balances
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["user_id", "leave_type", "year"],
+        set_={
+            "entitled_days": LeaveBalance.entitled_days + stmt.excluded.entitled_days,
+            "updated_at": func.now()
+        }
+    ))
+
+    accruals = select(
+        User.id,
+        User.company_id,
+        cast(literal(leave_type.name), LeaveLedgerEntry.leave_type.type),
+        literal(year, Integer),
+        cast(literal(LeaveLedgerEntryType.accrual.name), LeaveLedgerEntry.entry_type.type),
+        cast(literal(days), LeaveLedgerEntry.days.type),
+        literal(created_by, Integer)
+    ).where(eligible)
+    return db.execute(insert(LeaveLedgerEntry).from_select(
+        ["user_id", "company_id", "leave_type", "year", "entry_type", "days", "created_by"], accruals
+    )).rowcount
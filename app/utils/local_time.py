@@ -0,0 +1,34 @@
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+DEFAULT_TIMEZONE = "Asia/Taipei"
+
+
+@lru_cache(maxsize=None)
+def get_zone(tz_name: Optional[str]) -> ZoneInfo:
+    """
+    取得時區物件，未設定或無效的時區名稱時使用預設時區
+    """
+    try:
+        return ZoneInfo(tz_name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(DEFAULT_TIMEZONE)
+
+
+def local_now(tz_name: Optional[str]) -> datetime:
+    """
+    取得公司當地時間（含時區資訊）
+    """
+    return datetime.now(get_zone(tz_name))
+
+
+def local_work_date(record_time: datetime, tz_name: Optional[str]) -> date:
+    """
+    計算打卡時間在公司當地時區的工作日期
+    沒有時區資訊的舊資料視為已是當地時間
+    """
+    if record_time.tzinfo is None:
+        return record_time.date()
+    return record_time.astimezone(get_zone(tz_name)).date()
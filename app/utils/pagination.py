@@ -0,0 +1,88 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+from sqlalchemy.orm.attributes import InstrumentedAttribute
+
+
+def encode_cursor(sort_value: Optional[datetime], row_id: int) -> str:
+    """將排序鍵編碼為不透明的游標字串，排序欄位為 NULL 時編碼為 null"""
+    raw = json.dumps([sort_value.isoformat() if sort_value is not None else None, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    """解碼游標，格式錯誤時拋出 ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return (datetime.fromisoformat(sort_value) if sort_value is not None else None), int(row_id)
+    except (TypeError, ValueError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def keyset_page(
+    query: Query,
+    sort_column: InstrumentedAttribute,
+    id_column: InstrumentedAttribute,
+    cursor: Optional[str],
+    limit: int,
+    descending: bool = True
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    以 (排序欄位, id) 進行 keyset 分頁，深層頁面與第一頁成本相同，且不受新寫入資料影響
+    cursor 為空字串時取第一頁；回傳 (本頁資料, 下一頁游標)
+    排序與比較都直接使用欄位本身，以 (…, 排序欄位, id) 索引依序讀取
+    可為 NULL 的排序欄位（如 created_at）另以 IS NULL 區段依 id 分頁，NULL 視為最舊的資料
+    """
+    nullable = sort_column.property.columns[0].nullable
+    key = tuple_(sort_column, id_column)
+
+    def value_rows(after: Optional[Tuple[datetime, int]]) -> Query:
+        segment = query.filter(sort_column.isnot(None)) if nullable else query
+        if after is not None:
+            segment = segment.filter(key < after if descending else key > after)
+        if descending:
+            return segment.order_by(sort_column.desc(), id_column.desc())
+        return segment.order_by(sort_column.asc(), id_column.asc())
+
+    def null_rows(after: Optional[int]) -> Query:
+        segment = query.filter(sort_column.is_(None))
+        if after is not None:
+            segment = segment.filter(id_column < after if descending else id_column > after)
+        return segment.order_by(id_column.desc() if descending else id_column.asc())
+
+    segments = [value_rows]
+    if nullable:
+        segments = [value_rows, null_rows] if descending else [null_rows, value_rows]
+
+    start, after = 0, None
+    if cursor:
+        try:
+            sort_value, row_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if sort_value is None:
+            if not nullable:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            start, after = segments.index(null_rows), row_id
+        else:
+            start, after = segments.index(value_rows), (sort_value, row_id)
+
+    # 通常第一個區段就足以填滿本頁，只有讀到區段結尾時才查詢下一個區段
+    rows: List[Any] = []
+    for index in range(start, len(segments)):
+        rows.extend(segments[index](after if index == start else None).limit(limit + 1 - len(rows)).all())
+        if len(rows) > limit:
+            break
+
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
@@ -0,0 +1,151 @@
+from typing import IO, Any, Dict, Iterable, List
+
+from app.utils.export import export_value
+
+# 月度統計欄位：(標題, summarize_company_month 的鍵)
+SUMMARY_COLUMNS = [
+    ("員工ID", "user_id"),
+    ("姓名", "user_name"),
+    ("Email", "user_email"),
+    ("出勤天數", "attendance_days"),
+    ("上班打卡次數", "check_in_count"),
+    ("下班打卡次數", "check_out_count"),
+    ("加班時數", "overtime_hours"),
+    ("加班次數", "overtime_sessions"),
+    ("遲到次數", "late_count"),
+    ("早退次數", "early_leave_count"),
+    ("上班缺卡天數", "missing_check_in_days"),
+    ("下班缺卡天數", "missing_check_out_days"),
+    ("缺勤天數", "absence_days"),
+]
+
+# 個人出勤明細欄位：(標題, daily_records 的鍵)
+DAILY_COLUMNS = [
+    ("日期", "date"),
+    ("星期", "weekday_zh"),
+    ("上班", "check_in"),
+    ("下班", "check_out"),
+    ("加班開始", "overtime_start"),
+    ("加班結束", "overtime_end"),
+    ("工作時數", "work_hours"),
+    ("加班時數", "overtime_hours"),
+    ("假別", "leave_type"),
+    ("請假時數", "leave_hours"),
+]
+
+PDF_FONT = "MSung-Light"  # reportlab 內建的繁體中文 CID 字型，不需額外字型檔
+PDF_FONT_SIZE = 9
+PDF_LINE_HEIGHT = 14
+PDF_MARGIN = 40
+
+
+class ExportDependencyMissing(Exception):
+    """匯出格式所需的套件未安裝"""
+
+
+def _daily_rows(sheets: Iterable[Dict[str, Any]]) -> Iterable[List[Any]]:
+    """將個人出勤表展開為明細列，員工資訊放在每列開頭"""
+    for sheet in sheets:
+        user_info = sheet["user_info"]
+        for record in sheet["daily_records"]:
+            yield [user_info["id"], user_info["name"]] + [export_value(record[key]) for _, key in DAILY_COLUMNS]
+
+
+def write_monthly_xlsx(
+    output: IO[bytes],
+    summary: List[Dict[str, Any]],
+    sheets: Iterable[Dict[str, Any]]
+) -> None:
+    """
+    以 openpyxl 的 write-only 模式輸出月度統計與個人出勤明細兩個工作表
+    列資料逐列寫入暫存檔；sheets 為逐位產生的 iterator（如 build_individual_records）時，
+    明細只保留目前這位員工的資料，記憶體中只有每位員工一列的月度統計
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ExportDependencyMissing("openpyxl")
+
+    workbook = Workbook(write_only=True)
+
+    summary_sheet = workbook.create_sheet("月度統計")
+    summary_sheet.append([title for title, _ in SUMMARY_COLUMNS])
+    for row in summary:
+        summary_sheet.append([row[key] for _, key in SUMMARY_COLUMNS])
+
+    detail_sheet = workbook.create_sheet("個人出勤明細")
+    detail_sheet.append(["員工ID", "姓名"] + [title for title, _ in DAILY_COLUMNS])
+    for row in _daily_rows(sheets):
+        detail_sheet.append(row)
+
+    workbook.save(output)
+
+
+def write_monthly_pdf(
+    output: IO[bytes],
+    title: str,
+    summary: List[Dict[str, Any]],
+    sheets: Iterable[Dict[str, Any]]
+) -> None:
+    """
+    以 reportlab canvas 逐頁輸出：先列月度統計，之後每位員工的出勤明細各自換頁
+    明細逐位取用，不需先組出所有員工的資料；但 canvas 在 save() 前會保留所有已完成的頁面，
+    記憶體用量仍隨頁數（員工數）增加，大型公司應改用 xlsx
+    """
+    try:
+        from reportlab.lib.pagesizes import A4, landscape
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+        from reportlab.pdfgen import canvas
+    except ImportError:
+        raise ExportDependencyMissing("reportlab")
+
+    if PDF_FONT not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(UnicodeCIDFont(PDF_FONT))
+
+    page_width, page_height = landscape(A4)
+    pdf = canvas.Canvas(output, pagesize=(page_width, page_height))
+
+    y = 0.0
+
+    def start_page(heading: str, headers: List[str]) -> None:
+        nonlocal y
+        pdf.setFont(PDF_FONT, PDF_FONT_SIZE + 3)
+        pdf.drawString(PDF_MARGIN, page_height - PDF_MARGIN, heading)
+        y = page_height - PDF_MARGIN - PDF_LINE_HEIGHT * 2
+        draw_row(headers)
+
+    def draw_row(values: List[Any]) -> None:
+        nonlocal y
+        pdf.setFont(PDF_FONT, PDF_FONT_SIZE)
+        column_width = (page_width - PDF_MARGIN * 2) / len(values)
+        for index, value in enumerate(values):
+            text = "" if value is None else str(value)
+            pdf.drawString(PDF_MARGIN + index * column_width, y, text[:40])
+        y -= PDF_LINE_HEIGHT
+
+    def write_table(heading: str, headers: List[str], rows: Iterable[List[Any]]) -> None:
+        start_page(heading, headers)
+        for row in rows:
+            if y < PDF_MARGIN:
+                pdf.showPage()
+                start_page(f"{heading}（續）", headers)
+            draw_row(row)
+        pdf.showPage()
+
+    write_table(
+        title,
+        [header for header, _ in SUMMARY_COLUMNS],
+        ([row[key] for _, key in SUMMARY_COLUMNS] for row in summary)
+    )
+    for sheet in sheets:
+        user_info = sheet["user_info"]
+        totals = sheet["summary"]
+        write_table(
+            f"{user_info['name']}（{user_info['department_name'] or user_info['company_name']}）"
+            f" 工作 {totals['total_work_hours']} 小時 / 加班 {totals['total_overtime_hours']} 小時",
+            [header for header, _ in DAILY_COLUMNS],
+            ([export_value(record[key]) for _, key in DAILY_COLUMNS] for record in sheet["daily_records"])
+        )
+
+    pdf.save()
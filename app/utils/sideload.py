@@ -0,0 +1,60 @@
+from typing import Any, Dict, List, Optional, Set, Type
+
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from app.db.models import Company, User
+from app.schemas.company import Company as CompanySchema
+from app.schemas.user import User as UserSchema
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Set[str]]:
+    """解析以逗號分隔的 sparse fieldset 參數，未指定時回傳 None 代表全部欄位"""
+    if not fields:
+        return None
+    return {field.strip() for field in fields.split(",") if field.strip()}
+
+
+# 每筆資料一律保留的外鍵，用來對應 included 中的使用者與公司
+SIDELOAD_KEYS = {"user_id", "company_id"}
+
+
+def _dump(
+    schema: Type[BaseModel],
+    obj: Any,
+    fields: Optional[Set[str]],
+    required: Set[str] = frozenset()
+) -> Dict[str, Any]:
+    include = fields | {"id"} | required if fields is not None else None
+    return schema.model_validate(obj).model_dump(mode="json", include=include)
+
+
+def build_compact_response(
+    db: Session,
+    rows: List[Any],
+    row_schema: Type[BaseModel],
+    fields: Optional[Set[str]] = None,
+    user_fields: Optional[Set[str]] = None,
+    company_fields: Optional[Set[str]] = None,
+    next_cursor: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    精簡響應格式：每筆資料只帶 user_id / company_id，
+    不重複的使用者與公司各以一次 IN 查詢載入，放在 included 中
+    fields 未包含 user_id / company_id 時仍會輸出，否則無法對應 included
+    """
+    items = [_dump(row_schema, row, fields, SIDELOAD_KEYS) for row in rows]
+
+    user_ids = {row.user_id for row in rows}
+    company_ids = {row.company_id for row in rows}
+    users = db.query(User).filter(User.id.in_(user_ids)).all() if user_ids else []
+    companies = db.query(Company).filter(Company.id.in_(company_ids)).all() if company_ids else []
+
+    return {
+        "items": items,
+        "included": {
+            "users": {str(user.id): _dump(UserSchema, user, user_fields) for user in users},
+            "companies": {str(company.id): _dump(CompanySchema, company, company_fields) for company in companies},
+        },
+        "next_cursor": next_cursor,
+    }
@@ -0,0 +1,213 @@
+from datetime import date, datetime, timedelta
+from itertools import groupby
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import Session
+
+from app.db.models import AttendanceRecord, AttendanceType, WorkSession, WorkSessionType
+
+# 開始與結束打卡各自對應的時段類型
+OPENING_PUNCHES = {
+    AttendanceType.check_in: WorkSessionType.work,
+    AttendanceType.overtime_start: WorkSessionType.overtime,
+}
+CLOSING_PUNCHES = {
+    AttendanceType.check_out: WorkSessionType.work,
+    AttendanceType.overtime_end: WorkSessionType.overtime,
+}
+
+# 超過此長度的結束打卡不再與開始打卡配對，開始的時段保持未結束
+MAX_SESSION_LENGTH = timedelta(hours=24)
+
+REBUILD_BATCH_SIZE = 1000
+
+
+def elapsed_seconds(start: datetime, end: datetime) -> int:
+    """
+    計算兩個打卡時間相差的秒數
+    SQLite 讀回的時間不含時區，與剛打卡的時間比較時一律以當地牆上時間計算
+    """
+    if (start.tzinfo is None) != (end.tzinfo is None):
+        start = start.replace(tzinfo=None)
+        end = end.replace(tzinfo=None)
+    return int((end - start).total_seconds())
+
+
+class PairedSession(NamedTuple):
+    session_type: WorkSessionType
+    work_date: date
+    start_time: datetime
+    start_record_id: int
+    end_time: Optional[datetime] = None
+    end_record_id: Optional[int] = None
+
+    @property
+    def duration_seconds(self) -> Optional[int]:
+        if self.end_time is None:
+            return None
+        return elapsed_seconds(self.start_time, self.end_time)
+
+
+def pair_punches(punches: Iterable[Any]) -> List[PairedSession]:
+    """
+    將同一員工依時間排序的打卡配對為工作/加班時段
+    punches 需有 id、record_type、record_time、work_date 屬性
+    結束打卡與最近一筆未結束的同類開始打卡配對，因此可跨午夜；
+    沒有結束打卡的時段保留為未結束，沒有開始打卡的結束打卡則忽略
+    """
+    sessions: List[PairedSession] = []
+    open_sessions: Dict[WorkSessionType, PairedSession] = {}
+
+    for punch in punches:
+        if punch.record_type in OPENING_PUNCHES:
+            session_type = OPENING_PUNCHES[punch.record_type]
+            previous = open_sessions.pop(session_type, None)
+            if previous is not None:
+                sessions.append(previous)
+            open_sessions[session_type] = PairedSession(
+                session_type=session_type,
+                work_date=punch.work_date,
+                start_time=punch.record_time,
+                start_record_id=punch.id
+            )
+        elif punch.record_type in CLOSING_PUNCHES:
+            started = open_sessions.pop(CLOSING_PUNCHES[punch.record_type], None)
+            if started is None:
+                continue
+            if elapsed_seconds(started.start_time, punch.record_time) > MAX_SESSION_LENGTH.total_seconds():
+                sessions.append(started)
+                continue
+            sessions.append(started._replace(end_time=punch.record_time, end_record_id=punch.id))
+
+    sessions.extend(open_sessions.values())
+    sessions.sort(key=lambda session: session.start_time)
+    return sessions
+
+
+def _open_session_query(db: Session, user_id: int, session_type: WorkSessionType, record_time: datetime):
+    """結束打卡可關閉的時段：MAX_SESSION_LENGTH 內最近一筆未結束的同類時段"""
+    return db.query(WorkSession).filter(
+        WorkSession.user_id == user_id,
+        WorkSession.session_type == session_type,
+        WorkSession.end_time.is_(None),
+        WorkSession.start_time <= record_time,
+        WorkSession.start_time >= record_time - MAX_SESSION_LENGTH
+    ).order_by(WorkSession.start_time.desc())
+
+
+def open_session_work_date(
+    db: Session,
+    user_id: int,
+    record_type: AttendanceType,
+    record_time: datetime
+) -> Optional[date]:
+    """
+    結束打卡所屬的工作日期，即它將關閉的時段的工作日期；沒有可關閉的時段時回傳 None
+    跨午夜的夜班以開始打卡的日期計，結束打卡的唯一鍵因此不會與隔天的班別衝突
+    """
+    return _open_session_query(db, user_id, CLOSING_PUNCHES[record_type], record_time).with_entities(
+        WorkSession.work_date
+    ).limit(1).scalar()
+
+
+def record_punch_session(db: Session, record_id: int, values: Dict[str, Any]) -> Optional[date]:
+    """
+    依新寫入的打卡增量更新時段：開始打卡新增未結束的時段，結束打卡關閉最近一筆同類時段
+    回傳受影響時段的工作日期（跨午夜時為前一工作日），未配對時回傳 None；呼叫端負責 commit
+    """
+    record_type = values["record_type"]
+    record_time = values["record_time"]
+
+    if record_type in OPENING_PUNCHES:
+        db.add(WorkSession(
+            user_id=values["user_id"],
+            company_id=values["company_id"],
+            session_type=OPENING_PUNCHES[record_type],
+            work_date=values["work_date"],
+            start_time=record_time,
+            start_record_id=record_id
+        ))
+        db.flush()
+        return values["work_date"]
+
+    if record_type not in CLOSING_PUNCHES:
+        return None
+
+    session = _open_session_query(
+        db, values["user_id"], CLOSING_PUNCHES[record_type], record_time
+    ).with_for_update().first()
+    if session is None:
+        return None
+
+    session.end_time = record_time
+    session.end_record_id = record_id
+    session.duration_seconds = elapsed_seconds(session.start_time, record_time)
+    db.flush()
+    return session.work_date
+
+
+def rebuild_work_sessions(
+    db: Session,
+    company_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+) -> int:
+    """
+    由原始打卡記錄重建時段表，回傳寫入的時段數；呼叫端負責 commit
+    讀取範圍前後各多一天的打卡，讓跨午夜的時段在邊界也能正確配對
+    """
+    session_filters = []
+    punch_filters = []
+    if company_id is not None:
+        session_filters.append(WorkSession.company_id == company_id)
+        punch_filters.append(AttendanceRecord.company_id == company_id)
+    if start_date is not None:
+        session_filters.append(WorkSession.work_date >= start_date)
+        punch_filters.append(AttendanceRecord.work_date >= start_date - timedelta(days=1))
+    if end_date is not None:
+        session_filters.append(WorkSession.work_date <= end_date)
+        punch_filters.append(AttendanceRecord.work_date <= end_date + timedelta(days=1))
+
+    db.execute(delete(WorkSession).where(*session_filters))
+
+    punches = db.query(
+        AttendanceRecord.id,
+        AttendanceRecord.user_id,
+        AttendanceRecord.company_id,
+        AttendanceRecord.work_date,
+        AttendanceRecord.record_type,
+        AttendanceRecord.record_time
+    ).filter(*punch_filters).order_by(
+        AttendanceRecord.user_id, AttendanceRecord.record_time
+    ).yield_per(REBUILD_BATCH_SIZE)
+
+    written = 0
+    batch = []
+    for user_id, user_punches in groupby(punches, key=lambda punch: punch.user_id):
+        user_punches = list(user_punches)
+        company_by_record = {punch.id: punch.company_id for punch in user_punches}
+        for session in pair_punches(user_punches):
+            if start_date is not None and session.work_date < start_date:
+                continue
+            if end_date is not None and session.work_date > end_date:
+                continue
+            batch.append({
+                "user_id": user_id,
+                "company_id": company_by_record[session.start_record_id],
+                "session_type": session.session_type,
+                "work_date": session.work_date,
+                "start_time": session.start_time,
+                "end_time": session.end_time,
+                "duration_seconds": session.duration_seconds,
+                "start_record_id": session.start_record_id,
+                "end_record_id": session.end_record_id
+            })
+        if len(batch) >= REBUILD_BATCH_SIZE:
+            db.execute(insert(WorkSession), batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        db.execute(insert(WorkSession), batch)
+        written += len(batch)
+    return written
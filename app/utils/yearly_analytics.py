@@ -0,0 +1,112 @@
+from calendar import monthrange
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import extract
+from sqlalchemy.orm import Session
+
+from app.db.models import AttendanceDaily, User
+
+
+def summarize_company_months(
+    db: Session,
+    company_id: int,
+    year: int,
+    start_month: int = 1,
+    end_month: int = 12,
+    department_id: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    計算公司所有在職員工多個月份的出勤統計（年度考核用）
+    每日彙總以欄位陣列讀入後，用 NumPy 依 (員工, 月份) 分組加總，不逐月呼叫月報
+    工作與加班時數取自 work_sessions 的配對結果，與月報一致
+    """
+    staff_filters = [User.company_id == company_id, User.is_active == True]
+    if department_id is not None:
+        staff_filters.append(User.department_id == department_id)
+
+    staff = db.query(
+        User.id,
+        (User.first_name + ' ' + User.last_name).label('user_name'),
+        User.email
+    ).filter(*staff_filters).order_by(User.id).all()
+
+    rows = db.query(
+        AttendanceDaily.user_id,
+        extract('month', AttendanceDaily.work_date),
+        AttendanceDaily.worked_seconds,
+        AttendanceDaily.overtime_seconds,
+        AttendanceDaily.is_late,
+        AttendanceDaily.is_early_leave,
+        AttendanceDaily.first_check_in.isnot(None),
+        AttendanceDaily.last_check_out.isnot(None)
+    ).join(
+        User, User.id == AttendanceDaily.user_id
+    ).filter(
+        *staff_filters,
+        AttendanceDaily.work_date >= date(year, start_month, 1),
+        AttendanceDaily.work_date <= date(year, end_month, monthrange(year, end_month)[1])
+    ).all()
+
+    month_count = end_month - start_month + 1
+    staff_ids = np.fromiter((member.id for member in staff), dtype=np.int64, count=len(staff))
+    shape = (len(staff), month_count)
+
+    if rows:
+        user_ids, months, worked, overtime, late, early, checked_in, checked_out = (
+            np.asarray(column) for column in zip(*rows)
+        )
+        # staff_ids 已排序，searchsorted 即為員工索引；(員工, 月份) 攤平成單一分組鍵
+        user_index = np.searchsorted(staff_ids, user_ids.astype(np.int64))
+        keys = user_index * month_count + (months.astype(np.int64) - start_month)
+        checked_in = checked_in.astype(bool)
+
+        def group_sum(weights) -> np.ndarray:
+            return np.bincount(keys, weights=weights, minlength=shape[0] * shape[1]).reshape(shape)
+
+        worked_hours = group_sum(worked.astype(np.float64)) / 3600
+        overtime_hours = group_sum(overtime.astype(np.float64)) / 3600
+        late_counts = group_sum(late.astype(np.float64)).astype(np.int64)
+        early_counts = group_sum(early.astype(np.float64)).astype(np.int64)
+        check_in_days = group_sum(checked_in.astype(np.float64)).astype(np.int64)
+        attendance_days = group_sum((checked_in | checked_out.astype(bool)).astype(np.float64)).astype(np.int64)
+    else:
+        worked_hours = overtime_hours = np.zeros(shape)
+        late_counts = early_counts = check_in_days = attendance_days = np.zeros(shape, dtype=np.int64)
+
+    total_check_in_days = check_in_days.sum(axis=1)
+    total_late = late_counts.sum(axis=1)
+    late_rates = np.divide(
+        total_late, total_check_in_days,
+        out=np.zeros(len(staff)), where=total_check_in_days > 0
+    )
+
+    results = []
+    for index, member in enumerate(staff):
+        results.append({
+            "user_id": member.id,
+            "user_name": member.user_name,
+            "user_email": member.email,
+            "months": [
+                {
+                    "year": year,
+                    "month": start_month + offset,
+                    "attendance_days": int(attendance_days[index, offset]),
+                    "worked_hours": round(float(worked_hours[index, offset]), 2),
+                    "overtime_hours": round(float(overtime_hours[index, offset]), 2),
+                    "late_count": int(late_counts[index, offset]),
+                    "early_leave_count": int(early_counts[index, offset])
+                }
+                for offset in range(month_count)
+            ],
+            "totals": {
+                "attendance_days": int(attendance_days[index].sum()),
+                "worked_hours": round(float(worked_hours[index].sum()), 2),
+                "overtime_hours": round(float(overtime_hours[index].sum()), 2),
+                "late_count": int(total_late[index]),
+                "early_leave_count": int(early_counts[index].sum()),
+                "late_rate": round(float(late_rates[index]), 4)
+            }
+        })
+    return results
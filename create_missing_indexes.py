@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+數據庫遷移腳本 - 建立模型中宣告但資料庫尚未存在的索引
+支援 SQLite 與 PostgreSQL，可重複執行
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__))))
+
+from sqlalchemy import inspect
+
+from app.db.base import engine
+from app.db.models import Base
+
+
+def create_missing_indexes():
+    """逐一檢查各資料表的索引，只建立缺少的部分"""
+    print("開始建立索引...")
+    try:
+        with engine.begin() as conn:
+            inspector = inspect(conn)
+            existing_tables = set(inspector.get_table_names())
+            for table in Base.metadata.sorted_tables:
+                if table.name not in existing_tables:
+                    print(f"  [SKIP] {table.name} 資料表不存在，請先執行 app/db/init_db.py")
+                    continue
+                existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+                for index in table.indexes:
+                    if index.name in existing_indexes:
+                        continue
+                    index.create(bind=conn)
+                    print(f"  [OK] 建立 {index.name} 索引")
+        print("索引建立完成！")
+        return True
+    except Exception as e:
+        print(f"建立索引時發生錯誤: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    success = create_missing_indexes()
+    sys.exit(0 if success else 1)
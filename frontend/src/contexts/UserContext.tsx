@@ -52,6 +52,7 @@ export const UserProvider = ({ children }: { children: ReactNode }) => {
         console.error("UserContext: Failed to fetch user:", error);
         // This could be due to an expired token, so we could clear it.
         localStorage.removeItem('access_token');
+        localStorage.removeItem('refresh_token');
         setUser(null);
       }
     } else {
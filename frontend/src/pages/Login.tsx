@@ -36,6 +36,7 @@ const Login: React.FC = () => {
       );
       console.log('Login successful, response:', response.data);
       localStorage.setItem('access_token', response.data.access_token);
+      localStorage.setItem('refresh_token', response.data.refresh_token);
 
       // Refresh user data after successful login
       console.log('Login: Calling refreshUser to update UserContext');
@@ -47,26 +47,65 @@ api.interceptors.request.use(
   }
 );
 
+// 以 refresh token 換發新的 access token，多個同時失敗的請求共用同一次換發
+let refreshPromise: Promise<string | null> | null = null;
+
+const refreshAccessToken = (): Promise<string | null> => {
+  const refreshToken = localStorage.getItem('refresh_token');
+  if (!refreshToken) {
+    return Promise.resolve(null);
+  }
+  if (!refreshPromise) {
+    refreshPromise = axios
+      .post(`${API_BASE_URL}/login/refresh`, { refresh_token: refreshToken })
+      .then((response) => {
+        localStorage.setItem('access_token', response.data.access_token);
+        localStorage.setItem('refresh_token', response.data.refresh_token);
+        return response.data.access_token as string;
+      })
+      .catch(() => {
+        localStorage.removeItem('refresh_token');
+        return null;
+      })
+      .finally(() => {
+        refreshPromise = null;
+      });
+  }
+  return refreshPromise;
+};
+
 // Response interceptor to handle token expiration
 api.interceptors.response.use(
   (response) => {
     return response;
   },
-  (error) => {
+  async (error) => {
     // Handle 401 (Unauthorized) or 403 (Forbidden) errors
     if (error.response && (error.response.status === 401 || error.response.status === 403)) {
       // Check if the error is due to token expiration or invalid token
       const errorDetail = error.response.data?.detail;
 
-      // If it's a token-related error, clear the token and redirect to login
+      // If it's a token-related error, try the refresh token once before redirecting to login
       if (
         errorDetail?.includes('token') ||
         errorDetail?.includes('expired') ||
         errorDetail?.includes('invalid') ||
+        errorDetail === 'Could not validate credentials' ||
         errorDetail === 'Not authenticated' ||
         error.response.status === 401
       ) {
+        const originalRequest = error.config;
+        if (originalRequest && !originalRequest._retried) {
+          const newToken = await refreshAccessToken();
+          if (newToken) {
+            originalRequest._retried = true;
+            originalRequest.headers.Authorization = `Bearer ${newToken}`;
+            return api(originalRequest);
+          }
+        }
+
         localStorage.removeItem('access_token');
+        localStorage.removeItem('refresh_token');
         // Only redirect if we're not already on the login page
         if (window.location.pathname !== '/login') {
           window.location.href = '/login';
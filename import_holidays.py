@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+匯入國定假日與補班日（適用所有公司），首次執行時建立 company_holidays 資料表
+CSV 欄位: date,name,is_workday（is_workday 為 1 表示補班日，可省略）
+用法: python import_holidays.py holidays_2025.csv
+"""
+import argparse
+import csv
+import sys
+import os
+from datetime import date
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__))))
+
+from app.db.base import SessionLocal, engine
+from sqlalchemy import delete, or_, and_
+
+from app.db.models import CompanyHoliday, ReportSnapshot
+
+
+def read_holidays(path: str) -> dict:
+    holidays = {}
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            holiday_date = date.fromisoformat(row["date"].strip())
+            holidays[holiday_date] = (row["name"].strip(), (row.get("is_workday") or "").strip() in ("1", "true", "True"))
+    return holidays
+
+
+def main() -> bool:
+    parser = argparse.ArgumentParser(description="匯入國定假日與補班日")
+    parser.add_argument("csv_path", help="假日 CSV 檔案路徑")
+    args = parser.parse_args()
+
+    print("開始匯入國定假日...")
+    CompanyHoliday.__table__.create(bind=engine, checkfirst=True)
+    ReportSnapshot.__table__.create(bind=engine, checkfirst=True)
+
+    try:
+        holidays = read_holidays(args.csv_path)
+    except (OSError, KeyError, ValueError) as e:
+        print(f"讀取 CSV 失敗: {e}")
+        return False
+    if not holidays:
+        print("  [SKIP] CSV 沒有任何假日")
+        return True
+
+    db = SessionLocal()
+    try:
+        # 同一日期以新匯入的內容為準
+        db.execute(delete(CompanyHoliday).where(
+            CompanyHoliday.company_id.is_(None),
+            CompanyHoliday.holiday_date.in_(list(holidays))
+        ))
+        db.add_all(
+            CompanyHoliday(company_id=None, holiday_date=holiday_date, name=name, is_workday=is_workday)
+            for holiday_date, (name, is_workday) in holidays.items()
+        )
+        print(f"  [OK] 已匯入 {len(holidays)} 筆國定假日")
+
+        # 工作日變動影響缺勤統計，清除所有公司受影響月份的報表快照；各 worker 的工作日表於 TTL 後過期
+        months = {(holiday_date.year, holiday_date.month) for holiday_date in holidays}
+        removed = db.execute(delete(ReportSnapshot).where(or_(*(
+            and_(ReportSnapshot.year == year, ReportSnapshot.month == month) for year, month in months
+        )))).rowcount
+        db.commit()
+        print(f"  [OK] 已清除 {removed} 筆報表快照")
+        return True
+    except Exception as e:
+        db.rollback()
+        print(f"匯入過程中發生錯誤: {e}")
+        return False
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+重建 work_sessions 工作時段與 attendance_daily 每日出勤彙總表
+首次部署或手動修正打卡記錄後執行，可依公司與日期範圍限定
+用法: python rebuild_attendance_daily.py [--company-id 1] [--start 2025-01-01] [--end 2025-12-31]
+"""
+import argparse
+import sys
+import os
+from datetime import date
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__))))
+
+from app.db.base import SessionLocal, engine
+from sqlalchemy import delete
+
+from app.db.models import AttendanceDaily, ReportSnapshot, WorkSession
+from app.utils.attendance_daily import rebuild_attendance_daily
+from app.utils.work_sessions import rebuild_work_sessions
+
+
+def main() -> bool:
+    parser = argparse.ArgumentParser(description="重建 work_sessions 與 attendance_daily 彙總表")
+    parser.add_argument("--company-id", type=int, default=None, help="只重建指定公司")
+    parser.add_argument("--start", type=date.fromisoformat, default=None, help="起始工作日期 (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, default=None, help="結束工作日期 (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    print("開始重建每日出勤彙總...")
+    WorkSession.__table__.create(bind=engine, checkfirst=True)
+    AttendanceDaily.__table__.create(bind=engine, checkfirst=True)
+    ReportSnapshot.__table__.create(bind=engine, checkfirst=True)
+
+    db = SessionLocal()
+    try:
+        # 每日時數取自時段表，需先重建時段
+        sessions = rebuild_work_sessions(db, args.company_id, args.start, args.end)
+        print(f"  [OK] 已寫入 {sessions} 筆工作時段")
+        written = rebuild_attendance_daily(db, args.company_id, args.start, args.end)
+        print(f"  [OK] 已寫入 {written} 筆每日彙總")
+
+        # 已結束月份的報表快照依重建後的資料重新計算；各 worker 的行程內快取於 TTL 後過期
+        month_index = ReportSnapshot.year * 12 + ReportSnapshot.month
+        snapshot_filters = []
+        if args.company_id is not None:
+            snapshot_filters.append(ReportSnapshot.company_id == args.company_id)
+        if args.start is not None:
+            snapshot_filters.append(month_index >= args.start.year * 12 + args.start.month)
+        if args.end is not None:
+            snapshot_filters.append(month_index <= args.end.year * 12 + args.end.month)
+        removed = db.execute(delete(ReportSnapshot).where(*snapshot_filters)).rowcount
+        db.commit()
+        print(f"  [OK] 已清除 {removed} 筆報表快照")
+        return True
+    except Exception as e:
+        db.rollback()
+        print(f"重建過程中發生錯誤: {e}")
+        return False
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+重建 leave_status_counters 請假狀態計數表並由既有請假重新計算
+首次部署、計數表主鍵變更（改為 company_id, user_id, status）或手動修改 leave_applications 後執行
+計數可完全由請假資料算出，因此直接刪除重建資料表
+用法: python rebuild_leave_counters.py
+"""
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__))))
+
+from app.db.base import SessionLocal, engine
+
+from app.db.models import LeaveStatusCounter
+from app.utils.leave_counters import rebuild_leave_status_counters
+
+
+def main() -> bool:
+    print("開始重建請假狀態計數...")
+    LeaveStatusCounter.__table__.drop(bind=engine, checkfirst=True)
+    LeaveStatusCounter.__table__.create(bind=engine)
+
+    db = SessionLocal()
+    try:
+        written = rebuild_leave_status_counters(db)
+        db.commit()
+        print(f"  [OK] 已寫入 {written} 筆計數")
+        return True
+    except Exception as e:
+        db.rollback()
+        print(f"重建過程中發生錯誤: {e}")
+        return False
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,351 @@
+from datetime import date, datetime, time
+
+from sqlalchemy.orm import Session
+
+from app.api.routers.attendance import insert_punch
+from app.db import models
+from tests.conftest import TestingSessionLocal
+
+
+def create_employee(db: Session) -> models.User:
+    company = models.Company(
+        name="Punch Corp",
+        tax_id="87654321",
+        work_start_time=time(9, 0),
+        work_end_time=time(18, 0)
+    )
+    db.add(company)
+    db.commit()
+    user = models.User(
+        company_id=company.id,
+        username="puncher",
+        email="puncher@test.com",
+        hashed_password="x",
+        first_name="Punch",
+        last_name="Er",
+        is_active=True
+    )
+    db.add(user)
+    db.commit()
+    return user
+
+
+def punch_values(user: models.User, record_type: models.AttendanceType, record_time: datetime) -> dict:
+    return {
+        "user_id": user.id,
+        "company_id": user.company_id,
+        "record_time": record_time,
+        "work_date": record_time.date(),
+        "record_type": record_type,
+        "latitude": 25.0,
+        "longitude": 121.5,
+        "status": models.AttendanceStatus.normal
+    }
+
+
+def test_insert_punch_rejects_same_day_duplicate() -> None:
+    db: Session = TestingSessionLocal()
+    user = create_employee(db)
+
+    first = insert_punch(db, punch_values(user, models.AttendanceType.check_in, datetime(2025, 3, 3, 9, 0)))
+    db.commit()
+    assert first is not None
+
+    duplicate = insert_punch(db, punch_values(user, models.AttendanceType.check_in, datetime(2025, 3, 3, 9, 5)))
+    assert duplicate is None
+    db.rollback()
+
+    next_day = insert_punch(db, punch_values(user, models.AttendanceType.check_in, datetime(2025, 3, 4, 9, 0)))
+    db.commit()
+    assert next_day is not None
+    assert db.query(models.AttendanceRecord).count() == 2
+    db.close()
+
+
+def test_company_policy_cache_and_invalidation() -> None:
+    from app.core.company_policy import get_company_policy, invalidate_company_policy
+    from app.api.routers.attendance import determine_attendance_status
+
+    db: Session = TestingSessionLocal()
+    user = create_employee(db)
+    company = db.query(models.Company).filter(models.Company.id == user.company_id).one()
+    company_id = company.id
+    invalidate_company_policy(company_id)
+
+    policy = get_company_policy(db, company_id)
+    assert policy.distance_limit == 100.0
+    assert get_company_policy(db, company_id) is policy
+    assert determine_attendance_status(
+        policy, models.AttendanceType.check_in, datetime(2025, 3, 3, 9, 30)
+    ) == models.AttendanceStatus.late
+
+    company.late_tolerance_minutes = 60
+    db.commit()
+    assert get_company_policy(db, company_id).late_tolerance_minutes == 5
+    invalidate_company_policy(company_id)
+    assert get_company_policy(db, company_id).late_tolerance_minutes == 60
+    db.close()
+
+
+def test_keyset_pagination_walks_all_records_once() -> None:
+    from app.utils.pagination import keyset_page
+
+    db: Session = TestingSessionLocal()
+    user = create_employee(db)
+    for day in range(1, 8):
+        # 同一時間的記錄以 id 決定順序
+        for record_type in (models.AttendanceType.check_in, models.AttendanceType.overtime_start):
+            insert_punch(db, punch_values(user, record_type, datetime(2025, 3, day, 9, 0)))
+    db.commit()
+
+    seen = []
+    cursor = ""
+    while cursor is not None:
+        page, cursor = keyset_page(
+            db.query(models.AttendanceRecord),
+            models.AttendanceRecord.record_time,
+            models.AttendanceRecord.id,
+            cursor,
+            limit=3
+        )
+        seen.extend(record.id for record in page)
+
+    assert len(seen) == 14
+    assert len(set(seen)) == 14
+    times = [db.get(models.AttendanceRecord, record_id).record_time for record_id in seen]
+    assert times == sorted(times, reverse=True)
+    db.close()
+
+
+def test_keyset_pagination_includes_null_sort_values() -> None:
+    from app.utils.pagination import keyset_page
+
+    db: Session = TestingSessionLocal()
+    legacy = create_employee(db)
+    for day in range(1, 4):
+        db.add(models.User(
+            company_id=legacy.company_id,
+            username=f"user{day}",
+            email=f"user{day}@test.com",
+            hashed_password="x",
+            first_name="Page",
+            last_name=str(day),
+            is_active=True,
+            created_at=datetime(2025, 3, day, 9, 0)
+        ))
+    db.commit()
+    # 早期資料沒有 created_at
+    db.query(models.User).filter(models.User.id == legacy.id).update({"created_at": None})
+    db.commit()
+
+    for descending in (False, True):
+        seen = []
+        cursor = ""
+        while cursor is not None:
+            page, cursor = keyset_page(
+                db.query(models.User),
+                models.User.created_at,
+                models.User.id,
+                cursor,
+                limit=1,
+                descending=descending
+            )
+            seen.extend(user.id for user in page)
+
+        assert len(seen) == 4
+        assert len(set(seen)) == 4
+        assert seen[-1 if descending else 0] == legacy.id
+    db.close()
+
+
+def test_keyset_pagination_reads_rows_in_index_order() -> None:
+    from sqlalchemy import event
+
+    from app.utils.pagination import keyset_page
+    from tests.conftest import engine
+
+    db: Session = TestingSessionLocal()
+    user = create_employee(db)
+    plans = []
+
+    def explain(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().startswith("SELECT"):
+            plans.extend(row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", explain)
+    try:
+        for model in (models.AttendanceRecord, models.LeaveApplication):
+            sort_column = model.record_time if model is models.AttendanceRecord else model.created_at
+            keyset_page(db.query(model).filter(model.company_id == user.company_id), sort_column, model.id, "", limit=10)
+    finally:
+        event.remove(engine, "before_cursor_execute", explain)
+
+    assert plans
+    assert not [plan for plan in plans if "TEMP B-TREE" in plan]
+    db.close()
+
+
+def test_compact_response_sideloads_users_and_companies() -> None:
+    from app.schemas.attendance import AttendanceRecordCompact
+    from app.utils.sideload import build_compact_response, parse_fields
+
+    db: Session = TestingSessionLocal()
+    user = create_employee(db)
+    for day in range(1, 4):
+        insert_punch(db, punch_values(user, models.AttendanceType.check_in, datetime(2025, 3, day, 9, 0)))
+    db.commit()
+
+    records = db.query(models.AttendanceRecord).all()
+    response = build_compact_response(
+        db, records, AttendanceRecordCompact,
+        fields=parse_fields("record_time,record_type"),
+        company_fields=parse_fields("name")
+    )
+
+    assert len(response["items"]) == 3
+    # 未指定外鍵時仍保留，才能對應 included
+    assert set(response["items"][0]) == {"id", "record_time", "record_type", "user_id", "company_id"}
+    assert response["items"][0]["user_id"] == user.id
+    assert list(response["included"]["users"]) == [str(user.id)]
+    assert response["included"]["companies"][str(user.company_id)] == {"id": user.company_id, "name": "Punch Corp"}
+    db.close()
+
+
+def test_export_streams_filtered_records() -> None:
+    import asyncio
+    import json
+
+    from app.api.routers.attendance import export_attendance_records
+    from app.core.principals import AuthenticatedPrincipal
+
+    db: Session = TestingSessionLocal()
+    user = create_employee(db)
+    for day in range(1, 6):
+        insert_punch(db, punch_values(user, models.AttendanceType.check_in, datetime(2025, 3, day, 9, 0)))
+    db.commit()
+    principal = AuthenticatedPrincipal(
+        id=user.id, role=models.UserRole.employee, company_id=user.company_id,
+        department_id=None, is_active=True, token_version=0
+    )
+
+    async def read_body(response) -> str:
+        return "".join([chunk async for chunk in response.body_iterator])
+
+    response = export_attendance_records(
+        db=db, current_user=principal, start_date=date(2025, 3, 2), end_date=date(2025, 3, 4), export_format="csv"
+    )
+    lines = asyncio.run(read_body(response)).lstrip("\ufeff").splitlines()
+    assert lines[0].startswith("id,user_id,user_name,user_email")
+    assert len(lines) == 4
+    assert "Punch Er" in lines[1] and "check_in" in lines[1]
+
+    response = export_attendance_records(db=db, current_user=principal, export_format="ndjson")
+    rows = [json.loads(line) for line in asyncio.run(read_body(response)).splitlines()]
+    assert [row["work_date"] for row in rows] == [f"2025-03-0{day}" for day in range(1, 6)]
+    db.close()
+
+
+def test_punches_maintain_daily_rollup() -> None:
+    db: Session = TestingSessionLocal()
+    user = create_employee(db)
+
+    late = punch_values(user, models.AttendanceType.check_in, datetime(2025, 3, 3, 9, 20))
+    late["status"] = models.AttendanceStatus.late
+    insert_punch(db, late)
+    db.commit()
+    daily = db.get(models.AttendanceDaily, (user.id, date(2025, 3, 3)))
+    assert daily.is_late and daily.last_check_out is None and daily.worked_seconds == 0
+
+    insert_punch(db, punch_values(user, models.AttendanceType.check_out, datetime(2025, 3, 3, 18, 20)))
+    insert_punch(db, punch_values(user, models.AttendanceType.overtime_start, datetime(2025, 3, 3, 19, 0)))
+    insert_punch(db, punch_values(user, models.AttendanceType.overtime_end, datetime(2025, 3, 3, 20, 30)))
+    db.commit()
+    db.expire_all()
+    daily = db.get(models.AttendanceDaily, (user.id, date(2025, 3, 3)))
+    assert daily.worked_seconds == 9 * 3600
+    assert daily.overtime_seconds == 90 * 60
+    assert not daily.is_early_leave
+    db.close()
+
+
+def test_pair_punches_handles_midnight_open_and_orphan_sessions() -> None:
+    from types import SimpleNamespace
+    from app.utils.work_sessions import pair_punches
+
+    def punch(record_id, record_type, record_time):
+        return SimpleNamespace(
+            id=record_id, record_type=record_type, record_time=record_time, work_date=record_time.date()
+        )
+
+    sessions = pair_punches([
+        punch(1, models.AttendanceType.check_out, datetime(2025, 3, 3, 6, 0)),  # 沒有上班打卡，忽略
+        punch(2, models.AttendanceType.check_in, datetime(2025, 3, 3, 22, 0)),
+        punch(3, models.AttendanceType.overtime_start, datetime(2025, 3, 3, 23, 0)),
+        punch(4, models.AttendanceType.check_out, datetime(2025, 3, 4, 6, 30, 15)),
+        punch(5, models.AttendanceType.check_in, datetime(2025, 3, 4, 22, 0)),
+    ])
+
+    assert [(s.start_record_id, s.end_record_id) for s in sessions] == [(2, 4), (3, None), (5, None)]
+    assert sessions[0].work_date == date(2025, 3, 3)
+    assert sessions[0].duration_seconds == 8 * 3600 + 30 * 60 + 15
+    assert sessions[1].session_type == models.WorkSessionType.overtime
+    assert sessions[1].duration_seconds is None
+
+
+def test_cross_midnight_checkout_counts_toward_start_day() -> None:
+    db: Session = TestingSessionLocal()
+    user = create_employee(db)
+
+    insert_punch(db, punch_values(user, models.AttendanceType.check_in, datetime(2025, 3, 3, 22, 0)))
+    db.commit()
+    insert_punch(db, punch_values(user, models.AttendanceType.check_out, datetime(2025, 3, 4, 6, 0)))
+    db.commit()
+
+    session = db.query(models.WorkSession).one()
+    assert session.work_date == date(2025, 3, 3)
+    assert session.duration_seconds == 8 * 3600
+    assert db.get(models.AttendanceDaily, (user.id, date(2025, 3, 3))).worked_seconds == 8 * 3600
+    assert db.get(models.AttendanceDaily, (user.id, date(2025, 3, 4))).worked_seconds == 0
+    db.close()
+
+
+def test_overtime_end_closes_night_shift_across_midnight(monkeypatch) -> None:
+    from zoneinfo import ZoneInfo
+
+    import pytest
+    from fastapi import HTTPException
+
+    from app.api.routers import attendance
+    from app.core.principals import AuthenticatedPrincipal
+    from app.schemas.attendance import AttendanceRequest
+
+    db: Session = TestingSessionLocal()
+    user = create_employee(db)
+    principal = AuthenticatedPrincipal(
+        id=user.id, role=user.role, company_id=user.company_id, department_id=None, is_active=True, token_version=0
+    )
+    location = AttendanceRequest(latitude=25.0, longitude=121.5)
+    zone = ZoneInfo("Asia/Taipei")
+
+    def punch_at(handler, when: datetime) -> dict:
+        monkeypatch.setattr(attendance, "local_now", lambda tz_name: when.replace(tzinfo=zone))
+        return handler(db=db, attendance_request=location, current_user=principal)
+
+    # 23:00 開始加班，隔天 01:00 結束；當天晚上再加一次班不與前一晚的結束打卡衝突
+    punch_at(attendance.overtime_start, datetime(2025, 3, 3, 23, 0))
+    punch_at(attendance.overtime_end, datetime(2025, 3, 4, 1, 0))
+    punch_at(attendance.overtime_start, datetime(2025, 3, 4, 19, 0))
+    punch_at(attendance.overtime_end, datetime(2025, 3, 4, 20, 30))
+    with pytest.raises(HTTPException) as exc_info:
+        punch_at(attendance.overtime_end, datetime(2025, 3, 4, 21, 0))
+    assert exc_info.value.status_code == 400
+
+    sessions = db.query(models.WorkSession).order_by(models.WorkSession.start_time).all()
+    assert [(s.work_date, s.duration_seconds) for s in sessions] == [
+        (date(2025, 3, 3), 2 * 3600),
+        (date(2025, 3, 4), 90 * 60),
+    ]
+    db.expire_all()
+    assert db.get(models.AttendanceDaily, (user.id, date(2025, 3, 3))).overtime_seconds == 2 * 3600
+    assert db.get(models.AttendanceDaily, (user.id, date(2025, 3, 4))).overtime_seconds == 90 * 60
+    db.close()
@@ -31,3 +31,19 @@ def test_read_company(client: TestClient) -> None:
     data = response.json()
     assert data["name"] == "Another Test Co"
     db.close()
+
+
+def test_company_timezone_must_be_valid() -> None:
+    import pytest
+    from pydantic import ValidationError
+    from app.schemas.company import CompanyCreate, CompanyUpdate
+
+    assert CompanyUpdate(timezone="Asia/Tokyo").timezone == "Asia/Tokyo"
+    # 未傳入時不變更
+    assert "timezone" not in CompanyUpdate(name="Renamed").model_dump(exclude_unset=True)
+    with pytest.raises(ValidationError):
+        CompanyUpdate(timezone=None)
+    with pytest.raises(ValidationError):
+        CompanyUpdate(timezone="Mars/Olympus")
+    with pytest.raises(ValidationError):
+        CompanyCreate(name="Test Company", tax_id="12345678", timezone="Taipei")
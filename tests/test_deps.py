@@ -0,0 +1,67 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.api import deps
+from app.core.principals import bump_token_version, principal_cache, principal_claims
+from app.core.security import create_access_token
+from app.db import models
+from tests.conftest import TestingSessionLocal, engine
+
+
+def create_admin(db: Session) -> models.User:
+    user = models.User(
+        username="principal@test.com",
+        email="principal@test.com",
+        hashed_password="x",
+        first_name="Prin",
+        last_name="Cipal",
+        role=models.UserRole.company_admin,
+        is_active=True
+    )
+    db.add(user)
+    db.commit()
+    return user
+
+
+def test_principal_is_cached_and_revoked_on_version_bump() -> None:
+    principal_cache.clear()
+    db: Session = TestingSessionLocal()
+    user = create_admin(db)
+    token = create_access_token(subject=user.id, claims=principal_claims(user))
+
+    principal = deps.get_current_principal(db=db, token=token)
+    assert principal.role == models.UserRole.company_admin
+
+    statements = []
+
+    def count_statement(*args):
+        statements.append(args[2])
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        assert deps.get_current_principal(db=db, token=token) is principal
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+    assert statements == []
+
+    version = bump_token_version(user)
+    db.commit()
+    principal_cache.revoke(user.id, version)
+    with pytest.raises(HTTPException) as exc_info:
+        deps.get_current_principal(db=db, token=token)
+    assert exc_info.value.status_code == 403
+
+    new_token = create_access_token(subject=user.id, claims=principal_claims(user))
+    assert deps.get_current_principal(db=db, token=new_token).token_version == version
+    db.close()
+
+
+def test_token_without_claims_is_rejected() -> None:
+    principal_cache.clear()
+    db: Session = TestingSessionLocal()
+    user = create_admin(db)
+    with pytest.raises(HTTPException):
+        deps.get_current_principal(db=db, token=create_access_token(subject=user.id))
+    db.close()
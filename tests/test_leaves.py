@@ -0,0 +1,373 @@
+from datetime import datetime, time
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.api import deps
+from app.api.routers import leaves
+from app.core.principals import AuthenticatedPrincipal
+from app.db import models
+from app.main import app
+from app.schemas.leave import LeaveApplicationCreate, LeaveApplicationReview
+from app.utils.leave_counters import count_leaves_by_status, read_leave_status_counts, rebuild_leave_status_counters
+from tests.conftest import TestingSessionLocal
+
+
+def create_employee(db: Session) -> models.User:
+    company = models.Company(
+        name="Leave Corp",
+        tax_id="12345678",
+        work_start_time=time(9, 0),
+        work_end_time=time(18, 0)
+    )
+    db.add(company)
+    db.commit()
+    user = models.User(
+        company_id=company.id,
+        username="leave_user",
+        email="leave_user@test.com",
+        hashed_password="x",
+        first_name="Leave",
+        last_name="User",
+        is_active=True
+    )
+    db.add(user)
+    db.commit()
+    return user
+
+
+def add_leave(
+    db: Session,
+    user: models.User,
+    start: datetime,
+    end: datetime,
+    status: models.LeaveStatus = models.LeaveStatus.pending
+) -> models.LeaveApplication:
+    leave = models.LeaveApplication(
+        user_id=user.id,
+        company_id=user.company_id,
+        leave_type=models.LeaveType.annual_leave,
+        start_date=start,
+        end_date=end,
+        reason="test",
+        status=status
+    )
+    db.add(leave)
+    db.commit()
+    return leave
+
+
+def test_overlapping_leave_rejected_by_constraint() -> None:
+    db: Session = TestingSessionLocal()
+    user = create_employee(db)
+    add_leave(db, user, datetime(2025, 3, 3, 9, 0), datetime(2025, 3, 5, 18, 0), models.LeaveStatus.approved)
+
+    with pytest.raises(IntegrityError) as error:
+        add_leave(db, user, datetime(2025, 3, 5, 9, 0), datetime(2025, 3, 6, 18, 0))
+    assert models.LEAVE_OVERLAP_CONSTRAINT in str(error.value.orig)
+    db.rollback()
+
+    # 不重疊、或與已取消/駁回的請假重疊皆可寫入
+    add_leave(db, user, datetime(2025, 3, 6, 9, 0), datetime(2025, 3, 6, 18, 0))
+    add_leave(db, user, datetime(2025, 3, 10, 9, 0), datetime(2025, 3, 10, 18, 0), models.LeaveStatus.cancelled)
+    add_leave(db, user, datetime(2025, 3, 10, 9, 0), datetime(2025, 3, 10, 12, 0))
+    db.close()
+
+
+def test_leave_update_into_overlap_rejected() -> None:
+    db: Session = TestingSessionLocal()
+    user = create_employee(db)
+    add_leave(db, user, datetime(2025, 3, 3, 9, 0), datetime(2025, 3, 3, 18, 0))
+    cancelled = add_leave(
+        db, user, datetime(2025, 3, 3, 13, 0), datetime(2025, 3, 3, 18, 0), models.LeaveStatus.cancelled
+    )
+    later = add_leave(db, user, datetime(2025, 3, 4, 9, 0), datetime(2025, 3, 4, 18, 0))
+
+    # 只修改自己的時間不算與自己重疊
+    later.end_date = datetime(2025, 3, 4, 12, 0)
+    db.commit()
+
+    later.start_date = datetime(2025, 3, 3, 17, 0)
+    with pytest.raises(IntegrityError):
+        db.commit()
+    db.rollback()
+
+    cancelled.status = models.LeaveStatus.pending
+    with pytest.raises(IntegrityError):
+        db.commit()
+    db.rollback()
+    db.close()
+
+
+def principal_for(user: models.User) -> AuthenticatedPrincipal:
+    return AuthenticatedPrincipal(
+        id=user.id,
+        role=user.role,
+        company_id=user.company_id,
+        department_id=user.department_id,
+        is_active=True,
+        token_version=0
+    )
+
+
+def test_leave_status_counters_follow_transitions() -> None:
+    db: Session = TestingSessionLocal()
+    user = create_employee(db)
+    admin = models.User(
+        company_id=user.company_id,
+        username="leave_admin",
+        email="leave_admin@test.com",
+        hashed_password="x",
+        first_name="Leave",
+        last_name="Admin",
+        role=models.UserRole.company_admin,
+        is_active=True
+    )
+    db.add(admin)
+    db.commit()
+    employee, reviewer = principal_for(user), principal_for(admin)
+
+    def apply(day: int) -> int:
+        return leaves.create_leave_application(db=db, current_user=employee, leave_in=LeaveApplicationCreate(
+            leave_type=models.LeaveType.annual_leave,
+            start_date=datetime(2025, 3, day, 9, 0),
+            end_date=datetime(2025, 3, day, 18, 0),
+            reason="test"
+        )).id
+
+    first, second, third = apply(3), apply(4), apply(5)
+    apply(6)
+    leaves.review_leave_application(db=db, current_user=reviewer, leave_id=first,
+                                    review_in=LeaveApplicationReview(status=models.LeaveStatus.approved))
+    leaves.review_leave_application(db=db, current_user=reviewer, leave_id=second,
+                                    review_in=LeaveApplicationReview(status=models.LeaveStatus.rejected))
+    leaves.cancel_leave_application(db=db, current_user=employee, leave_id=first)
+    leaves.cancel_leave_application(db=db, current_user=employee, leave_id=third)
+
+    expected = {
+        models.LeaveStatus.pending: 1,
+        models.LeaveStatus.rejected: 1,
+        models.LeaveStatus.cancelled: 2,
+    }
+    counts = {status: count for status, count in read_leave_status_counts(db, user_id=user.id).items() if count}
+    assert counts == expected
+    assert count_leaves_by_status(db.query(models.LeaveApplication)) == expected
+
+    # 重建結果與交易內維護的計數一致
+    rebuild_leave_status_counters(db)
+    db.commit()
+    assert read_leave_status_counts(db, company_id=user.company_id) == expected
+
+    statistics = leaves.get_leave_statistics(
+        db=db, current_user=reviewer, company_id=None, user_id=None, leave_type=None, start_date=None, end_date=None
+    )
+    assert (statistics.total_applications, statistics.pending_applications, statistics.cancelled_applications) == (4, 1, 2)
+    by_period = leaves.get_leave_statistics(
+        db=db, current_user=employee, company_id=None, user_id=None, leave_type=None,
+        start_date=datetime(2025, 3, 5), end_date=datetime(2025, 3, 31)
+    )
+    assert (by_period.total_applications, by_period.pending_applications) == (2, 1)
+    db.close()
+
+
+def test_leave_status_counters_keyed_by_company() -> None:
+    from app.utils.leave_counters import apply_leave_status_changes
+
+    db: Session = TestingSessionLocal()
+    user = create_employee(db)
+    new_company = models.Company(
+        name="New Corp", tax_id="87654321", work_start_time=time(9, 0), work_end_time=time(18, 0)
+    )
+    db.add(new_company)
+    db.commit()
+    old_company_id = user.company_id
+
+    add_leave(db, user, datetime(2025, 3, 3, 9, 0), datetime(2025, 3, 3, 18, 0))
+    apply_leave_status_changes(db, [(old_company_id, user.id, None, models.LeaveStatus.pending)])
+    db.commit()
+
+    # 員工轉調公司後，舊公司的件數不隨之移動
+    user.company_id = new_company.id
+    db.commit()
+    add_leave(db, user, datetime(2025, 4, 1, 9, 0), datetime(2025, 4, 1, 18, 0))
+    apply_leave_status_changes(db, [(new_company.id, user.id, None, models.LeaveStatus.pending)])
+    db.commit()
+
+    assert read_leave_status_counts(db, company_id=old_company_id) == {models.LeaveStatus.pending: 1}
+    assert read_leave_status_counts(db, company_id=new_company.id) == {models.LeaveStatus.pending: 1}
+    assert read_leave_status_counts(db, user_id=user.id) == {models.LeaveStatus.pending: 2}
+
+    rebuild_leave_status_counters(db)
+    db.commit()
+    assert read_leave_status_counts(db, company_id=old_company_id) == {models.LeaveStatus.pending: 1}
+    assert read_leave_status_counts(db, company_id=new_company.id) == {models.LeaveStatus.pending: 1}
+    db.close()
+
+
+def test_statistics_route_not_shadowed_by_leave_id(client) -> None:
+    db: Session = TestingSessionLocal()
+    user = create_employee(db)
+    app.dependency_overrides[deps.get_current_principal] = lambda: principal_for(user)
+    try:
+        response = client.get("/api/v1/leaves/statistics")
+    finally:
+        app.dependency_overrides.pop(deps.get_current_principal, None)
+    assert response.status_code == 200
+    assert response.json()["total_applications"] == 0
+    db.close()
+
+
+def test_leave_ledger_tracks_usage_and_accrual() -> None:
+    from decimal import Decimal
+
+    from app.utils.leave_ledger import adjust_leave_balance, get_leave_balances, run_yearly_accrual
+
+    db: Session = TestingSessionLocal()
+    user = create_employee(db)
+    admin = models.User(
+        company_id=user.company_id,
+        username="ledger_admin",
+        email="ledger_admin@test.com",
+        hashed_password="x",
+        first_name="Ledger",
+        last_name="Admin",
+        role=models.UserRole.company_admin,
+        is_active=True
+    )
+    db.add(admin)
+    db.commit()
+    employee, reviewer = principal_for(user), principal_for(admin)
+
+    assert run_yearly_accrual(db, user.company_id, 2025, models.LeaveType.annual_leave, Decimal("7")) == 2
+    db.commit()
+    # 重複執行不會重複給假
+    assert run_yearly_accrual(db, user.company_id, 2025, models.LeaveType.annual_leave, Decimal("7")) == 0
+    db.commit()
+
+    def approve(start: datetime, end: datetime) -> int:
+        leave_id = leaves.create_leave_application(db=db, current_user=employee, leave_in=LeaveApplicationCreate(
+            leave_type=models.LeaveType.annual_leave, start_date=start, end_date=end, reason="test"
+        )).id
+        leaves.review_leave_application(db=db, current_user=reviewer, leave_id=leave_id,
+                                        review_in=LeaveApplicationReview(status=models.LeaveStatus.approved))
+        return leave_id
+
+    # 3/7(五) 至 3/10(一)：兩個工作日；跨年假 2025/12/31 至 2026/1/2：各年度分開扣
+    approve(datetime(2025, 3, 7, 9, 0), datetime(2025, 3, 10, 18, 0))
+    half_day = approve(datetime(2025, 3, 12, 13, 30), datetime(2025, 3, 12, 18, 0))
+    approve(datetime(2025, 12, 31, 9, 0), datetime(2026, 1, 2, 18, 0))
+
+    balance = get_leave_balances(db, user.id, 2025)[0]
+    assert (balance.entitled_days, balance.used_days) == (Decimal("7"), Decimal("3.5"))
+    assert get_leave_balances(db, user.id, 2026)[0].used_days == Decimal("2")
+
+    leaves.cancel_leave_application(db=db, current_user=employee, leave_id=half_day)
+    adjust_leave_balance(db, user, models.LeaveType.annual_leave, 2025, Decimal("1"), note="補休轉入")
+    db.commit()
+
+    balance = get_leave_balances(db, user.id, 2025)[0]
+    assert (balance.entitled_days, balance.used_days, balance.remaining_days) == (Decimal("8"), Decimal("3"), Decimal("5"))
+
+    # 額度列等於帳目加總
+    ledger_total = sum(
+        entry.days for entry in db.query(models.LeaveLedgerEntry).filter(
+            models.LeaveLedgerEntry.user_id == user.id,
+            models.LeaveLedgerEntry.year == 2025,
+            models.LeaveLedgerEntry.entry_type.in_([models.LeaveLedgerEntryType.usage, models.LeaveLedgerEntryType.reversal])
+        )
+    )
+    assert ledger_total == balance.used_days
+    db.close()
+
+
+def test_count_leave_days_matches_daily_sweep() -> None:
+    from datetime import date
+
+    from app.core.work_calendar import WorkCalendar
+    from app.utils.leave_intervals import LeaveInterval, count_leave_days, sweep_leave_days
+
+    work_calendar = WorkCalendar(2025, {date(2025, 4, 4): False})
+    first_day, last_day = date(2025, 1, 1), date(2025, 12, 31)
+    for start, end in [
+        (datetime(2025, 3, 3, 13, 30), datetime(2025, 4, 15, 13, 30)),  # 頭尾各半天，中間跨假日
+        (datetime(2025, 3, 7, 9, 0), datetime(2025, 3, 10, 18, 0)),
+        (datetime(2025, 3, 12, 13, 30), datetime(2025, 3, 12, 18, 0)),
+        (datetime(2025, 3, 12, 20, 0), datetime(2025, 3, 13, 8, 0)),  # 下班時段，不扣假
+    ]:
+        interval = LeaveInterval(start, end, models.LeaveType.annual_leave)
+        expected = sum(
+            day_leave.day_fraction
+            for day_leave in sweep_leave_days([interval], first_day, last_day, work_calendar, None, None).values()
+        )
+        assert count_leave_days(interval, first_day, last_day, work_calendar, None, None) == pytest.approx(expected)
+
+    interval = LeaveInterval(datetime(2025, 3, 3, 13, 30), datetime(2025, 4, 15, 13, 30), models.LeaveType.annual_leave)
+    assert count_leave_days(interval, first_day, last_day, work_calendar, None, None) == pytest.approx(30)
+
+
+def test_bulk_review_applies_valid_items_in_one_transaction() -> None:
+    from sqlalchemy import event
+
+    from app.schemas.leave import LeaveBulkReview
+    from tests.conftest import engine
+
+    db: Session = TestingSessionLocal()
+    user = create_employee(db)
+    department = models.Department(company_id=user.company_id, name="Sales")
+    other_department = models.Department(company_id=user.company_id, name="Ops")
+    db.add_all([department, other_department])
+    db.commit()
+    user.department_id = department.id
+    outsider = models.User(
+        company_id=user.company_id, username="outsider", email="outsider@test.com", hashed_password="x",
+        first_name="Out", last_name="Sider", department_id=other_department.id, is_active=True
+    )
+    head = models.User(
+        company_id=user.company_id, username="head", email="head@test.com", hashed_password="x",
+        first_name="Dept", last_name="Head", department_id=department.id,
+        role=models.UserRole.department_head, is_active=True
+    )
+    db.add_all([outsider, head])
+    db.commit()
+
+    approve_me = add_leave(db, user, datetime(2025, 3, 3, 9, 0), datetime(2025, 3, 4, 18, 0)).id
+    reject_me = add_leave(db, user, datetime(2025, 3, 5, 9, 0), datetime(2025, 3, 5, 18, 0)).id
+    already = add_leave(db, user, datetime(2025, 3, 6, 9, 0), datetime(2025, 3, 6, 18, 0), models.LeaveStatus.approved).id
+    other_team = add_leave(db, outsider, datetime(2025, 3, 3, 9, 0), datetime(2025, 3, 3, 18, 0)).id
+
+    statements = []
+
+    def count_statement(*args):
+        statements.append(args[2])
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        results = leaves.bulk_review_leave_applications(db=db, current_user=principal_for(head), review_in=LeaveBulkReview(items=[
+            {"leave_id": approve_me, "status": "approved", "review_comment": "ok"},
+            {"leave_id": reject_me, "status": "rejected"},
+            {"leave_id": already, "status": "rejected"},
+            {"leave_id": other_team, "status": "approved"},
+            {"leave_id": 9999, "status": "approved"},
+            {"leave_id": approve_me, "status": "rejected"},
+        ]))
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+
+    assert [(result.leave_id, result.success) for result in results] == [
+        (approve_me, True), (reject_me, True), (already, False), (other_team, False), (9999, False), (approve_me, False)
+    ]
+    assert results[2].detail == "Can only review pending leave applications"
+    # 載入請假與申請人只查詢一次
+    assert sum(1 for statement in statements if "FROM leave_applications JOIN users" in statement) == 1
+
+    db.expire_all()
+    statuses = dict(db.query(models.LeaveApplication.id, models.LeaveApplication.status))
+    assert statuses[approve_me] == models.LeaveStatus.approved
+    assert statuses[reject_me] == models.LeaveStatus.rejected
+    assert statuses[other_team] == models.LeaveStatus.pending
+    assert db.get(models.LeaveApplication, approve_me).review_comment == "ok"
+    assert db.get(models.LeaveApplication, reject_me).reviewed_by == head.id
+    assert read_leave_status_counts(db, user_id=user.id).get(models.LeaveStatus.rejected) == 1
+    assert db.query(models.LeaveBalance).filter(models.LeaveBalance.user_id == user.id).one().used_days == 2
+    db.close()
@@ -33,3 +33,91 @@ def test_login_access_token(client: TestClient) -> None:
     assert tokens["token_type"] == "bearer"
 
     db.close()
+
+
+def test_password_hashing_rejects_when_saturated() -> None:
+    import pytest
+    from app.core import hashing
+    from app.core.config import settings
+
+    acquired = 0
+    while hashing._admission.acquire(blocking=False):
+        acquired += 1
+    try:
+        assert acquired == settings.PASSWORD_HASH_MAX_CONCURRENCY
+        with pytest.raises(hashing.PasswordHashingBusy):
+            hashing.verify_password("testpassword", "not-a-hash")
+    finally:
+        for _ in range(acquired):
+            hashing._admission.release()
+
+
+def test_refresh_token_rotation(client: TestClient) -> None:
+    from app.core.refresh_tokens import issue_refresh_token
+
+    db: Session = TestingSessionLocal()
+    user = models.User(
+        username="refresh@example.com",
+        email="refresh@example.com",
+        hashed_password="x",
+        first_name="Re",
+        last_name="Fresh",
+        is_active=True
+    )
+    db.add(user)
+    db.commit()
+    refresh_token = issue_refresh_token(db, user.id)
+    db.commit()
+
+    r = client.post("/api/v1/login/refresh", json={"refresh_token": refresh_token})
+    assert r.status_code == 200
+    tokens = r.json()
+    assert tokens["access_token"]
+    assert tokens["refresh_token"] != refresh_token
+
+    # 舊 token 不可再次使用，且重複使用會撤銷整個工作階段
+    r = client.post("/api/v1/login/refresh", json={"refresh_token": refresh_token})
+    assert r.status_code == 401
+    r = client.post("/api/v1/login/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert r.status_code == 401
+    db.close()
+
+
+def test_password_change_revokes_refresh_tokens(client: TestClient, monkeypatch) -> None:
+    from app.api.routers import users
+    from app.api.routers.users import update_user
+    from app.core.principals import AuthenticatedPrincipal
+    from app.core.refresh_tokens import issue_refresh_token
+    from app.schemas.user import UserUpdate
+
+    # 只驗證撤銷行為，雜湊演算法與此無關
+    monkeypatch.setattr(users, "get_password_hash", lambda password: f"hashed:{password}")
+
+    db: Session = TestingSessionLocal()
+    from datetime import time
+
+    company = models.Company(name="Token Corp", tax_id="12345678", work_start_time=time(9, 0), work_end_time=time(18, 0))
+    db.add(company)
+    db.commit()
+    user = models.User(
+        company_id=company.id,
+        username="revoke@example.com",
+        email="revoke@example.com",
+        hashed_password="x",
+        first_name="Re",
+        last_name="Voke",
+        is_active=True
+    )
+    db.add(user)
+    db.commit()
+    refresh_token = issue_refresh_token(db, user.id)
+    db.commit()
+
+    admin = AuthenticatedPrincipal(
+        id=0, role=models.UserRole.super_admin, company_id=None, department_id=None, is_active=True, token_version=0
+    )
+    update_user(db=db, company_id=company.id, user_id=user.id, user_in=UserUpdate(password="new-password"), current_user=admin)
+
+    r = client.post("/api/v1/login/refresh", json={"refresh_token": refresh_token})
+    assert r.status_code == 401
+    db.close()
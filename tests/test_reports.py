@@ -0,0 +1,628 @@
+from datetime import date, datetime, time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.company_policy import get_company_policy
+from app.core.work_calendar import get_work_calendar
+from app.db import models
+from app.utils.attendance_daily import rebuild_attendance_daily
+from app.utils.attendance_summary import summarize_company_month
+from app.utils.work_sessions import rebuild_work_sessions
+from tests.conftest import TestingSessionLocal, engine
+
+
+def create_company_with_staff(db: Session, staff_count: int) -> models.Company:
+    company = models.Company(
+        name="Report Corp",
+        tax_id="12345678",
+        work_start_time=time(9, 0),
+        work_end_time=time(18, 0)
+    )
+    db.add(company)
+    db.commit()
+    for i in range(staff_count):
+        db.add(models.User(
+            company_id=company.id,
+            username=f"staff{i}",
+            email=f"staff{i}@test.com",
+            hashed_password="x",
+            first_name="Staff",
+            last_name=str(i),
+            is_active=True
+        ))
+    db.commit()
+    return company
+
+
+def add_punch(
+    db: Session,
+    user: models.User,
+    record_type: models.AttendanceType,
+    record_time: datetime,
+    status: models.AttendanceStatus = models.AttendanceStatus.normal
+) -> None:
+    db.add(models.AttendanceRecord(
+        user_id=user.id,
+        company_id=user.company_id,
+        record_time=record_time,
+        record_type=record_type,
+        status=status
+    ))
+
+
+def test_monthly_summary_uses_constant_queries() -> None:
+    db: Session = TestingSessionLocal()
+    company = create_company_with_staff(db, 5)
+    users = db.query(models.User).order_by(models.User.id).all()
+    for user in users:
+        add_punch(db, user, models.AttendanceType.check_in, datetime(2025, 3, 3, 9, 0))
+        add_punch(db, user, models.AttendanceType.check_out, datetime(2025, 3, 3, 18, 0))
+        add_punch(db, user, models.AttendanceType.check_in, datetime(2025, 3, 4, 9, 0))
+        add_punch(db, user, models.AttendanceType.overtime_start, datetime(2025, 3, 4, 19, 0))
+        add_punch(db, user, models.AttendanceType.overtime_end, datetime(2025, 3, 4, 21, 30))
+    # 其他月份的記錄不應計入
+    add_punch(db, users[0], models.AttendanceType.check_in, datetime(2025, 4, 1, 9, 0))
+    db.commit()
+    company_id = company.id
+    assert rebuild_work_sessions(db, company_id=company_id) == 16
+    assert rebuild_attendance_daily(db, company_id=company_id) == 11
+    db.commit()
+    # 公司設定與工作日表皆為行程內快取
+    get_company_policy(db, company_id)
+    get_work_calendar(db, company_id, 2025)
+
+    statements = []
+
+    def count_statement(*args):
+        statements.append(args[2])
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        summary = summarize_company_month(db, company_id, date(2025, 3, 1), date(2025, 3, 31))
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+
+    assert len(statements) == 1
+    assert len(summary) == 5
+    for row in summary:
+        assert row["attendance_days"] == 2
+        assert row["check_in_count"] == 2
+        assert row["check_out_count"] == 1
+        assert row["overtime_hours"] == 2.5
+        assert row["overtime_sessions"] == 1
+        assert row["missing_check_in_days"] == 0
+        assert row["missing_check_out_days"] == 1
+    db.close()
+
+
+def test_monthly_summary_counts_late_missing_and_absence() -> None:
+    db: Session = TestingSessionLocal()
+    company = create_company_with_staff(db, 2)
+    worker, on_leave = db.query(models.User).order_by(models.User.id).all()
+    # 3/3 遲到且早退、3/4 只有下班卡、3/5 只有上班卡
+    add_punch(db, worker, models.AttendanceType.check_in, datetime(2025, 3, 3, 9, 30), models.AttendanceStatus.late)
+    add_punch(
+        db, worker, models.AttendanceType.check_out, datetime(2025, 3, 3, 17, 0), models.AttendanceStatus.early_leave
+    )
+    add_punch(db, worker, models.AttendanceType.check_out, datetime(2025, 3, 4, 18, 0))
+    add_punch(db, worker, models.AttendanceType.check_in, datetime(2025, 3, 5, 9, 0))
+    # 週六加班不影響缺勤天數
+    add_punch(db, worker, models.AttendanceType.check_in, datetime(2025, 3, 8, 9, 0))
+    db.add(models.LeaveApplication(
+        user_id=on_leave.id,
+        company_id=company.id,
+        leave_type=models.LeaveType.annual_leave,
+        start_date=datetime(2025, 3, 10, 9, 0),
+        end_date=datetime(2025, 3, 14, 18, 0),
+        reason="vacation",
+        status=models.LeaveStatus.approved
+    ))
+    db.add(models.LeaveApplication(
+        user_id=on_leave.id,
+        company_id=company.id,
+        leave_type=models.LeaveType.sick_leave,
+        start_date=datetime(2025, 3, 17, 9, 0),
+        end_date=datetime(2025, 3, 17, 18, 0),
+        reason="rejected",
+        status=models.LeaveStatus.rejected
+    ))
+    db.commit()
+    rebuild_work_sessions(db, company_id=company.id)
+    rebuild_attendance_daily(db, company_id=company.id)
+    db.commit()
+
+    summary = {row["user_id"]: row for row in summarize_company_month(db, company.id, date(2025, 3, 1), date(2025, 3, 31))}
+
+    # 2025 年 3 月共 21 個工作日
+    assert summary[worker.id]["late_count"] == 1
+    assert summary[worker.id]["early_leave_count"] == 1
+    assert summary[worker.id]["missing_check_in_days"] == 1
+    assert summary[worker.id]["missing_check_out_days"] == 2
+    assert summary[worker.id]["absence_days"] == 18
+    assert summary[on_leave.id]["late_count"] == 0
+    assert summary[on_leave.id]["absence_days"] == 16
+    db.close()
+
+
+def test_work_calendar_applies_holidays_and_makeup_days() -> None:
+    from app.core.work_calendar import invalidate_work_calendar
+    from app.utils.attendance_summary import build_individual_record
+
+    invalidate_work_calendar()
+    db: Session = TestingSessionLocal()
+    company = create_company_with_staff(db, 1)
+    other = models.Company(
+        name="Other Corp",
+        tax_id="87654321",
+        work_start_time=time(9, 0),
+        work_end_time=time(18, 0)
+    )
+    db.add(other)
+    db.commit()
+    db.add_all([
+        # 國定假日適用所有公司；公司補班日覆蓋同一天的國定假日
+        models.CompanyHoliday(company_id=None, holiday_date=date(2025, 2, 28), name="和平紀念日"),
+        models.CompanyHoliday(company_id=None, holiday_date=date(2025, 4, 4), name="兒童節"),
+        models.CompanyHoliday(company_id=company.id, holiday_date=date(2025, 4, 4), name="照常上班", is_workday=True),
+        models.CompanyHoliday(company_id=company.id, holiday_date=date(2025, 3, 7), name="公司旅遊"),
+        models.CompanyHoliday(company_id=company.id, holiday_date=date(2025, 3, 8), name="補班", is_workday=True),
+    ])
+    db.commit()
+
+    calendar = get_work_calendar(db, company.id, 2025)
+    assert not calendar.is_working_day(date(2025, 2, 28))
+    assert calendar.is_working_day(date(2025, 4, 4))
+    assert not calendar.is_working_day(date(2025, 3, 7))
+    assert calendar.is_working_day(date(2025, 3, 8))
+    assert not calendar.is_working_day(date(2025, 3, 9))
+    assert calendar.count_working_days(date(2025, 3, 1), date(2025, 3, 31)) == 21
+    assert get_work_calendar(db, other.id, 2025).count_working_days(date(2025, 2, 1), date(2025, 3, 31)) == 19 + 21
+    assert get_work_calendar(db, other.id, 2024).count_working_days(date(2024, 12, 30), date(2024, 12, 31)) == 2
+
+    user = db.query(models.User).filter(models.User.company_id == company.id).one()
+    summary = summarize_company_month(db, company.id, date(2025, 3, 1), date(2025, 3, 31))
+    assert summary[0]["absence_days"] == 21
+
+    days = {row["date"] for row in build_individual_record(db, user, 2025, 3)["daily_records"]}
+    assert date(2025, 3, 7) not in days
+    assert date(2025, 3, 8) in days
+    invalidate_work_calendar()
+    db.close()
+
+
+def test_work_date_uses_company_local_time() -> None:
+    from datetime import timezone
+    from app.utils.local_time import local_work_date
+
+    # UTC 16:30 已是台北隔日 00:30
+    punch = datetime(2025, 3, 3, 16, 30, tzinfo=timezone.utc)
+    assert local_work_date(punch, "Asia/Taipei") == date(2025, 3, 4)
+    assert local_work_date(punch, "UTC") == date(2025, 3, 3)
+    # 無時區資訊的舊資料視為當地時間
+    assert local_work_date(datetime(2025, 3, 3, 23, 59), "Asia/Taipei") == date(2025, 3, 3)
+
+
+def test_punch_time_formatted_in_company_local_time() -> None:
+    from datetime import timezone
+    from app.utils.attendance_summary import format_punch_time
+
+    punch = datetime(2025, 3, 3, 1, 5, tzinfo=timezone.utc)
+    assert format_punch_time(punch, "Asia/Taipei") == "09:05"
+    assert format_punch_time(punch, "UTC") == "01:05"
+    assert format_punch_time(datetime(2025, 3, 3, 9, 5), "UTC") == "09:05"
+    assert format_punch_time(None, "Asia/Taipei") is None
+
+
+def test_report_cache_collapses_concurrent_requests() -> None:
+    import threading
+    from app.core.report_cache import ReportCache
+
+    cache = ReportCache(max_size=10, ttl_seconds=60)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"rows": 1}
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_compute(("summary", 1, 2025, 3, 0), compute)))
+        for _ in range(20)
+    ]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == [{"rows": 1}] * 20
+
+    # 計算期間月份被失效時，結果不寫入快取
+    def invalidated_compute():
+        cache.invalidate_month(1, 2025, 4)
+        return {"rows": 2}
+
+    cache.get_or_compute(("summary", 1, 2025, 4, 0), invalidated_compute)
+    assert cache.get_or_compute(("summary", 1, 2025, 4, 0), lambda: {"rows": 3}) == {"rows": 3}
+
+
+def test_closed_month_snapshot_invalidated_by_punch() -> None:
+    from app.api.routers.attendance import insert_punch
+    from app.core.report_cache import cached_report, report_cache
+
+    report_cache.clear()
+    db: Session = TestingSessionLocal()
+    company = create_company_with_staff(db, 1)
+    user = db.query(models.User).first()
+    company_id = company.id
+
+    def summary():
+        return summarize_company_month(db, company_id, date(2025, 3, 1), date(2025, 3, 31))
+
+    assert cached_report(db, "monthly_summary", company_id, 2025, 3, summary)[0]["attendance_days"] == 0
+    assert db.query(models.ReportSnapshot).count() == 1
+
+    insert_punch(db, {
+        "user_id": user.id,
+        "company_id": company_id,
+        "record_time": datetime(2025, 3, 3, 9, 0),
+        "work_date": date(2025, 3, 3),
+        "record_type": models.AttendanceType.check_in,
+        "status": models.AttendanceStatus.normal
+    })
+    db.commit()
+
+    assert db.query(models.ReportSnapshot).count() == 0
+    assert cached_report(db, "monthly_summary", company_id, 2025, 3, summary)[0]["attendance_days"] == 1
+    report_cache.clear()
+    db.close()
+
+
+def test_report_job_exports_in_batches_and_tracks_progress(tmp_path, monkeypatch) -> None:
+    from app.core import report_jobs
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "REPORT_JOB_DIR", str(tmp_path))
+    monkeypatch.setattr(report_jobs, "EXPORT_YIELD_PER", 2)
+
+    db: Session = TestingSessionLocal()
+    company = create_company_with_staff(db, 1)
+    user = db.query(models.User).first()
+    for day in range(3, 8):
+        add_punch(db, user, models.AttendanceType.check_in, datetime(2025, 3, day, 9, 0))
+    db.add(models.ReportJob(
+        id="job1",
+        company_id=company.id,
+        job_type=models.ReportJobType.records_export,
+        params={"start_date": "2025-03-04", "end_date": "2025-03-31"}
+    ))
+    db.commit()
+
+    report_jobs.execute_report_job(TestingSessionLocal, "job1")
+
+    db.expire_all()
+    job = db.get(models.ReportJob, "job1")
+    assert job.status == models.ReportJobStatus.completed
+    assert job.progress == 100
+    with open(job.artifact_path, encoding="utf-8") as artifact:
+        lines = artifact.read().lstrip("\ufeff").splitlines()
+    assert len(lines) == 5
+    assert [line.split(",")[6] for line in lines[1:]] == ["2025-03-04", "2025-03-05", "2025-03-06", "2025-03-07"]
+
+    db.add(models.ReportJob(
+        id="job2",
+        company_id=company.id,
+        job_type=models.ReportJobType.monthly_summary,
+        params={"year": 2025, "month": 13}
+    ))
+    db.commit()
+    report_jobs.execute_report_job(TestingSessionLocal, "job2")
+    db.expire_all()
+    failed = db.get(models.ReportJob, "job2")
+    assert failed.status == models.ReportJobStatus.failed
+    assert failed.error
+    assert list(tmp_path.iterdir()) == [tmp_path / "job1.csv"]
+    db.close()
+
+
+def test_report_jobs_fail_when_worker_crashes_or_service_restarts() -> None:
+    from concurrent.futures import Future
+    from concurrent.futures.process import BrokenProcessPool
+
+    from app.core import report_jobs
+
+    db: Session = TestingSessionLocal()
+    company = create_company_with_staff(db, 0)
+    for job_id, status in [("crashed", models.ReportJobStatus.running), ("done", models.ReportJobStatus.completed),
+                           ("queued", models.ReportJobStatus.queued), ("running", models.ReportJobStatus.running)]:
+        db.add(models.ReportJob(
+            id=job_id, company_id=company.id, job_type=models.ReportJobType.monthly_summary,
+            params={"year": 2025, "month": 3}, status=status
+        ))
+    db.commit()
+
+    crashed = Future()
+    crashed.set_exception(BrokenProcessPool("worker died"))
+    report_jobs.fail_crashed_report_job(TestingSessionLocal, "crashed", crashed)
+    finished = Future()
+    finished.set_result(None)
+    report_jobs.fail_crashed_report_job(TestingSessionLocal, "running", finished)
+
+    db.expire_all()
+    assert db.get(models.ReportJob, "crashed").status == models.ReportJobStatus.failed
+    assert db.get(models.ReportJob, "crashed").error == "worker died"
+    assert db.get(models.ReportJob, "running").status == models.ReportJobStatus.running
+
+    # 重新啟動後，未完成的工作都標為失敗，已完成的不受影響
+    assert report_jobs.fail_orphaned_report_jobs(db) == 2
+    db.expire_all()
+    statuses = {job.id: job.status for job in db.query(models.ReportJob)}
+    assert statuses == {
+        "crashed": models.ReportJobStatus.failed,
+        "done": models.ReportJobStatus.completed,
+        "queued": models.ReportJobStatus.failed,
+        "running": models.ReportJobStatus.failed,
+    }
+    db.close()
+
+
+def test_report_job_download_url_follows_router_prefix(client) -> None:
+    from app.api import deps
+    from app.core.principals import AuthenticatedPrincipal
+    from app.main import app
+
+    db: Session = TestingSessionLocal()
+    company = create_company_with_staff(db, 0)
+    db.add(models.ReportJob(
+        id="finished", company_id=company.id, job_type=models.ReportJobType.monthly_summary,
+        params={"year": 2025, "month": 3}, status=models.ReportJobStatus.completed
+    ))
+    db.commit()
+    admin = AuthenticatedPrincipal(
+        id=0, role=models.UserRole.super_admin, company_id=company.id, department_id=None, is_active=True, token_version=0
+    )
+    app.dependency_overrides[deps.get_current_active_admin] = lambda: admin
+    try:
+        response = client.get("/api/v1/reports/jobs/finished")
+    finally:
+        app.dependency_overrides.pop(deps.get_current_active_admin, None)
+    assert response.status_code == 200
+    assert response.json()["download_url"].endswith("/api/v1/reports/jobs/finished/download")
+    db.close()
+
+
+def test_bulk_individual_records_use_constant_queries() -> None:
+    from app.utils.attendance_summary import build_individual_record, build_individual_records
+
+    db: Session = TestingSessionLocal()
+    company = create_company_with_staff(db, 4)
+    users = db.query(models.User).order_by(models.User.id).all()
+    for index, user in enumerate(users):
+        add_punch(db, user, models.AttendanceType.check_in, datetime(2025, 3, 3 + index, 9, 0))
+        add_punch(db, user, models.AttendanceType.check_out, datetime(2025, 3, 3 + index, 18, 0))
+    db.commit()
+    company_id = company.id
+    rebuild_work_sessions(db, company_id=company_id)
+    rebuild_attendance_daily(db, company_id=company_id)
+    db.commit()
+    expected = [build_individual_record(db, user, 2025, 3) for user in users]
+    db.expire_all()
+
+    statements = []
+
+    def count_statement(*args):
+        statements.append(args[2])
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        sheets = list(build_individual_records(db, company_id, 2025, 3))
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+
+    # 員工、公司、每日彙總、已核准請假各一次
+    assert len(statements) == 4
+    assert sheets == expected
+    assert [sheet["summary"]["total_work_hours"] for sheet in sheets] == [9.0] * 4
+    db.close()
+
+
+def test_bulk_individual_records_stream_in_batches(monkeypatch) -> None:
+    from app.utils import attendance_summary
+    from app.utils.attendance_summary import build_individual_record, build_individual_records
+
+    db: Session = TestingSessionLocal()
+    company = create_company_with_staff(db, 5)
+    users = db.query(models.User).order_by(models.User.id).all()
+    # 只有部分員工有出勤或請假，合併時需略過沒有資料的員工
+    for user in users[1::2]:
+        add_punch(db, user, models.AttendanceType.check_in, datetime(2025, 3, 3, 9, 0))
+        add_punch(db, user, models.AttendanceType.check_out, datetime(2025, 3, 3, 18, 0))
+    for user in users[::3]:
+        db.add(models.LeaveApplication(
+            user_id=user.id, company_id=company.id, leave_type=models.LeaveType.annual_leave,
+            start_date=datetime(2025, 3, 4, 9, 0), end_date=datetime(2025, 3, 5, 18, 0),
+            reason="test", status=models.LeaveStatus.approved
+        ))
+    db.commit()
+    rebuild_work_sessions(db, company_id=company.id)
+    rebuild_attendance_daily(db, company_id=company.id)
+    db.commit()
+    expected = [build_individual_record(db, user, 2025, 3) for user in users]
+
+    monkeypatch.setattr(attendance_summary, "INDIVIDUAL_RECORDS_YIELD_PER", 1)
+    assert list(build_individual_records(db, company.id, 2025, 3)) == expected
+    db.close()
+
+
+def test_individual_record_merges_approved_leaves() -> None:
+    from app.utils.attendance_summary import build_individual_record, build_individual_records
+
+    db: Session = TestingSessionLocal()
+    company = create_company_with_staff(db, 2)
+    user, colleague = db.query(models.User).order_by(models.User.id).all()
+    # 3/6 下午請半天事假，上午照常打卡
+    add_punch(db, user, models.AttendanceType.check_in, datetime(2025, 3, 6, 9, 0))
+    add_punch(db, user, models.AttendanceType.check_out, datetime(2025, 3, 6, 13, 30))
+    db.commit()
+    rebuild_work_sessions(db, company_id=company.id)
+    rebuild_attendance_daily(db, company_id=company.id)
+
+    def leave(owner, leave_type, start, end, status=models.LeaveStatus.approved):
+        db.add(models.LeaveApplication(
+            user_id=owner.id, company_id=company.id, leave_type=leave_type,
+            start_date=start, end_date=end, reason="test", status=status
+        ))
+
+    # 跨週末的年假：3/7(五) 至 3/10(一)，週末不計
+    leave(user, models.LeaveType.annual_leave, datetime(2025, 3, 7, 9, 0), datetime(2025, 3, 10, 18, 0))
+    leave(user, models.LeaveType.personal_leave, datetime(2025, 3, 6, 13, 30), datetime(2025, 3, 6, 18, 0))
+    leave(user, models.LeaveType.sick_leave, datetime(2025, 3, 12, 9, 0), datetime(2025, 3, 12, 18, 0),
+          models.LeaveStatus.pending)
+    leave(colleague, models.LeaveType.sick_leave, datetime(2025, 2, 28, 9, 0), datetime(2025, 3, 3, 18, 0))
+    db.commit()
+
+    sheet = build_individual_record(db, user, 2025, 3)
+    days = {record["date"]: record for record in sheet["daily_records"]}
+    assert days[date(2025, 3, 6)]["check_in"] == "09:00"
+    assert days[date(2025, 3, 6)]["leave_type"] == models.LeaveType.personal_leave
+    assert days[date(2025, 3, 6)]["leave_hours"] == 4.5
+    assert days[date(2025, 3, 7)]["leave_type"] == models.LeaveType.annual_leave
+    assert days[date(2025, 3, 7)]["leave_hours"] == 9.0
+    assert date(2025, 3, 8) not in days
+    assert days[date(2025, 3, 10)]["leave_hours"] == 9.0
+    assert days[date(2025, 3, 12)]["leave_type"] is None
+    assert sheet["summary"]["leave_days_by_type"] == {"annual_leave": 2.0, "personal_leave": 0.5}
+    assert sheet["summary"]["total_leave_hours"] == 22.5
+
+    sheets = {sheet["user_info"]["id"]: sheet for sheet in build_individual_records(db, company.id, 2025, 3)}
+    assert sheets[user.id] == sheet
+    assert sheets[colleague.id]["summary"]["leave_days_by_type"] == {"sick_leave": 1.0}
+    db.close()
+
+
+def test_yearly_summary_matches_monthly_summary() -> None:
+    from app.utils.yearly_analytics import summarize_company_months
+
+    db: Session = TestingSessionLocal()
+    company = create_company_with_staff(db, 3)
+    users = db.query(models.User).order_by(models.User.id).all()
+    for month in (1, 2, 3):
+        for index, user in enumerate(users[:2]):
+            day = 3 + index
+            db.add(models.AttendanceRecord(
+                user_id=user.id, company_id=user.company_id, record_time=datetime(2025, month, day, 9, 10),
+                record_type=models.AttendanceType.check_in,
+                status=models.AttendanceStatus.late if index == 0 else models.AttendanceStatus.normal
+            ))
+            add_punch(db, user, models.AttendanceType.check_out, datetime(2025, month, day, 18, 10))
+            add_punch(db, user, models.AttendanceType.overtime_start, datetime(2025, month, day, 19, 0))
+            add_punch(db, user, models.AttendanceType.overtime_end, datetime(2025, month, day, 20, 30))
+    db.commit()
+    company_id = company.id
+    rebuild_work_sessions(db, company_id=company_id)
+    rebuild_attendance_daily(db, company_id=company_id)
+    db.commit()
+
+    yearly = summarize_company_months(db, company_id, 2025, 1, 4)
+
+    assert [row["user_id"] for row in yearly] == [user.id for user in users]
+    for month_index in range(4):
+        monthly = summarize_company_month(db, company_id, date(2025, month_index + 1, 1), date(2025, month_index + 1, 28))
+        for row, monthly_row in zip(yearly, monthly):
+            assert row["months"][month_index]["attendance_days"] == monthly_row["attendance_days"]
+            assert row["months"][month_index]["overtime_hours"] == monthly_row["overtime_hours"]
+
+    first, second, idle = yearly
+    assert first["totals"] == {
+        "attendance_days": 3, "worked_hours": 27.0, "overtime_hours": 4.5,
+        "late_count": 3, "early_leave_count": 0, "late_rate": 1.0
+    }
+    assert second["totals"]["late_rate"] == 0.0
+    assert idle["totals"]["attendance_days"] == 0
+    db.close()
+
+
+def test_monthly_export_writes_xlsx_and_pdf() -> None:
+    import io
+    import pytest
+    from app.utils.attendance_summary import build_individual_records
+    from app.utils.report_export import write_monthly_pdf, write_monthly_xlsx
+
+    openpyxl = pytest.importorskip("openpyxl")
+    pytest.importorskip("reportlab")
+
+    db: Session = TestingSessionLocal()
+    company = create_company_with_staff(db, 2)
+    users = db.query(models.User).order_by(models.User.id).all()
+    add_punch(db, users[0], models.AttendanceType.check_in, datetime(2025, 3, 3, 9, 0))
+    add_punch(db, users[0], models.AttendanceType.check_out, datetime(2025, 3, 3, 18, 0))
+    db.commit()
+    company_id = company.id
+    rebuild_work_sessions(db, company_id=company_id)
+    rebuild_attendance_daily(db, company_id=company_id)
+    db.commit()
+    summary = summarize_company_month(db, company_id, date(2025, 3, 1), date(2025, 3, 31))
+
+    xlsx = io.BytesIO()
+    write_monthly_xlsx(xlsx, summary, build_individual_records(db, company_id, 2025, 3))
+    workbook = openpyxl.load_workbook(io.BytesIO(xlsx.getvalue()), read_only=True)
+    assert workbook.sheetnames == ["月度統計", "個人出勤明細"]
+    summary_rows = list(workbook["月度統計"].iter_rows(values_only=True))
+    assert summary_rows[0][0] == "員工ID"
+    assert summary_rows[1][3] == 1
+    detail_rows = list(workbook["個人出勤明細"].iter_rows(values_only=True))
+    # 兩位員工 × 三月的 21 個工作日
+    assert len(detail_rows) == 1 + 2 * 21
+    assert detail_rows[1][2:6] == ("2025-03-03", "一", "09:00", "18:00")
+
+    pdf = io.BytesIO()
+    write_monthly_pdf(pdf, "2025 年 3 月出勤統計", summary, build_individual_records(db, company_id, 2025, 3))
+    assert pdf.getvalue().startswith(b"%PDF")
+    db.close()
+
+
+def test_department_summary_rolls_up_employees_and_departments() -> None:
+    from app.utils.department_summary import summarize_departments
+
+    db: Session = TestingSessionLocal()
+    company = create_company_with_staff(db, 3)
+    sales = models.Department(company_id=company.id, name="Sales")
+    db.add(sales)
+    db.commit()
+    users = db.query(models.User).order_by(models.User.id).all()
+    users[0].department_id = sales.id
+    users[1].department_id = sales.id
+    for user in users:
+        add_punch(db, user, models.AttendanceType.check_in, datetime(2025, 3, 3, 9, 0))
+        add_punch(db, user, models.AttendanceType.check_out, datetime(2025, 3, 3, 17, 0))
+    db.commit()
+    company_id = company.id
+    sales_id = sales.id
+    rebuild_work_sessions(db, company_id=company_id)
+    rebuild_attendance_daily(db, company_id=company_id)
+    db.commit()
+
+    report = summarize_departments(db, company_id, date(2025, 3, 1), date(2025, 3, 31))
+
+    assert report["company"]["employee_count"] == 3
+    assert report["company"]["work_hours"] == 24.0
+    sales_report, unassigned = report["departments"]
+    assert sales_report["department_name"] == "Sales"
+    assert sales_report["totals"]["employee_count"] == 2
+    assert sales_report["totals"]["work_hours"] == 16.0
+    assert [employee["work_hours"] for employee in sales_report["employees"]] == [8.0, 8.0]
+    assert unassigned["department_id"] is None
+    assert unassigned["totals"]["attendance_days"] == 1
+
+    scoped = summarize_departments(db, company_id, date(2025, 3, 1), date(2025, 3, 31), sales_id)
+    assert scoped["company"]["employee_count"] == 2
+    assert len(scoped["departments"]) == 1
+    db.close()